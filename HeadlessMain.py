@@ -0,0 +1,53 @@
+"""
+Run the pipeline without the GUI and print a performance report.
+    python HeadlessMain.py --settings Configs/headless.ini --duration 60 --trace trace.json
+The settings file has the same format as Configs/settings.ini and is filled with the defaults if keys are missing.
+Image_Source/source and Analyzers/analyzer select the services unless given on the command line.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from services import config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--settings", help="settings INI file (default: Configs/settings.ini)")
+    parser.add_argument("--source", help="image source (replay, test, harvesters)")
+    parser.add_argument("--analyzer", help="analyzer (test, remote)")
+    parser.add_argument("--duration", type=float, help="seconds to run (default: until the source finishes)")
+    parser.add_argument("--trace", help="write the per-frame trace spans to this Chrome trace JSON file")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("console")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(sys.stderr))
+
+    # before the services register their defaults
+    if args.settings:
+        config.use_settings_file(args.settings)
+    from services.headless import HeadlessPipeline
+    from utils import tracing
+
+    tracing.tracer.configure(enabled=bool(args.trace) or None)
+    pipeline = HeadlessPipeline(args.source, args.analyzer)
+    pipeline.start()
+    try:
+        pipeline.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        report = pipeline.report()
+        pipeline.finalize()
+
+    if args.trace:
+        tracing.tracer.export(args.trace)
+        logger.info(f"Trace written to {args.trace}")
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
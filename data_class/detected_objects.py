@@ -1,8 +1,78 @@
+import numpy as np
+
+from utils import rle
+
+
 class DetectedObject:
+    """
+    A detected instance. The mask is kept as COCO RLE (maskRLE) and only decoded when pixels are requested.
+    """
+
     def __init__(self):
         super().__init__()
         self.maskRLE = None
-        self.mask = None
         self.bbox = None
         self.label = None
-        self.score = None
\ No newline at end of file
+        self.score = None
+        self._mask = None
+        self._runs = None
+
+    @property
+    def mask(self) -> np.ndarray:
+        """
+        Full-frame mask. Decoded on first access; prefer cropped_mask() when only the object is needed.
+        """
+        if self._mask is None and self.maskRLE is not None:
+            from pycocotools import mask as mask_util
+            self._mask = mask_util.decode(self.maskRLE)
+        return self._mask
+
+    @mask.setter
+    def mask(self, value: np.ndarray):
+        self._mask = value
+
+    @property
+    def runs(self) -> np.ndarray:
+        if self._runs is None:
+            self._runs = rle.decode_counts(self.maskRLE["counts"])
+        return self._runs
+
+    @property
+    def size(self):
+        """
+        (height, width) of the frame the mask belongs to
+        """
+        return tuple(self.maskRLE["size"])
+
+    @property
+    def area(self) -> int:
+        return rle.area(self.runs)
+
+    @property
+    def rle_bbox(self):
+        """
+        Inclusive (xlt, ylt, xrb, yrb) bounding box of the mask pixels, or None for an empty mask
+        """
+        return rle.bbox(self.runs, self.size[0])
+
+    @property
+    def centroid(self):
+        """
+        (x, y) of the mask pixels, or None for an empty mask
+        """
+        return rle.centroid(self.runs, self.size[0])
+
+    def cropped_mask(self, box=None) -> np.ndarray:
+        """
+        Decode the mask inside a bounding box only.
+        :param box: inclusive (xlt, ylt, xrb, yrb). Defaults to the bounding box of the mask pixels.
+        :return: uint8 array of the box size (empty if the mask is empty)
+        """
+        box = box or self.rle_bbox
+        if box is None:
+            return np.zeros((0, 0), dtype=np.uint8)
+        height, width = self.size
+        if self._mask is not None:
+            rows, cols = rle.bbox_slices(box, height, width)
+            return self._mask[rows, cols].view(np.uint8)
+        return rle.decode_cropped(self.runs, height, width, box)
@@ -1,7 +1,9 @@
-from typing import Union, Iterable
+from typing import Union, Iterable, Dict
 
 import numpy as np
 
+from utils.histogram import HistogramAccumulator
+
 
 class Distribution(object):
     def __init__(self):
@@ -9,19 +11,29 @@ class Distribution(object):
 
 
 class AreaDistribution(Distribution):
-    def __init__(self, area_dist: Union[Iterable, np.ndarray], unit="<math>px<sup>2</sup></math>"):
+    def __init__(self, area_dist: Union[Iterable, np.ndarray], unit="<math>px<sup>2</sup></math>",
+                 histograms: Dict[str, HistogramAccumulator] = None):
+        """
+        :param area_dist: areas of the last group of images
+        :param histograms: {view: histogram} of all the areas, see utils.histogram.VIEWS
+        """
         super().__init__()
         self.unit = unit
         self.area_dist: np.ndarray = np.asarray(area_dist)
+        self.histograms = histograms or {}
 
 
 class EllipseDistribution(Distribution):
     def __init__(self,
                  major_dist: np.ndarray,
                  minor_dist: np.ndarray,
-                 unit="<math>px</math>"
+                 unit="<math>px</math>",
+                 major_histograms: Dict[str, HistogramAccumulator] = None,
+                 minor_histograms: Dict[str, HistogramAccumulator] = None,
                  ):
         super().__init__()
         self.unit = unit
         self.major_dist = major_dist
         self.minor_dist = minor_dist
+        self.major_histograms = major_histograms or {}
+        self.minor_histograms = minor_histograms or {}
@@ -1,6 +1,46 @@
 class InferenceStats:
-    def __init__(self, frame, processTime) -> None:
+    def __init__(self, frame, processTime, endpoint=None) -> None:
         super().__init__()
 
         self.frame = frame
         self.processTime = processTime
+        self.endpoint = endpoint
+
+
+class EndpointStats:
+    """
+    Running latency statistics of one inference endpoint.
+    """
+
+    def __init__(self, smoothing=0.2) -> None:
+        super().__init__()
+        self.smoothing = smoothing
+        self.batches = 0
+        self.frames = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.recent_time = None
+
+    def update(self, elapsed, frames):
+        self.batches += 1
+        self.frames += frames
+        self.total_time += elapsed
+        self.min_time = elapsed if self.min_time is None else min(self.min_time, elapsed)
+        self.max_time = elapsed if self.max_time is None else max(self.max_time, elapsed)
+        if self.recent_time is None:
+            self.recent_time = elapsed
+        else:
+            self.recent_time += self.smoothing * (elapsed - self.recent_time)
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.batches if self.batches else None
+
+    def __repr__(self) -> str:
+        if not self.batches:
+            return f"batches=0, errors={self.errors}"
+        return f"batches={self.batches}, frames={self.frames}, errors={self.errors}, " \
+               f"latency mean={self.mean_time:.3f}s recent={self.recent_time:.3f}s " \
+               f"min={self.min_time:.3f}s max={self.max_time:.3f}s"
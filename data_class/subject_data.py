@@ -2,6 +2,7 @@
 Types for data exchange for the subjects
 """
 import datetime
+import threading
 from typing import List, Dict
 
 import numpy as np
@@ -30,24 +31,44 @@ class TimelineDataPoint(object):
 
 
 class AcquiredImage(object):
-    def __init__(self, image: np.ndarray, time: float, name: str = None):
+    def __init__(self, image: np.ndarray, time: float, name: str = None, for_inference=True):
+        """
+        :param for_inference: False if the source decimated this frame away from inference. It is still stored and
+        displayed.
+        """
         super(AcquiredImage, self).__init__()
 
         self.time = time
         self.image = image
         self.name = name or f"{time * 1000:.0f}.jpg"
-        self._encoded_buffer = None
+        self.for_inference = for_inference
+        # encoder name -> encoded bytes
+        self._encoded = {}
+        self._encode_lock = threading.Lock()
 
     @property
     def encoded_buffer(self):
-        if self._encoded_buffer is None:
-            self.encode()
-        return self._encoded_buffer
-
-    def encode(self):
-        encoder:ImageEncoder = service_provider.ImageEncoderProvider().get_or_create_instance(None)
-        self._encoded_buffer = encoder.encode(self.image)
-        return self._encoded_buffer
+        return self.encoded_as(None)
+
+    def is_encoded(self, encoder_name: str = None):
+        return service_provider.ImageEncoderProvider().canonical_name(encoder_name) in self._encoded
+
+    def encode(self, encoder: ImageEncoder = None):
+        return self.encoded_as(None, encoder)
+
+    def encoded_as(self, encoder_name: str = None, encoder: ImageEncoder = None):
+        """
+        Encode the image once per encoder. Concurrent callers wait for the first encoding instead of repeating it.
+        :param encoder_name: name in ImageEncoderProvider, None for the default encoder
+        :param encoder: instance to use instead of looking up the name
+        """
+        key = service_provider.ImageEncoderProvider().canonical_name(encoder_name)
+        with self._encode_lock:
+            if key not in self._encoded:
+                if encoder is None:
+                    encoder = service_provider.ImageEncoderProvider().get_encoder(key)
+                self._encoded[key] = encoder.encode(self.image)
+            return self._encoded[key]
 
 
 class SampleImageData(object):
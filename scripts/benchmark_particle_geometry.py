@@ -0,0 +1,81 @@
+"""
+Compare the per-object full-frame geometry path with services.particle_geometry.
+    python -m scripts.benchmark_particle_geometry --objects 300 --width 2048 --height 2048
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+from pycocotools import mask as mask_util
+
+from data_class.detected_objects import DetectedObject
+from services import particle_geometry
+
+
+def synthetic_detections(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    detections = []
+    for _ in range(count):
+        canvas = np.zeros((height, width), dtype=np.uint8)
+        center = (int(rng.integers(40, width - 40)), int(rng.integers(40, height - 40)))
+        axes = (int(rng.integers(5, 35)), int(rng.integers(3, 20)))
+        cv2.ellipse(canvas, center, axes, float(rng.uniform(0, 180)), 0, 360, 1, -1)
+        detection = DetectedObject()
+        detection.maskRLE = mask_util.encode(np.asfortranarray(canvas))
+        detection.bbox = detection.rle_bbox
+        detections.append(detection)
+    return detections
+
+
+def legacy_measure(detections):
+    """
+    The per-object path ResultProcessor used before particle_geometry, including the full-frame decode that
+    InferenceComm.to_detected_object used to do.
+    """
+    areas, majors, minors = [], [], []
+    for detection in detections:
+        mask = mask_util.decode(detection.maskRLE)
+        areas.append(mask.sum())
+        contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        max_area = 0
+        biggest_contour = None
+        for c in contours:
+            area = cv2.contourArea(c)
+            if area > max_area:
+                biggest_contour = c
+                max_area = area
+        if biggest_contour is not None and len(biggest_contour) > 5:
+            ellipse = cv2.fitEllipse(biggest_contour)
+            majors.append(ellipse[1][0])
+            minors.append(ellipse[1][1])
+    return np.asarray(areas), np.asarray(majors), np.asarray(minors)
+
+
+def timeit(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=300)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    detections = synthetic_detections(args.objects, args.width, args.height)
+    results = {
+        "legacy (full frame)": timeit(lambda: legacy_measure(detections), args.repeat),
+        "contour (bbox crop)": timeit(lambda: particle_geometry.measure(detections, "contour"), args.repeat),
+        "moments (batched)": timeit(lambda: particle_geometry.measure(detections, "moments"), args.repeat),
+    }
+    baseline = results["legacy (full frame)"]
+    print(f"{args.objects} objects on {args.width}x{args.height}")
+    for name, elapsed in results.items():
+        print(f"{name:22s} {elapsed * 1000:9.2f} ms  x{baseline / elapsed:6.1f}")
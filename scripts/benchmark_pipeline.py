@@ -0,0 +1,152 @@
+"""
+Frames/sec, per-stage latency and peak RSS of the whole pipeline, without the GUI.
+TestImages or a capture directory is replayed at each rate (0 = as fast as possible) against the TestAnalyzer or the
+inference servers given by --endpoints, or a local inference stand-in (services.inference_stand_in). Every run starts in a fresh process with its own settings file, so the
+runs do not share state and the peak RSS is per run.
+    python -m scripts.benchmark_pipeline --images TestImages --rates 10 30 0 --frames 300
+    python -m scripts.benchmark_pipeline --stand-in --latency 0.02 --objects 50 --failure-rate 0.01
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+from functools import partial
+
+from PyQt5 import QtCore
+
+
+def write_settings(path, values: dict):
+    settings = QtCore.QSettings(path, QtCore.QSettings.IniFormat)
+    for key, value in values.items():
+        settings.setValue(key, value)
+    settings.sync()
+
+
+def run(settings_path, trace, results):
+    from services import config
+    config.use_settings_file(settings_path)
+    from services.headless import HeadlessPipeline
+    from utils import tracing
+
+    tracing.tracer.configure(enabled=trace)
+    pipeline = HeadlessPipeline()
+    try:
+        pipeline.start()
+        pipeline.wait()
+        pipeline.stop()
+        results.put(pipeline.report())
+    finally:
+        pipeline.finalize()
+
+
+def serve_stand_in(transport, options: dict, addresses, stop):
+    from services.inference_stand_in import SyntheticInference, serve
+    inference = SyntheticInference(**options)
+    if transport == "grpc":
+        server, address = serve(inference)
+        close = partial(server.stop, 0)
+    else:
+        from services.shm_transport import SharedMemoryStandInServer
+        server = SharedMemoryStandInServer(handler=inference.shm_handler).start()
+        address, close = server.address, server.close
+    addresses.put(address)
+    stop.wait()
+    close()
+
+
+def print_report(rate, report):
+    rss = f"{report['peak_rss'] / 2 ** 20:7.1f} MiB" if report["peak_rss"] is not None else "unknown"
+    source_fps, result_fps = report["source_fps"] or 0, report["result_fps"] or 0
+    print(f"rate {rate or 'max':>5}: source {source_fps:7.1f} fps, results {result_fps:7.1f} fps "
+          f"({report['results']}/{report['frames']} frames), peak RSS {rss}")
+    stages = dict(report["latency"])
+    for stage, summary in (report["trace"] or {}).items():
+        stages[f"trace: {stage}"] = summary
+    for stage, s in sorted(stages.items()):
+        if not s["count"]:
+            continue
+        print(f"    {stage:32} n={s['count']:6d}  p50 {s['p50'] * 1e3:8.2f} ms  p90 {s['p90'] * 1e3:8.2f} ms  "
+              f"p99 {s['p99'] * 1e3:8.2f} ms")
+    dropped = {name: q["dropped"] for name, q in report["queues"].items() if q["dropped"]}
+    if dropped:
+        print(f"    dropped in queues: {dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default="TestImages", help="image directory or capture directory")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 0], help="frames/sec, 0 = as fast as possible")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--analyzer", choices=("test", "remote"), default="test")
+    parser.add_argument("--processing-time", type=float, default=0.05, help="TestAnalyzer time per batch (sec)")
+    parser.add_argument("--endpoints", default="", help="inference servers for the remote analyzer (host:port,...)")
+    parser.add_argument("--transport", choices=("grpc", "shm"), default="grpc")
+    parser.add_argument("--stand-in", action="store_true", help="run the remote analyzer against a local stand-in")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in processing time per image (sec)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stand-in per-image latency spread (sec)")
+    parser.add_argument("--objects", type=int, default=20, help="stand-in detections per image")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="stand-in share of failed batches")
+    parser.add_argument("--follow-back-pressure", action="store_true", help="pause the replay on back pressure")
+    parser.add_argument("--save", action="store_true", help="enable ResultSaver")
+    parser.add_argument("--encoder", default="default", help="encoder used by the saver")
+    parser.add_argument("--trace", action="store_true", help="add the per-frame trace spans to the report")
+    parser.add_argument("--json", help="write all reports to this file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    stand_in, stop_stand_in = None, context.Event()
+    if args.stand_in:
+        addresses = context.Queue()
+        options = {"latency": args.latency, "jitter": args.jitter, "objects": args.objects,
+                   "failure_rate": args.failure_rate}
+        stand_in = context.Process(target=serve_stand_in, args=(args.transport, options, addresses, stop_stand_in))
+        stand_in.start()
+        args.analyzer, args.endpoints = "remote", addresses.get(timeout=30.0)
+
+    reports = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for i, rate in enumerate(args.rates):
+                settings_path = os.path.join(directory, f"run{i}.ini")
+                write_settings(settings_path, {
+                    "Image_Source/source": "replay",
+                    "Analyzers/analyzer": args.analyzer,
+                    "Replay_Source/path": os.path.abspath(args.images),
+                    "Replay_Source/fps": rate,
+                    "Replay_Source/frames": args.frames,
+                    "Replay_Source/follow_back_pressure": args.follow_back_pressure,
+                    "Test_Analyzer/processing_time": args.processing_time,
+                    "Remote_Analyzer/endpoints": args.endpoints,
+                    "Remote_Analyzer/transport": args.transport,
+                    "ResultSaver/enabled": args.save,
+                    "ResultSaver/directory": os.path.join(directory, f"run{i}"),
+                    "ResultSaver/encoder": args.encoder,
+                })
+                results = context.Queue()
+                process = context.Process(target=run, args=(settings_path, args.trace, results))
+                process.start()
+                report = None
+                while report is None:
+                    try:
+                        report = results.get(timeout=1.0)
+                    except queue.Empty:
+                        if not process.is_alive():
+                            raise RuntimeError(f"Run at rate {rate} failed with exit code {process.exitcode}")
+                process.join()
+                report["rate"] = rate
+                reports.append(report)
+                print_report(rate, report)
+    finally:
+        if stand_in is not None:
+            stop_stand_in.set()
+            stand_in.join()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
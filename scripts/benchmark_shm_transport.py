@@ -0,0 +1,128 @@
+"""
+Frames/sec and CPU time of the gRPC and shared memory inference transports against local stand-in servers.
+The servers run in their own process; both only answer with empty results, so the numbers are transport overhead.
+    python -m scripts.benchmark_shm_transport --frames 400 --batch 4 --width 2048 --height 2048
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+from inference_service_proto import inference_service_pb2 as grpc_def
+from inference_service_proto import inference_service_pb2_grpc as grpc_service
+from services.inference_comm import InferenceComm
+from services.shm_transport import SharedMemoryInferenceComm, SharedMemoryStandInServer, empty_result
+from utils import image_codec
+
+UNLIMITED = [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1)]
+
+
+class EmptyInference(grpc_service.InferenceServicer):
+    def Inference(self, request, context):
+        images = [(image.name, image.images_data) for image in request.images]
+        return grpc_def.InferenceResult.FromString(empty_result(images, request.opt.num_image_returned))
+
+
+def serve_grpc(port, ready, stop):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), options=UNLIMITED)
+    grpc_service.add_InferenceServicer_to_server(EmptyInference(), server)
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    ready.set()
+    stop.wait()
+    server.stop(0)
+
+
+def serve_shm(port, ready, stop):
+    server = SharedMemoryStandInServer(f"127.0.0.1:{port}").start()
+    ready.set()
+    stop.wait()
+    server.close()
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(comm: InferenceComm, address, frame: bytes, frames, batch):
+    finished = 0
+    results = threading.Condition()
+
+    def on_result(_):
+        nonlocal finished
+        with results:
+            finished += 1
+            results.notify()
+
+    comm.result_chan.subscribe(on_result)
+    comm.error_chan.subscribe(print)
+    comm.connect(address)
+    deadline = time.time() + 10
+    while not comm.connection_chan.value:
+        if time.time() > deadline:
+            raise TimeoutError(f"Cannot connect to {address}")
+        time.sleep(0.01)
+
+    batches = frames // batch
+    wall, cpu = time.perf_counter(), time.process_time()
+    for i in range(batches):
+        # keep the in-flight window full
+        with results:
+            results.wait_for(lambda: not comm.saturated)
+        comm.feed_images([(frame, f"{i}_{j}") for j in range(batch)])
+    with results:
+        results.wait_for(lambda: finished == batches)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    comm.stop()
+    return batches * batch / wall, cpu / (batches * batch)
+
+
+def benchmark(transport, frame, args):
+    port = free_port()
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    target = serve_grpc if transport == "grpc" else serve_shm
+    server = multiprocessing.Process(target=target, args=(port, ready, stop), daemon=True)
+    server.start()
+    ready.wait()
+
+    if transport == "grpc":
+        comm = InferenceComm(args.in_flight)
+    else:
+        comm = SharedMemoryInferenceComm(args.in_flight, args.in_flight * args.batch, len(frame))
+    children = os.times()
+    fps, cpu_per_frame = run(comm, f"127.0.0.1:{port}", frame, args.frames, args.batch)
+    stop.set()
+    server.join()
+    after = os.times()
+    server_cpu = (after.children_user + after.children_system - children.children_user - children.children_system)
+    print(f"{transport:>5}: {fps:8.1f} frames/s, client CPU {cpu_per_frame * 1e3:6.2f} ms/frame, "
+          f"server CPU {server_cpu / args.frames * 1e3:6.2f} ms/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=400)
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--in-flight", type=int, default=2)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--transport", choices=("grpc", "shm", "both"), default="both")
+    args = parser.parse_args()
+
+    image = np.random.default_rng(0).integers(0, 255, (args.height, args.width), dtype=np.uint8)
+    frame = image_codec.pack_raw(image)
+    print(f"{args.frames} raw frames of {len(frame) / 1e6:.1f} MB, batch {args.batch}, {args.in_flight} in flight")
+    for transport in (("grpc", "shm") if args.transport == "both" else (args.transport,)):
+        benchmark(transport, frame, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import logging
 import time
 import typing
+from functools import partial
 
 import numpy as np
 from rx import operators
@@ -13,10 +14,18 @@ import services.service_provider
 from data_class.detected_objects import DetectedObject
 from data_class.subject_data import AcquiredImage, DetectionsInImage, SampleImageData
 from services import config
-from services.inference_comm import InferenceComm
+from services.encoding_stage import EncodingStage
+from services.inference_comm import InferenceComm, InferenceCommPool, parse_endpoints
+from services.shm_transport import SharedMemoryInferenceComm
 from services.subjects import Subjects
+from utils import metrics
+from utils.adaptive_batch import BatchSizeController, adaptive_buffer
 from utils.backpressure import bp_drop_report_full, bp_operator
 from utils.observer import ErrorToConsoleObserver
+from utils.stage_queue import stage_queue
+
+# image formats the inference servers decode, see RemoteAnalyzer.server_encoder
+SERVER_FORMATS = ("jpeg",)
 
 
 class Analyzer(object):
@@ -24,6 +33,7 @@ class Analyzer(object):
         super().__init__()
         self.logger = logging.getLogger("console")
         self.subjects: Subjects = services.service_provider.SubjectProvider().get_or_create_instance(None)
+        self.results_counter = metrics.counter("analyzer.results")
 
     def is_running(self):
         return self.subjects.analyzer_connected.value
@@ -38,6 +48,7 @@ class Analyzer(object):
         self.subjects.analyzer_back_pressure_detected.on_next(is_back_pressure)
 
     def produce_detected_results(self, detected_objects: DetectionsInImage):
+        self.results_counter.inc()
         self.subjects.detection_result.on_next(detected_objects)
 
     def produce_sample_image_data(self, data: SampleImageData):
@@ -56,7 +67,15 @@ class RemoteAnalyzer(Analyzer):
 
         self.config = config.SettingAccessor(self.config_prefix)
         self.batch_size = self.config["batch_size"]
-        self.inference_comm = InferenceComm()
+        self.encoder_name = self.server_encoder(self.config["encoder"])
+        self.encoder_requested = False
+        if self.config["adaptive_batch"]:
+            self.batch_controller = BatchSizeController(
+                self.batch_size, self.config["min_batch_size"], self.config["max_batch_size"],
+                self.config["target_latency"])
+        else:
+            self.batch_controller = None
+        self.inference_comm = InferenceCommPool(self.config["max_in_flight"], self.comm_factory())
         self._stop = subject.Subject()
         self.feed_scheduler = scheduler.ThreadPoolScheduler()
         self.process_scheduler = scheduler.ThreadPoolScheduler()
@@ -70,13 +89,30 @@ class RemoteAnalyzer(Analyzer):
             config.SettingRegistry("ip", "127.0.0.1"),
             config.SettingRegistry("port", "3034"),
             config.SettingRegistry("batch_size", 5, type="int", title="Inference batch size"),
+            config.SettingRegistry("encoder", "default", title="Image encoder (default, jpeg, archive_jpeg)"),
+            config.SettingRegistry("endpoints", "", title="Inference servers (host:port, comma separated)"),
+            config.SettingRegistry("transport", "grpc", title="Transport (grpc, shm for a server on this host)"),
+            config.SettingRegistry("shm_slot_count", 64, type="int", title="Shared memory slots"),
+            config.SettingRegistry("shm_slot_size", 16, type="int", title="Shared memory slot size (MiB)"),
+            config.SettingRegistry("max_in_flight", 2, type="int", title="Batches in flight per server"),
+            config.SettingRegistry("adaptive_batch", True, type="bool", title="Adapt batch size to the latency"),
+            config.SettingRegistry("min_batch_size", 1, type="int", title="Minimum adaptive batch size"),
+            config.SettingRegistry("max_batch_size", 16, type="int", title="Maximum adaptive batch size"),
+            config.SettingRegistry("target_latency", 0.5, type="float", title="Target inference latency (sec)"),
+            config.SettingRegistry("max_batch_wait", 0.2, type="float",
+                                   title="Send a partial batch after waiting (sec, 0 to disable)"),
+            config.SettingRegistry("queue_capacity", 64, type="int", title="Images queued for inference"),
+            config.SettingRegistry("queue_policy", "drop_oldest", type="str",
+                                   title="Queue overflow (block, drop_oldest, drop_newest, keep_latest)"),
         ])
 
     def configure_subscriptions(self, connected):
         if connected:
-            self.subjects.image_producer.pipe(
-                operators.observe_on(self.feed_scheduler),
-                operators.buffer_with_count(self.batch_size),
+            self.subjects.encoded_image_producer.pipe(
+                operators.filter(lambda image: image.for_inference),
+                stage_queue("inference feed", self.config["queue_capacity"], self.config["queue_policy"],
+                            self.feed_scheduler),
+                adaptive_buffer(self.current_batch_size, self.config["max_batch_wait"]),
                 bp_operator(BackPressure.DROP, 5),
                 operators.take_until(self._stop),
             ).subscribe(ErrorToConsoleObserver(self.feed_image))
@@ -107,9 +143,13 @@ class RemoteAnalyzer(Analyzer):
                 ErrorToConsoleObserver(lambda connected: self.logger.info(
                     "GRPC Remote analyzer connected" if connected else "GRPC Remote analyzer disconnected"
                 )))
-            self.inference_comm.stats_chan.take_until(self._stop).subscribe(
+            if self.batch_controller is not None:
+                self.inference_comm.stats_chan.pipe(operators.take_until(self._stop)).subscribe(
+                    ErrorToConsoleObserver(self.batch_controller.update))
+            self.inference_comm.stats_chan.pipe(operators.take_until(self._stop)).subscribe(
                 ErrorToConsoleObserver(
-                    lambda x: self.logger.info(f"Processed {x.frame} frames. Average {x.processTime / x.frame} secs"))
+                    lambda x: self.logger.info(
+                        f"{x.endpoint}: Processed {x.frame} frames. Average {x.processTime / max(x.frame, 1)} secs"))
             )
 
     def is_running(self):
@@ -121,13 +161,50 @@ class RemoteAnalyzer(Analyzer):
             return
         self.inference_comm.connection_chan.pipe(operators.take_until(self._stop)).subscribe(
             ErrorToConsoleObserver(self.configure_subscriptions))
-        self.inference_comm.connect_to_grpc_server(self.config["ip"], self.config["port"])
+        metrics.gauge("inference.in_flight", lambda: sum(e.in_flight for e in self.inference_comm.endpoints))
+        metrics.gauge("inference.batch_size", self.current_batch_size)
+        if not self.encoder_requested:
+            EncodingStage.request_encoder(self.encoder_name)
+            self.encoder_requested = True
+        self.inference_comm.connect(self.endpoint_addresses())
         super(RemoteAnalyzer, self).start()
 
+    def server_encoder(self, name):
+        """
+        The requests carry no image format and the inference servers decode JPEG, so only JPEG encoders can be used.
+        """
+        encoder_type = services.service_provider.ImageEncoderProvider.name_mapping.get(name or "default")
+        if getattr(encoder_type, "format", None) not in SERVER_FORMATS:
+            self.logger.warning(f"The inference servers cannot decode images of encoder {name}. Using default.")
+            return "default"
+        return name
+
+    def comm_factory(self):
+        transport = self.config["transport"]
+        if transport == "shm":
+            return partial(SharedMemoryInferenceComm, slot_count=self.config["shm_slot_count"],
+                           slot_size=self.config["shm_slot_size"] * 1024 * 1024)
+        if transport != "grpc":
+            self.logger.warning(f"Unknown transport {transport}. Using grpc.")
+        return InferenceComm
+
+    def current_batch_size(self):
+        if self.batch_controller is None:
+            return self.batch_size
+        return self.batch_controller.batch_size
+
+    def endpoint_addresses(self):
+        return parse_endpoints(self.config["endpoints"], self.config["ip"], self.config["port"])
+
     def clean(self):
         self.inference_comm.stop()
+        for address, stats in self.inference_comm.endpoint_stats().items():
+            self.logger.info(f"Inference server {address}: {stats}")
 
     def stop(self):
+        if self.encoder_requested:
+            EncodingStage.release_encoder(self.encoder_name)
+            self.encoder_requested = False
         self.clean()
         self._stop.on_next(True)
         self._stop.on_completed()
@@ -138,13 +215,14 @@ class RemoteAnalyzer(Analyzer):
         try:
             images_to_feed = []
             for images in acquired_images:
-                images_to_feed.append((images.encoded_buffer, images.name))
+                images_to_feed.append((images.encoded_as(self.encoder_name), images.name))
 
             self.inference_comm.feed_images(images_to_feed)
 
         except Exception as e:
             self.logger.error(f"Failed to feed image: {e}")
 
+    @metrics.timed("inference.result_parsing")
     def result_processing(self, result: grpc_def.InferenceResult):
         # Emit result objects
         sample_image_ids = []
@@ -171,15 +249,22 @@ class RemoteAnalyzer(Analyzer):
 
 
 class TestAnalyzer(Analyzer):
+    config_prefix = "Test_Analyzer"
+
     def __init__(self):
         super().__init__()
+        self.config = config.SettingAccessor(self.config_prefix)
         self._stop = subject.Subject()
         self.scheduler = scheduler.ThreadPoolScheduler()
+        self.encoder_requested = False
 
     def start(self):
+        if not self.encoder_requested:
+            EncodingStage.request_encoder(None)
+            self.encoder_requested = True
         # report more image when back pressure
         self.subjects.image_producer.pipe(
-            operators.observe_on(self.scheduler),
+            stage_queue("test analyzer monitor", 64, "drop_oldest", self.scheduler),
             operators.combine_latest(self.subjects.analyzer_back_pressure_detected),
             operators.filter(lambda x: x[1]),  # only operate when back pressure
             operators.buffer_with_time(1.0),  # in 1 sec
@@ -188,8 +273,9 @@ class TestAnalyzer(Analyzer):
             operators.take_until(self._stop),
         ).subscribe(self.report_back_pressure_emission)
 
-        self.subjects.image_producer.pipe(
-            operators.observe_on(self.scheduler),  # prevent blocking the upstream subject
+        self.subjects.encoded_image_producer.pipe(
+            operators.filter(lambda image: image.for_inference),
+            stage_queue("test analyzer", 64, "drop_oldest", self.scheduler),  # prevent blocking the upstream subject
             operators.filter(self.back_pressure_barrier),
             operators.buffer_with_count(5),
             bp_drop_report_full(self.subjects.analyzer_back_pressure_detected, 3, 1),
@@ -197,20 +283,29 @@ class TestAnalyzer(Analyzer):
         ).subscribe(ErrorToConsoleObserver(self.produce_fake_analyze_data))
         super(TestAnalyzer, self).start()
 
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("processing_time", 1.0, type="float", title="Simulated time per batch (sec)"),
+        ])
+
     def stop(self):
         self._stop.on_next(0)
+        if self.encoder_requested:
+            EncodingStage.release_encoder(None)
+            self.encoder_requested = False
         super(TestAnalyzer, self).stop()
 
     def produce_fake_analyze_data(self, x: typing.List[AcquiredImage]):
         from pycocotools import mask as mask_util
-        time.sleep(1)  # simulate processing time
+        time.sleep(self.config["processing_time"])  # simulate processing time
         fake_obj = DetectedObject()
         canvas = np.zeros((600, 800), dtype=np.uint8)
         canvas[10:300, 10:300] = True
         rle = mask_util.encode(np.asfortranarray(canvas))
         fake_obj.maskRLE = rle
-        fake_obj.mask = canvas
-        fake_obj.bbox = mask_util.toBbox(rle).tolist()
+        fake_obj.bbox = fake_obj.rle_bbox
         fake_obj.label = 1
         fake_obj.score = 1
 
@@ -1,4 +1,5 @@
 import os
+import threading
 import typing
 from pydoc import locate
 from rx import subject
@@ -15,20 +16,109 @@ class SettingRegistry(object):
         self.key = key
 
 
+# typed values by full key ("section/key"). QSettings is only read on a miss.
+_cache: typing.Dict[str, object] = {}
+_cache_lock = threading.Lock()
+
+
+def get_value(key: str):
+    """
+    Typed value of a setting, cached until the setting is updated.
+    :param key: full key "section/key"
+    """
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    with _cache_lock:
+        type = global_settings.value(f"{key}/type", defaultValue="str")
+        value = global_settings.value(key, type=locate(type))
+        _cache[key] = value
+    return value
+
+
+def invalidate(key: str = None):
+    """
+    Drop a cached value (all values if key is None) so that the next read goes to QSettings.
+    """
+    with _cache_lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
+
+
 class SettingAccessor(object):
     def __init__(self, section=None):
         self.section = f"{section}/" if section else ""
 
     def __getitem__(self, item):
-        type = global_settings.value(f"{self.section}{item}/type", defaultValue="str")
-        return global_settings.value(f"{self.section}{item}", type=locate(type))
+        return get_value(f"{self.section}{item}")
 
     def __setitem__(self, key, value):
         k = f"{self.section}{key}"
         global_settings.setValue(k, value)
+        invalidate(k)
         setting_updated_channel.on_next((k, value))
 
 
+class SettingSnapshot(object):
+    """
+    The settings of a section as plain attributes, e.g. section("ResultSaver").enabled. Attributes are refreshed
+    when a setting of the section is updated, so hot paths can hold the object and read it without any lookup.
+    Use section() to get the shared instance of a section.
+    """
+
+    def __init__(self, section: str):
+        super(SettingSnapshot, self).__init__()
+        self._prefix = f"{section}/"
+        self._reload()
+        self._subscription = setting_updated_channel.subscribe(self._on_update)
+
+    def _name(self, key: str):
+        if not key.startswith(self._prefix):
+            return None
+        name = key[len(self._prefix):]
+        # "key/type" and "key/title" are metadata
+        return None if "/" in name else name
+
+    def _on_update(self, update):
+        name = self._name(update[0])
+        if name is not None:
+            setattr(self, name, get_value(update[0]))
+
+    def __getattr__(self, name):
+        # settings registered after the snapshot was taken
+        if name.startswith("_"):
+            raise AttributeError(name)
+        value = get_value(self._prefix + name)
+        setattr(self, name, value)
+        return value
+
+    def _reload(self):
+        for key in global_settings.allKeys():
+            name = self._name(key)
+            if name is not None:
+                setattr(self, name, get_value(key))
+
+    def _dispose(self):
+        self._subscription.dispose()
+
+
+_snapshots: typing.Dict[str, SettingSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def section(name: str) -> SettingSnapshot:
+    """
+    :return: the shared snapshot of a settings section
+    """
+    with _snapshots_lock:
+        if name not in _snapshots:
+            _snapshots[name] = SettingSnapshot(name)
+        return _snapshots[name]
+
+
 class DefaultSettingRegistration(object):
     def __init__(self, section):
         self.section = section
@@ -39,6 +129,8 @@ class DefaultSettingRegistration(object):
 
 setting_path = os.path.abspath(os.path.join("Configs", "settings.ini"))
 global_settings = QtCore.QSettings(setting_path, QtCore.QSettings.IniFormat)
+# registered defaults by section, applied again when switching to another settings file
+_registered: typing.Dict[str, typing.List[SettingRegistry]] = {}
 
 
 def default_settings(section: str, defaults: typing.Iterable[SettingRegistry]):
@@ -47,13 +139,41 @@ def default_settings(section: str, defaults: typing.Iterable[SettingRegistry]):
     :param section:
     :param defaults:
     """
+    defaults = list(defaults)
+    registered = _registered.setdefault(section, [])
+    registered += [d for d in defaults if d not in registered]
     for d in defaults:
         key = section + "/" + d.key
         if global_settings.contains(key):
+            # hand written settings files carry the values only
+            if d.type != "str" and not global_settings.contains(f"{key}/type"):
+                global_settings.setValue(f"{key}/type", d.type)
+                invalidate(key)
             continue
         global_settings.setValue(key, d.value)
         if d.type != "str":
             global_settings.setValue(f"{key}/type", d.type)
         if d.title is not None:
             global_settings.setValue(f"{key}/title", d.title)
+        invalidate(key)
+        snapshot = _snapshots.get(section)
+        if snapshot is not None:
+            setattr(snapshot, d.key, get_value(key))
     global_settings.sync()
+
+
+def use_settings_file(path: str):
+    """
+    Read and write the settings from another INI file, e.g. the configuration of a headless run. Missing keys are
+    filled with the registered defaults.
+    """
+    global global_settings, setting_path
+    setting_path = os.path.abspath(path)
+    global_settings = QtCore.QSettings(setting_path, QtCore.QSettings.IniFormat)
+    invalidate()
+    for section_name, defaults in list(_registered.items()):
+        default_settings(section_name, defaults)
+    with _snapshots_lock:
+        snapshots = list(_snapshots.values())
+    for snapshot in snapshots:
+        snapshot._reload()
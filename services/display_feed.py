@@ -0,0 +1,92 @@
+"""
+Feed of live images to a display widget.
+Only the newest frame is kept. It is downsampled to the pixel size of the widget on a worker thread, and at most
+max_fps frames per second are handed to the GUI, so the GUI never queues full resolution frames whatever the camera
+rate is.
+"""
+import time
+from typing import Callable, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+import rx
+from rx import scheduler
+
+from data_class.subject_data import AcquiredImage
+from services import config
+from utils import metrics
+from utils.stage_queue import stage_queue
+
+
+def fit_to(image: np.ndarray, size: Optional[Tuple[int, int]]) -> np.ndarray:
+    """
+    Downsample to fit in size, keeping the aspect ratio. Images already fitting are returned as is.
+    :param size: (width, height) in pixels, None or empty to keep the image
+    """
+    if not size or size[0] <= 0 or size[1] <= 0:
+        return image
+    height, width = image.shape[:2]
+    scale = min(size[0] / width, size[1] / height)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)),
+                      interpolation=cv2.INTER_AREA)
+
+
+class DisplayFeed(object):
+    config_prefix = "Display"
+
+    def __init__(self, name, target_size: Callable[[], Optional[Tuple[int, int]]] = None):
+        """
+        :param name: names the queue and the metrics
+        :param target_size: (width, height) of the widget in device pixels, read for every frame
+        """
+        super(DisplayFeed, self).__init__()
+        self.name = name
+        self.target_size = target_size or (lambda: None)
+        self.settings = config.section(self.config_prefix)
+        self.scheduler = scheduler.EventLoopScheduler()
+        self.resize_time = metrics.histogram(f"display.{name}.resize")
+        self.shown_counter = metrics.counter(f"display.{name}.frames")
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("max_fps", 20.0, type="float", title="Live display rate limit (fps, 0 = none)"),
+            config.SettingRegistry("downsample", True, type="bool", title="Downsample live images to the panel size"),
+        ])
+
+    def prepare(self, image: Union[AcquiredImage, np.ndarray]):
+        if not self.settings.downsample:
+            return image
+        with self.resize_time.time():
+            if isinstance(image, AcquiredImage):
+                resized = fit_to(image.image, self.target_size())
+                if resized is image.image:
+                    return image
+                return AcquiredImage(resized, image.time, image.name, image.for_inference)
+            return fit_to(image, self.target_size())
+
+    def __call__(self, source: rx.Observable) -> rx.Observable:
+        """
+        Operator: source -> prepared frames, on the worker thread.
+        """
+
+        def subscribe(observer, subscribe_scheduler=None):
+            def on_next(image):
+                started = time.perf_counter()
+                observer.on_next(self.prepare(image))
+                self.shown_counter.inc()
+                # frames arriving meanwhile replace each other in the keep_latest queue
+                max_fps = self.settings.max_fps
+                if max_fps > 0:
+                    remaining = 1.0 / max_fps - (time.perf_counter() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+
+            return source.pipe(
+                stage_queue(f"display {self.name} feed", 1, "keep_latest", self.scheduler),
+            ).subscribe_(on_next, observer.on_error, observer.on_completed, subscribe_scheduler)
+
+        return rx.create(subscribe)
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+from rx import operators, subject
+
+import services.service_provider
+from data_class.subject_data import AcquiredImage
+from services import config
+from services.image_encoder import ImageEncoder
+from services.subjects import Subjects
+from utils import metrics, tracing
+from utils.observer import ErrorToConsoleObserver
+
+
+class EncodingStage(object):
+    """
+    Encode every acquired frame exactly once per requested encoder on a thread pool and republish it on
+    Subjects.encoded_image_producer in acquisition order. The encoders release the GIL, so the workers run in
+    parallel. Frames arriving while max_pending frames are still being encoded block the image source, or are dropped
+    if the overflow setting says so. Blocking is the default, the storage reads from this stage.
+    Consumers announce the encoders they read with request_encoder, and release_encoder them when they stop reading.
+    """
+    config_prefix = "Encoding_Stage"
+    # encoder name -> number of consumers. Replaced, never mutated, so encode iterates it without locking.
+    requested_encoders: Dict[str, int] = {}
+    _requests_lock = threading.Lock()
+
+    def __init__(self, encoders: Dict[str, ImageEncoder] = None):
+        """
+        :param encoders: encoder instances by name, overriding ImageEncoderProvider
+        """
+        super(EncodingStage, self).__init__()
+        self.logger = logging.getLogger("console")
+        self.config = config.SettingAccessor(self.config_prefix)
+        self.subjects: Subjects = services.service_provider.SubjectProvider().get_or_create_instance(None)
+        self.encoders = dict(encoders or {})
+
+        self.workers = self.config["workers"] or os.cpu_count() or 1
+        self.max_pending = max(self.config["max_pending"], self.workers)
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="encoder")
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.publish_lock = threading.Lock()
+        self.closed = False
+        self.dropped = 0
+        self.encoded = 0
+        self.encode_latency = metrics.histogram("encode")
+        self.dropped_counter = metrics.counter("encode.dropped")
+        self.blocked_counter = metrics.counter("encode.blocked")
+        metrics.gauge("encode.pending", lambda: len(self.pending))
+
+        self._stop = subject.Subject()
+        self.subjects.image_producer.pipe(
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(self.submit))
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("workers", 0, type="int", title="Encoding threads (0 = number of cores)"),
+            config.SettingRegistry("max_pending", 32, type="int", title="Frames waiting for encoding at most"),
+            config.SettingRegistry("overflow", "block", type="str",
+                                   title="When max_pending frames wait (block the source, drop)"),
+        ])
+
+    @classmethod
+    def request_encoder(cls, name: str = None):
+        """
+        Encode every frame with this encoder until the matching release_encoder. Names of the same encoder, e.g.
+        default and jpeg, share one encoding.
+        """
+        key = services.service_provider.ImageEncoderProvider().canonical_name(name)
+        with cls._requests_lock:
+            requested = dict(cls.requested_encoders)
+            requested[key] = requested.get(key, 0) + 1
+            cls.requested_encoders = requested
+
+    @classmethod
+    def release_encoder(cls, name: str = None):
+        key = services.service_provider.ImageEncoderProvider().canonical_name(name)
+        with cls._requests_lock:
+            requested = dict(cls.requested_encoders)
+            if requested.get(key, 0) <= 1:
+                requested.pop(key, None)
+            else:
+                requested[key] -= 1
+            cls.requested_encoders = requested
+
+    def encoder(self, name) -> ImageEncoder:
+        if name not in self.encoders:
+            self.encoders[name] = services.service_provider.ImageEncoderProvider().get_encoder(name)
+        return self.encoders[name]
+
+    def encode(self, image: AcquiredImage):
+        with self.encode_latency.time(), tracing.span(image.name, tracing.ENCODE):
+            for name in self.requested_encoders:
+                image.encoded_as(name, self.encoder(name))
+
+    def submit(self, image: AcquiredImage):
+        with self.condition:
+            if len(self.pending) >= self.max_pending and self.config["overflow"] != "drop":
+                self.blocked_counter.inc()
+                self.condition.wait_for(lambda: len(self.pending) < self.max_pending or self.closed)
+            if self.closed:
+                return
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                self.dropped_counter.inc()
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    self.logger.warning(f"Encoding cannot keep up with the image source. {self.dropped} frames dropped")
+                return
+            future = self.executor.submit(self.encode, image)
+            self.pending.append((image, future))
+        future.add_done_callback(self._publish_ready)
+
+    def _publish_ready(self, _=None):
+        # one thread publishes at a time, which keeps the frames in order whichever worker finishes first. The
+        # consumers run outside of the condition, so a slow one does not hold back submit and the other workers.
+        while self.publish_lock.acquire(blocking=False):
+            try:
+                with self.condition:
+                    ready = []
+                    while self.pending and self.pending[0][1].done():
+                        ready.append(self.pending.popleft())
+                    self.condition.notify_all()
+                for image, future in ready:
+                    future: Future
+                    if future.exception() is not None:
+                        self.logger.error(f"Failed to encode {image.name}: {future.exception()}")
+                        continue
+                    self.encoded += 1
+                    self.subjects.encoded_image_producer.on_next(image)
+            finally:
+                self.publish_lock.release()
+            # a frame finished while publishing left its publication to this thread
+            with self.condition:
+                if not (self.pending and self.pending[0][1].done()):
+                    return
+
+    def finalize(self):
+        self._stop.on_next(True)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,183 @@
+"""
+The acquisition pipeline without any widget: image source -> encoding stage -> analyzer -> ResultProcessor and
+ResultSaver, wired through the same providers and settings as the GUI.
+Select the settings file with config.use_settings_file before importing this module, otherwise the defaults are
+registered in the GUI settings file.
+"""
+import logging
+import sys
+import threading
+import time
+from typing import Optional
+
+from rx import operators, subject
+
+from services import config
+from services.service_provider import AnalyzerProvider, EncodingStageProvider, ImageSourceProvider, \
+    ResultProcessorProvider, ResultSaverProvider, SubjectProvider
+from services.subjects import Subjects
+from utils import metrics, tracing
+from utils.observer import ErrorToConsoleObserver
+from utils.stage_queue import stage_queues
+
+# sources opening dialogs
+INTERACTIVE_SOURCES = ("files",)
+
+
+def peak_rss() -> Optional[int]:
+    """
+    :return: peak resident set size of this process in bytes, None if unknown on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows: psutil reports the peak working set, if installed
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class HeadlessPipeline(object):
+    def __init__(self, source: str = None, analyzer: str = None):
+        """
+        :param source: name in ImageSourceProvider, Image_Source/source if None
+        :param analyzer: name in AnalyzerProvider, Analyzers/analyzer if None
+        """
+        super(HeadlessPipeline, self).__init__()
+        self.logger = logging.getLogger("console")
+        source = source or config.SettingAccessor("Image_Source")["source"] or "replay"
+        analyzer = analyzer or config.SettingAccessor("Analyzers")["analyzer"] or "test"
+        if source in INTERACTIVE_SOURCES:
+            raise ValueError(f"The {source} image source needs a dialog. Use replay for headless runs.")
+
+        self.subjects: Subjects = SubjectProvider().get_or_create_instance(None)
+        self.encoding_stage_provider = EncodingStageProvider()
+        self.result_processor_provider = ResultProcessorProvider()
+        self.result_saver_provider = ResultSaverProvider()
+        self.image_source_provider = ImageSourceProvider()
+        self.analyzer_provider = AnalyzerProvider()
+
+        self.encoding_stage = self.encoding_stage_provider.get_or_create_instance(None)
+        self.result_processor = self.result_processor_provider.get_or_create_instance(None)
+        self.result_saver = self.result_saver_provider.get_or_create_instance(None)
+        self.image_source_provider.replace_instance_with(source)
+        self.analyzer_provider.replace_instance_with(analyzer)
+        self.source = self.image_source_provider.get_instance()
+        self.analyzer = self.analyzer_provider.get_instance()
+        self.source_name, self.analyzer_name = source, analyzer
+
+        self.lock = threading.Lock()
+        self.results = 0
+        self.first_result = None
+        self.last_result = None
+        self.started = None
+        self.source_stopped = None
+        self.start_snapshot = None
+        self._stop = subject.Subject()
+        self.subjects.detection_result.pipe(
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(self._count_result))
+
+    def _count_result(self, _):
+        now = time.perf_counter()
+        with self.lock:
+            self.results += 1
+            self.last_result = now
+            if self.first_result is None:
+                self.first_result = now
+
+    def start(self):
+        self.start_snapshot = metrics.registry.snapshot()
+        self.started = time.perf_counter()
+        self.analyzer.start()
+        self.source.start()
+
+    def wait(self, duration: float = None) -> bool:
+        """
+        Wait until the source finished or for duration seconds, forever if the source never finishes and duration is
+        None.
+        :return: True if the source finished
+        """
+        finished = getattr(self.source, "finished", None) or threading.Event()
+        deadline = None if duration is None else time.perf_counter() + duration
+        # short waits keep the main thread responsive to KeyboardInterrupt
+        while not finished.is_set():
+            remaining = 1.0 if deadline is None else min(deadline - time.perf_counter(), 1.0)
+            if remaining <= 0:
+                return False
+            finished.wait(remaining)
+        return True
+
+    def idle(self) -> bool:
+        return not self.encoding_stage.pending and all(len(q) == 0 for q in stage_queues())
+
+    def drain(self, quiet=1.0, timeout=30.0) -> bool:
+        """
+        Wait until the queues are empty and no result arrived for quiet seconds.
+        :return: False on timeout
+        """
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            now = time.perf_counter()
+            last = self.last_result or self.started or now
+            if self.idle() and now - last >= quiet:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self, quiet=1.0, timeout=30.0):
+        self.source.stop()
+        self.source_stopped = time.perf_counter()
+        if not self.drain(quiet, timeout):
+            self.logger.warning(f"Pipeline did not drain within {timeout} sec")
+        self.analyzer.stop()
+        self.result_saver.flush()
+
+    def finalize(self):
+        self._stop.on_next(True)
+        self.result_saver.finalize()
+        self.result_processor.finalize()
+        self.encoding_stage.finalize()
+
+    def report(self) -> dict:
+        """
+        Call before finalize, the stage queues are gone afterwards.
+        :return: {
+            "frames", "results": counts, "source_fps", "result_fps": frames/sec,
+            "latency": {histogram: {"count", "mean", "p50", "p90", "p99", "max"}} in seconds,
+            "trace": tracing.Tracer.summary() if tracing is enabled,
+            "queues": {name: StageQueue.metrics()}, "peak_rss": bytes or None,
+        }
+        """
+        end = metrics.registry.snapshot()
+        summary = metrics.summarize(self.start_snapshot, end)
+        elapsed = summary["interval"]
+        counters = {name: value - self.start_snapshot["counters"].get(name, 0)
+                    for name, value in end["counters"].items()}
+        frames = counters.get("source.frames", 0)
+        with self.lock:
+            results, first, last = self.results, self.first_result, self.last_result
+        result_span = last - self.started if last is not None else None
+        source_span = (self.source_stopped or time.perf_counter()) - self.started
+
+        return {
+            "source": self.source_name,
+            "analyzer": self.analyzer_name,
+            "elapsed": elapsed,
+            "frames": frames,
+            "results": results,
+            "source_fps": frames / source_span if source_span else None,
+            "result_fps": results / result_span if result_span else None,
+            "first_result": first - self.started if first is not None else None,
+            "latency": {name: h for name, h in summary["histograms"].items() if h["count"]},
+            "counters": counters,
+            "gauges": summary["gauges"],
+            "trace": tracing.tracer.summary() if tracing.tracer.enabled else None,
+            "queues": {q.name: q.metrics() for q in stage_queues()},
+            "peak_rss": peak_rss(),
+        }
@@ -1,23 +1,35 @@
 """
 Encode ndarray into bytes
 """
+import threading
+
+import cv2
 import numpy as np
 import turbojpeg as tj
 from services import config
+from utils import image_codec
 import sys
 
 
 class ImageEncoder(object):
+    # stored next to the encoded data so readers know how to decode it
+    format = None
+
     def encode(self, image: np.ndarray):
         pass
 
+    def decode(self, buffer) -> np.ndarray:
+        return image_codec.decode(buffer, self.format)
+
 
 class JPEGEncoder(ImageEncoder):
     config_prefix = "JPEGEncoder"
+    format = "jpeg"
 
     def __init__(self):
         self.config = config.SettingAccessor(self.config_prefix)
-        self.encoder = tj.TurboJPEG(self.config["turbo_jpeg_library"])
+        self.settings = config.section(self.config_prefix)
+        self.encoder = tj.TurboJPEG(config.SettingAccessor(JPEGEncoder.config_prefix)["turbo_jpeg_library"])
 
     @staticmethod
     @config.DefaultSettingRegistration(config_prefix)
@@ -35,8 +47,86 @@ class JPEGEncoder(ImageEncoder):
 
     def encode(self, image: np.ndarray):
         if len(image.shape) == 2:
-            return self.encoder.encode(image[:, :, np.newaxis], quality=self.config["quality"],
+            return self.encoder.encode(image[:, :, np.newaxis], quality=self.settings.quality,
                                        jpeg_subsample=tj.TJSAMP_GRAY, pixel_format=tj.TJPF_GRAY)
 
         else:
             raise NotImplementedError("Multi-channel image encoding is not supported.")
+
+    def decode(self, buffer) -> np.ndarray:
+        return self.encoder.decode(bytes(buffer), pixel_format=tj.TJPF_GRAY)[:, :, 0]
+
+
+class ArchiveJPEGEncoder(JPEGEncoder):
+    """
+    JPEG with its own (higher) quality, for archiving next to a lower quality inference feed.
+    The TurboJPEG library path is shared with JPEGEncoder.
+    """
+    config_prefix = "ArchiveJPEGEncoder"
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("quality", 98, type="int", title="JPEG encoding quality"),
+        ])
+
+
+class RawEncoder(ImageEncoder):
+    """
+    Pixels with a small header, no compression. Costs no CPU when the consumer is on the same host.
+    """
+    format = "raw"
+
+    def encode(self, image: np.ndarray):
+        return image_codec.pack_raw(image)
+
+
+class PNGEncoder(ImageEncoder):
+    config_prefix = "PNGEncoder"
+    format = "png"
+
+    def __init__(self):
+        self.config = config.SettingAccessor(self.config_prefix)
+        self.settings = config.section(self.config_prefix)
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("compression", 1, type="int", title="PNG compression level (0-9)"),
+        ])
+
+    def encode(self, image: np.ndarray):
+        ok, buffer = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, self.settings.compression])
+        if not ok:
+            raise RuntimeError("PNG encoding failed")
+        return buffer.tobytes()
+
+
+class ZstdEncoder(ImageEncoder):
+    """
+    Raw pixels compressed with zstandard. Lossless and much faster than PNG. Requires the zstandard package.
+    """
+    config_prefix = "ZstdEncoder"
+    format = "zstd"
+
+    def __init__(self):
+        self.config = config.SettingAccessor(self.config_prefix)
+        self.zstd = image_codec.zstd()
+        self.level = self.config["level"]
+        # compressor contexts are not thread-safe
+        self._local = threading.local()
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("level", 3, type="int", title="Zstandard compression level"),
+        ])
+
+    def encode(self, image: np.ndarray):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = self.zstd.ZstdCompressor(level=self.level)
+        return compressor.compress(image_codec.pack_raw(image))
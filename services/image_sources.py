@@ -1,6 +1,8 @@
 import glob
 import logging
 import os
+import threading
+import time
 from datetime import datetime
 from threading import Condition
 
@@ -18,9 +20,14 @@ from rx.scheduler import ThreadPoolScheduler
 import services.service_provider
 from data_class.subject_data import AcquiredImage
 from services import config
+from services.storage_reader import StorageReader
+from services.storage_writer import list_segments
 from services.subjects import Subjects
 from utils.QtScheduler import QtScheduler
 from utils.backpressure import bp_operator
+from utils.frame_pacing import FrameDecimator, FrameTiming
+from utils import image_codec, metrics, tracing
+from utils.frame_pool import FramePool
 from utils.observer import ErrorToConsoleObserver
 from rxpy_backpressure import BackPressure
 
@@ -34,6 +41,7 @@ class ImageSource(object):
         super().__init__()
         self.subject_provider = services.service_provider.SubjectProvider()
         self.subjects: Subjects = self.subject_provider.get_or_create_instance(None)
+        self.frames_counter = metrics.counter("source.frames")
 
     def start(self):
         self.subjects.image_source_connected.on_next(True)
@@ -45,6 +53,8 @@ class ImageSource(object):
         return self.subjects.image_source_connected.value
 
     def next_image(self, img: AcquiredImage):
+        self.frames_counter.inc()
+        tracing.instant(img.name, tracing.ACQUISITION)
         self.subjects.image_producer.on_next(img)
 
 
@@ -102,9 +112,124 @@ class MockImageSource(ImageSource):
         super().stop()
 
 
+class ReplaySource(ImageSource):
+    """
+    Replay a directory of image files (e.g. TestImages) or a capture written by ResultSaver, at a fixed rate or as
+    fast as possible. The images are decoded before the replay starts so that the disk is not part of the
+    measurement. Runs without any dialog, for headless runs and benchmarks.
+    """
+    config_prefix = "Replay_Source"
+    image_extensions = (".png", ".jpeg", ".jpg", ".bmp", ".tiff", ".tif")
+
+    def __init__(self):
+        super().__init__()
+        self.config = config.SettingAccessor(self.config_prefix)
+        self.logger = logging.getLogger("console")
+        self.images = []
+        self.thread = None
+        self.stop_requested = threading.Event()
+        self.finished = threading.Event()
+        self.back_pressure_lock = Condition()
+        self.produced = 0
+        self._stop = subject.Subject()
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def defaultSettings(configPrefix):
+        config.default_settings(configPrefix, [
+            config.SettingRegistry("path", "TestImages", type="str", title="Image directory or capture directory"),
+            config.SettingRegistry("fps", 10, type="float", title="Replay rate (frames/sec, 0 = as fast as possible)"),
+            config.SettingRegistry("frames", 0, type="int", title="Frames to replay (0 = until stopped)"),
+            config.SettingRegistry("max_images", 256, type="int", title="Distinct images loaded"),
+            config.SettingRegistry("follow_back_pressure", False, type="bool",
+                                   title="Pause while the analyzer reports back pressure"),
+        ])
+
+    def load_images(self, path, max_images):
+        """
+        :return: list of (name, grayscale or color array)
+        """
+        if list_segments(path, "images"):
+            reader = StorageReader(path)
+            try:
+                images = []
+                for i in range(min(len(reader), max_images)):
+                    record = reader.image(i)
+                    images.append((record["name"], image_codec.decode(record["data"], record.get("format"))))
+                return images
+            finally:
+                reader.close()
+
+        paths = sorted(p for p in glob.glob(os.path.join(path, "*")) if
+                       os.path.splitext(p)[1].lower() in self.image_extensions)[:max_images]
+        return [(os.path.basename(p), cv2.imread(p, cv2.IMREAD_GRAYSCALE)) for p in paths]
+
+    def start(self):
+        if self.is_running():
+            return
+        path = self.config["path"]
+        self.images = [(name, image) for name, image in self.load_images(path, self.config["max_images"])
+                       if image is not None]
+        if not self.images:
+            raise FileNotFoundError(f"No image to replay in {path}")
+
+        self.stop_requested.clear()
+        self.finished.clear()
+        self.produced = 0
+        if self.config["follow_back_pressure"]:
+            self.subjects.analyzer_back_pressure_detected.pipe(
+                operators.take_until(self._stop),
+            ).subscribe(self.notify_back_pressure_changed)
+        self.thread = threading.Thread(target=self._replay, args=(self.config["fps"], self.config["frames"]),
+                                       name="replay", daemon=True)
+        self.thread.start()
+        super().start()
+
+    def _replay(self, fps, frames):
+        follow_back_pressure = self.config["follow_back_pressure"]
+        start = time.perf_counter()
+        try:
+            while not self.stop_requested.is_set() and (frames <= 0 or self.produced < frames):
+                if fps > 0:
+                    delay = start + self.produced / fps - time.perf_counter()
+                    if delay > 0 and self.stop_requested.wait(delay):
+                        break
+                if follow_back_pressure:
+                    with self.back_pressure_lock:
+                        self.back_pressure_lock.wait_for(
+                            lambda: not self.subjects.analyzer_back_pressure_detected.value or
+                                    self.stop_requested.is_set())
+                name, image = self.images[self.produced % len(self.images)]
+                self.next_image(AcquiredImage(image, datetime.now().timestamp(), f"{self.produced:08d}_{name}"))
+                self.produced += 1
+        except Exception as ex:
+            self.logger.error(f"Replay stopped: {ex}")
+        finally:
+            self.finished.set()
+
+    def notify_back_pressure_changed(self, x):
+        if not x:
+            with self.back_pressure_lock:
+                self.back_pressure_lock.notify_all()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        self.stop_requested.set()
+        with self.back_pressure_lock:
+            self.back_pressure_lock.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self._stop.on_next(True)
+        super().stop()
+
+
 class HarvestersSource(ImageSource):
     """
-    This source disregard analyzer back pressure. User has to control the frame rate.
+    The camera runs at the configured rate regardless of the analyzer. Dropped and late frames are counted from the
+    camera timestamps, and frames can be decimated away from inference while the analyzer reports back pressure
+    (see FrameDecimator); all frames still reach storage and display.
     """
     config_prefix = "Harvesters_Source"
 
@@ -113,8 +238,14 @@ class HarvestersSource(ImageSource):
 
         super().__init__()
         self.config = config.SettingAccessor(self.config_prefix)
+        self.settings = config.section(self.config_prefix)
         self.logger = logging.getLogger("console")
         self._stop = subject.Subject()
+        self.frame_pool = FramePool(self.config["pool_size"])
+        self.reported_exhaustion = 0
+        self.timing = FrameTiming()
+        self.decimator = FrameDecimator()
+        self.last_drop_report = 0
         self.driver = Harvester()
         self.driver.add_cti_file(self.config["cti_path"])
         self.acquirer = None
@@ -134,7 +265,14 @@ class HarvestersSource(ImageSource):
             config.SettingRegistry("gain", 0, type="float"),
             config.SettingRegistry("invert_polarity", False, type="bool", title="Invert polarity"),
             config.SettingRegistry("id", "", type="str", title="Camera Id (use camera_id.py)"),
-            config.SettingRegistry("fps", 5, type="float", title="frame per second")
+            config.SettingRegistry("fps", 5, type="float", title="frame per second"),
+            config.SettingRegistry("pool_size", 16, type="int", title="Recycled frame buffers"),
+            config.SettingRegistry("zero_copy", False, type="bool",
+                                   title="Pass driver buffers without copying (holds them until released)"),
+            config.SettingRegistry("decimation", "none", type="str",
+                                   title="Inference decimation under back pressure (none, every_nth, latest)"),
+            config.SettingRegistry("decimation_n", 2, type="int", title="Keep every nth frame for inference"),
+            config.SettingRegistry("late_threshold", 0.05, type="float", title="Late frame threshold (sec)"),
         ])
 
     def _read_buffer(self):
@@ -146,13 +284,42 @@ class HarvestersSource(ImageSource):
             height = component.height
             content = component.data.reshape(height, width)
             time = buffer.timestamp_ns
-            self.next_image(AcquiredImage(content.copy(), time / 1e9, f"{time}.jpg"))
-            buffer.queue()
+            self._account(time / 1e9)
+            for_inference = self.decimator.select(self.subjects.analyzer_back_pressure_detected.value)
+            self.next_image(AcquiredImage(self._frame(buffer, content), time / 1e9, f"{time}.jpg", for_inference))
         except TimeoutException as ex:
             pass
         except Exception as ex:
             self.logger.error(ex)
 
+    def _account(self, timestamp):
+        if self.timing.update(timestamp, datetime.now().timestamp()) == 0:
+            return
+        now = datetime.now().timestamp()
+        if now - self.last_drop_report > 5.0:
+            self.last_drop_report = now
+            self.logger.warning(f"Camera frames dropped: {self.timing.metrics()}")
+
+    def _frame(self, buffer: Buffer, content):
+        """
+        Move the frame out of the driver buffer: either hold the buffer until the frame is released (zero copy) or
+        copy into a recycled frame and requeue the buffer right away.
+        """
+        if self.settings.zero_copy:
+            try:
+                return self.frame_pool.hold(content, buffer.queue)
+            except TypeError:
+                pass
+        try:
+            return self.frame_pool.copy(content)
+        finally:
+            buffer.queue()
+            exhausted = self.frame_pool.exhausted
+            if exhausted > self.reported_exhaustion and (self.reported_exhaustion == 0 or exhausted % 100 == 0):
+                self.reported_exhaustion = exhausted
+                self.logger.warning(f"Frame pool exhausted {exhausted} times. Consider a larger pool_size. "
+                                    f"{self.frame_pool.metrics()}")
+
     def reload_camera_driver(self):
         id_ = self.config["id"]
         if not id_:
@@ -173,6 +340,14 @@ class HarvestersSource(ImageSource):
     def start(self):
         super().start()
 
+        fps = self.config["fps"]
+        self.timing = FrameTiming(1 / fps if fps > 0 else None, self.config["late_threshold"])
+        self.decimator = FrameDecimator(self.config["decimation"], self.config["decimation_n"])
+        metrics.gauge("source.camera_dropped", lambda: self.timing.dropped)
+        metrics.gauge("source.camera_late", lambda: self.timing.late)
+        metrics.gauge("source.not_for_inference", lambda: self.decimator.skipped)
+        metrics.gauge("source.frame_pool_in_use", lambda: self.frame_pool.metrics()["in_use"])
+        metrics.gauge("source.frame_pool_exhausted", lambda: self.frame_pool.exhausted)
         self.reload_camera_driver()
 
         if self.acquirer:
@@ -184,6 +359,8 @@ class HarvestersSource(ImageSource):
         if self.acquirer:
             self.acquirer.stop_image_acquisition()
             self.acquirer.destroy()
+            self.logger.info(f"Acquisition: {self.timing.metrics()}, "
+                             f"{self.decimator.skipped} frames not sent to inference")
         self._stop.on_next(True)
         self.running = False
         super().stop()
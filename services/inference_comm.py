@@ -1,29 +1,55 @@
+import threading
 import time
+from functools import partial
+from typing import Callable, List, Optional
 
 import grpc
-from pycocotools import mask as mask_util
 from rx import subject
 
 from data_class.detected_objects import DetectedObject
-from data_class.inference_stats import InferenceStats
+from data_class.inference_stats import EndpointStats, InferenceStats
 from inference_service_proto import inference_service_pb2 as grpc_def
 from inference_service_proto import inference_service_pb2_grpc as grpc_service
+from utils import metrics, tracing
+
+
+def parse_endpoints(endpoints: str, ip=None, port=None) -> List[str]:
+    """
+    :param endpoints: comma separated "host:port" list
+    :return: list of addresses. Falls back to ip:port when endpoints is empty.
+    """
+    addresses = [e.strip() for e in (endpoints or "").split(",") if e.strip()]
+    if not addresses and ip:
+        addresses = [f"{ip}:{port}"]
+    return addresses
 
 
 class InferenceComm(object):
-    connection_chan = subject.BehaviorSubject(False)
-    result_chan = subject.Subject()
-    error_chan = subject.Subject()
-    stats_chan = subject.Subject()
-    back_pressure_chan = subject.BehaviorSubject(False)
+    """
+    Connection to one inference server. Up to max_in_flight batches are sent without waiting for their results.
+    """
 
-    def __init__(self):
+    def __init__(self, max_in_flight=2):
         super().__init__()
+        self.connection_chan = subject.BehaviorSubject(False)
+        self.result_chan = subject.Subject()
+        self.error_chan = subject.Subject()
+        self.stats_chan = subject.Subject()
+        self.back_pressure_chan = subject.BehaviorSubject(False)
+
         self.channel = None
         self.stub: grpc_service.InferenceStub
-
-        self.start_time_queue = []
         self.stub = None
+        self.address = None
+
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.stats = EndpointStats()
+        self.sent_counter = metrics.counter("inference.sent")
+        self.returned_counter = metrics.counter("inference.returned")
+        self.error_counter = metrics.counter("inference.errors")
+        self.round_trip = metrics.histogram("inference.round_trip")
 
     def on_connect_state_change(self, state: grpc.ChannelConnectivity):
         if state == grpc.ChannelConnectivity.READY:
@@ -33,38 +59,65 @@ class InferenceComm(object):
                 self.connection_chan.on_next(False)
 
     def connect_to_grpc_server(self, ip, port):
+        self.connect(f"{ip}:{port}")
+
+    def connect(self, address):
         if self.connection_chan.value:
             return
 
         if self.channel is not None:
             self.channel.close()
 
-        self.channel = grpc.insecure_channel(f"{ip}:{port}")
+        self.address = address
+        self.channel = grpc.insecure_channel(address)
         self.channel.subscribe(self.on_connect_state_change, True)
 
         self.stub = grpc_service.InferenceStub(self.channel)
 
+    @property
+    def saturated(self):
+        return self.in_flight >= self.max_in_flight
+
     def back_pressure_detection(self):
-        if len(self.start_time_queue) > 2:
-            self.back_pressure_chan.on_next(True)
-            return True
-        else:
-            self.back_pressure_chan.on_next(False)
-            return False
-
-    def inference_done(self, future: grpc.Future):
-        elapsed_time = time.time() - self.start_time_queue.pop(0)
+        saturated = self.saturated
+        if saturated != self.back_pressure_chan.value:
+            self.back_pressure_chan.on_next(saturated)
+        return saturated
+
+    def inference_done(self, start_time, future: grpc.Future):
+        elapsed_time = time.time() - start_time
+        with self.lock:
+            self.in_flight -= 1
         try:
             self.back_pressure_detection()
             inference_result: grpc_def.InferenceResult = future.result(None)
-            num_processed_images = len(inference_result.result)
-            stats = InferenceStats(num_processed_images, elapsed_time)
-            self.stats_chan.on_next(stats)
-
-            # notify new detections
-            self.result_chan.on_next(inference_result)
+            self.report_result(elapsed_time, inference_result)
         except Exception as ex:
-            self.error_chan.on_next(f"Inference error: {ex}")
+            self.report_error(ex)
+
+    def report_sent(self, names, start_time):
+        """
+        :param start_time: when the batch started to be serialized
+        """
+        self.sent_counter.inc(len(names))
+        tracing.add(names, tracing.GRPC_SEND, start_time, time.time())
+
+    def report_result(self, elapsed_time, inference_result: grpc_def.InferenceResult):
+        num_processed_images = len(inference_result.result)
+        self.stats.update(elapsed_time, num_processed_images)
+        self.round_trip.record(elapsed_time)
+        self.returned_counter.inc(num_processed_images)
+        end = time.time()
+        tracing.add([r.image_id for r in inference_result.result], tracing.GRPC_RETURN, end - elapsed_time, end)
+        self.stats_chan.on_next(InferenceStats(num_processed_images, elapsed_time, self.address))
+
+        # notify new detections
+        self.result_chan.on_next(inference_result)
+
+    def report_error(self, ex):
+        self.stats.errors += 1
+        self.error_counter.inc()
+        self.error_chan.on_next(f"Inference error ({self.address}): {ex}")
 
     def clean(self):
         if self.channel:
@@ -80,19 +133,32 @@ class InferenceComm(object):
             self.error_chan.on_next("Server is not connected. Cannot feed image.")
             return
 
+        start_time = time.time()
+        req = self.make_request(image_and_name)
+        with self.lock:
+            self.in_flight += 1
+        try:
+            resp: grpc.Future = self.stub.Inference.future(req)
+        except Exception:
+            # e.g. the channel is closed, no callback will release the slot
+            with self.lock:
+                self.in_flight -= 1
+            raise
+        resp.add_done_callback(partial(self.inference_done, time.time()))
+        self.report_sent([name for _, name in image_and_name], start_time)
+        self.back_pressure_detection()
+
+    @staticmethod
+    def make_request(image_and_name, num_image_returned=1) -> grpc_def.ImageBatchRequest:
         req = grpc_def.ImageBatchRequest()
-        req.opt.num_image_returned = 1
+        req.opt.num_image_returned = num_image_returned
 
         for image, name in image_and_name:
             req_img = grpc_def.Image()
             req_img.name = name
             req_img.images_data = image
             req.images.append(req_img)
-
-        self.start_time_queue.append(time.time())
-        resp: grpc.Future = self.stub.Inference.future(req)
-        resp.add_done_callback(self.inference_done)
-        self.back_pressure_detection()
+        return req
 
     @staticmethod
     def to_detected_object(detection: grpc_def.Detection):
@@ -103,8 +169,113 @@ class InferenceComm(object):
         }
         bbox = detection.bbox
         detected_object.label = detection.category
+        # the mask stays RLE-encoded; DetectedObject decodes it lazily
         detected_object.maskRLE = rle
-        detected_object.mask = mask_util.decode(rle)
         detected_object.bbox = (bbox.xlt, bbox.ylt, bbox.xrb, bbox.yrb)
         detected_object.score = detection.confidence
         return detected_object
+
+
+class InferenceCommPool(object):
+    """
+    Spread batches over several inference servers with the same interface as InferenceComm.
+    Each batch goes to the connected endpoint with the fewest outstanding requests, ties broken by the recent
+    latency. Back pressure is reported only when every connected endpoint has a full in-flight window.
+    """
+
+    def __init__(self, max_in_flight=2, comm_factory: Callable[[int], InferenceComm] = InferenceComm):
+        """
+        :param comm_factory: creates the connection to one endpoint from max_in_flight
+        """
+        super().__init__()
+        self.connection_chan = subject.BehaviorSubject(False)
+        self.result_chan = subject.Subject()
+        self.error_chan = subject.Subject()
+        self.stats_chan = subject.Subject()
+        self.back_pressure_chan = subject.BehaviorSubject(False)
+
+        self.max_in_flight = max_in_flight
+        self.comm_factory = comm_factory
+        self.endpoints: List[InferenceComm] = []
+        self.lock = threading.Lock()
+        self._subscriptions = []
+
+    def connect(self, addresses: List[str]):
+        if self.connection_chan.value:
+            return
+        self._dispose_endpoints()
+
+        for address in addresses:
+            comm = self.comm_factory(self.max_in_flight)
+            self._subscriptions += [
+                comm.result_chan.subscribe(self.result_chan.on_next),
+                comm.error_chan.subscribe(self.error_chan.on_next),
+                comm.stats_chan.subscribe(self.stats_chan.on_next),
+                comm.connection_chan.subscribe(lambda _: self._update_connection()),
+                comm.back_pressure_chan.subscribe(lambda _: self.back_pressure_detection()),
+            ]
+            self.endpoints.append(comm)
+            comm.connect(address)
+
+    def connect_to_grpc_server(self, ip, port):
+        self.connect([f"{ip}:{port}"])
+
+    def connected_endpoints(self) -> List[InferenceComm]:
+        return [e for e in self.endpoints if e.connection_chan.value]
+
+    def _update_connection(self):
+        connected = any(e.connection_chan.value for e in self.endpoints)
+        if connected != self.connection_chan.value:
+            self.connection_chan.on_next(connected)
+        self.back_pressure_detection()
+
+    def back_pressure_detection(self):
+        connected = self.connected_endpoints()
+        saturated = bool(connected) and all(e.saturated for e in connected)
+        if saturated != self.back_pressure_chan.value:
+            self.back_pressure_chan.on_next(saturated)
+        return saturated
+
+    def select_endpoint(self) -> Optional[InferenceComm]:
+        """
+        :return: the connected endpoint with the fewest requests in flight, None if no endpoint is connected
+        """
+        connected = self.connected_endpoints()
+        if not connected:
+            return None
+
+        def load(e: InferenceComm):
+            latency = e.stats.recent_time
+            return e.in_flight / e.max_in_flight, latency if latency is not None else 0.0
+
+        return min(connected, key=load)
+
+    def feed_images(self, image_and_name):
+        with self.lock:
+            endpoint = self.select_endpoint()
+            if endpoint is None:
+                self.error_chan.on_next("Server is not connected. Cannot feed image.")
+                return
+            endpoint.feed_images(image_and_name)
+
+    def endpoint_stats(self):
+        """
+        :return: {address: EndpointStats}
+        """
+        return {e.address: e.stats for e in self.endpoints}
+
+    def _dispose_endpoints(self):
+        for s in self._subscriptions:
+            s.dispose()
+        self._subscriptions = []
+        for e in self.endpoints:
+            e.clean()
+        self.endpoints = []
+
+    def clean(self):
+        for e in self.endpoints:
+            e.clean()
+
+    def stop(self):
+        for e in self.endpoints:
+            e.stop()
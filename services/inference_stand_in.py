@@ -0,0 +1,226 @@
+"""
+Local stand-in for the GPU inference service, to stress InferenceComm batching, in-flight limits and back pressure
+without a GPU. It answers every batch with synthetic detections (filled ellipses encoded as COCO RLE) after a
+configurable latency, and fails a configurable share of the batches.
+The same generator serves the gRPC Inference service and the shared memory protocol (services.shm_transport):
+    python -m services.inference_stand_in --port 3034 --latency 0.02 --jitter 0.01 --objects 50 --failure-rate 0.01
+"""
+import argparse
+import logging
+import threading
+import time
+from concurrent import futures
+from functools import partial
+from typing import Dict, List, Sequence, Tuple
+
+import cv2
+import grpc
+import numpy as np
+
+from inference_service_proto import inference_service_pb2 as grpc_def
+from inference_service_proto import inference_service_pb2_grpc as grpc_service
+from utils import image_codec, rle
+
+UNLIMITED = [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1)]
+
+
+class SyntheticFailure(RuntimeError):
+    pass
+
+
+def image_size(data) -> Tuple[int, int]:
+    """
+    (height, width) of an encoded image: read from the header of raw images, decoded otherwise.
+    """
+    if bytes(data[:4]) == image_codec.RAW_MAGIC:
+        _, _, height, width, _ = image_codec.RAW_HEADER.unpack_from(data, 0)
+        return height, width
+    image = image_codec.decode(data, None)
+    if image is None:
+        raise ValueError("Cannot decode the image to find its size")
+    return image.shape[:2]
+
+
+class SyntheticInference(object):
+    """
+    Detections are drawn from a few precomputed frames per image size, so answering costs about as much as
+    serializing the result.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.0, objects=20, object_jitter=0, failure_rate=0.0,
+                 min_axis=4, max_axis=30, width=0, height=0, templates=8, seed=None):
+        """
+        :param latency: mean processing time per image (sec)
+        :param jitter: per-image latency is uniform in latency +- jitter
+        :param objects: mean detections per image, uniform in objects +- object_jitter
+        :param failure_rate: share of the batches answered with an error
+        :param width: frame size of the masks. 0 to use the size of the received images.
+        :param templates: distinct detection sets per frame size
+        """
+        super(SyntheticInference, self).__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.objects = objects
+        self.object_jitter = object_jitter
+        self.failure_rate = failure_rate
+        self.min_axis = min_axis
+        self.max_axis = max_axis
+        self.size = (height, width) if width and height else None
+        self.template_count = max(templates, 1)
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.templates: Dict[Tuple[int, int], List[List[grpc_def.Detection]]] = {}
+
+        self.batches = 0
+        self.frames = 0
+        self.failures = 0
+
+    def _detection(self, height, width) -> grpc_def.Detection:
+        rng = self.rng
+        a = int(rng.integers(self.min_axis, self.max_axis + 1))
+        b = int(rng.integers(max(self.min_axis // 2, 1), a + 1))
+        # keep the ellipse inside the frame
+        a, b = min(a, (width - 1) // 2), min(b, (height - 1) // 2)
+        size = 2 * max(a, b) + 1
+        crop = np.zeros((min(size, height), min(size, width)), dtype=np.uint8)
+        center = (crop.shape[1] // 2, crop.shape[0] // 2)
+        cv2.ellipse(crop, center, (a, b), float(rng.uniform(0, 180)), 0, 360, 1, -1)
+        x0 = int(rng.integers(0, width - crop.shape[1] + 1))
+        y0 = int(rng.integers(0, height - crop.shape[0] + 1))
+
+        runs = rle.encode_cropped(crop, (x0, y0), height, width)
+        xlt, ylt, xrb, yrb = rle.bbox(runs, height)
+        detection = grpc_def.Detection()
+        detection.rle.counts = rle.encode_counts(runs)
+        detection.rle.size.extend([height, width])
+        detection.bbox.xlt, detection.bbox.ylt, detection.bbox.xrb, detection.bbox.yrb = xlt, ylt, xrb, yrb
+        detection.category = 1
+        detection.confidence = float(rng.uniform(0.5, 1.0))
+        return detection
+
+    def _templates(self, size) -> List[List[grpc_def.Detection]]:
+        with self.lock:
+            if size not in self.templates:
+                count = self.objects + self.object_jitter
+                self.templates[size] = [[self._detection(*size) for _ in range(count)]
+                                        for _ in range(self.template_count)]
+            return self.templates[size]
+
+    def delay(self, count) -> float:
+        with self.lock:
+            per_image = self.rng.uniform(self.latency - self.jitter, self.latency + self.jitter, count)
+        return float(np.clip(per_image, 0, None).sum())
+
+    def infer(self, images: Sequence[Tuple[str, bytes]], num_image_returned=1) -> grpc_def.InferenceResult:
+        """
+        :param images: (name, encoded image)
+        :raise SyntheticFailure: for the failure_rate share of the batches
+        """
+        if not images:
+            return grpc_def.InferenceResult()
+        time.sleep(self.delay(len(images)))
+        with self.lock:
+            self.batches += 1
+            failed = self.rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+            choices = self.rng.integers(0, self.template_count, len(images))
+            low = max(self.objects - self.object_jitter, 0)
+            counts = self.rng.integers(low, self.objects + self.object_jitter + 1, len(images))
+        if failed:
+            raise SyntheticFailure("Synthetic inference failure")
+
+        templates = self._templates(self.size or image_size(images[0][1]))
+        result = grpc_def.InferenceResult()
+        for (name, _), choice, count in zip(images, choices, counts):
+            per_image = result.result.add()
+            per_image.image_id = name
+            per_image.detections.extend(templates[choice][:count])
+        for name, data in images[:num_image_returned]:
+            result.returned_images.append(grpc_def.Image(name=name, images_data=bytes(data)))
+        with self.lock:
+            self.frames += len(images)
+        return result
+
+    def shm_handler(self, images, num_image_returned=1) -> bytes:
+        """
+        Handler for SharedMemoryStandInServer.
+        """
+        return self.infer(images, num_image_returned).SerializeToString()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {"batches": self.batches, "frames": self.frames, "failures": self.failures}
+
+
+class StandInInferenceServicer(grpc_service.InferenceServicer):
+    def __init__(self, inference: SyntheticInference):
+        super(StandInInferenceServicer, self).__init__()
+        self.inference = inference
+
+    def Inference(self, request, context):
+        images = [(image.name, image.images_data) for image in request.images]
+        try:
+            return self.inference.infer(images, request.opt.num_image_returned)
+        except SyntheticFailure as ex:
+            context.abort(grpc.StatusCode.UNAVAILABLE, str(ex))
+
+
+def serve(inference: SyntheticInference, address="127.0.0.1:0", workers=1) -> Tuple[grpc.Server, str]:
+    """
+    Start a gRPC stand-in server.
+    :param workers: batches processed concurrently. 1 behaves like a single GPU.
+    :return: (server, bound address)
+    """
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers), options=UNLIMITED)
+    grpc_service.add_InferenceServicer_to_server(StandInInferenceServicer(inference), server)
+    host = address.rsplit(":", 1)[0]
+    port = server.add_insecure_port(address)
+    server.start()
+    return server, f"{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", help="loopback only with the shm transport")
+    parser.add_argument("--port", type=int, default=3034)
+    parser.add_argument("--transport", choices=("grpc", "shm"), default="grpc")
+    parser.add_argument("--workers", type=int, default=1, help="batches processed concurrently (grpc)")
+    parser.add_argument("--latency", type=float, default=0.02, help="processing time per image (sec)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="per-image latency spread (sec)")
+    parser.add_argument("--objects", type=int, default=20, help="detections per image")
+    parser.add_argument("--object-jitter", type=int, default=0, help="spread of the detections per image")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of failed batches")
+    parser.add_argument("--width", type=int, default=0, help="mask width, 0 for the received image size")
+    parser.add_argument("--height", type=int, default=0, help="mask height, 0 for the received image size")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    inference = SyntheticInference(args.latency, args.jitter, args.objects, args.object_jitter, args.failure_rate,
+                                   width=args.width, height=args.height, seed=args.seed)
+    address = f"{args.host}:{args.port}"
+    if args.transport == "grpc":
+        server, address = serve(inference, address, args.workers)
+        close = partial(server.stop, 0)
+    else:
+        from services.shm_transport import SharedMemoryStandInServer
+        try:
+            server = SharedMemoryStandInServer(address, inference.shm_handler).start()
+        except ValueError as ex:
+            parser.error(str(ex))
+        address = server.address
+        close = server.close
+    logging.info(f"Inference stand-in ({args.transport}) listening on {address}")
+    try:
+        while True:
+            time.sleep(10)
+            logging.info(f"{inference.metrics()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+
+
+if __name__ == '__main__':
+    main()
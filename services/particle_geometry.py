@@ -0,0 +1,99 @@
+"""
+Particle geometry from instance masks.
+- area straight from the RLE counts
+- ellipse axes either from second-order image moments (batched over all objects) or by fitting the largest
+  contour of the mask cropped to its bounding box
+Masks are decoded from the RLE only inside their bounding box (DetectedObject.cropped_mask).
+"""
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from data_class.detected_objects import DetectedObject
+
+ELLIPSE_METHODS = ("moments", "contour")
+
+
+def rle_areas(detections: Sequence[DetectedObject]) -> np.ndarray:
+    """
+    Pixel count of every mask, computed from the RLE without decoding it.
+    """
+    return np.array([d.area for d in detections], dtype=np.float64)
+
+
+def moment_ellipses(crops: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ellipse axes with the same second-order moments as each mask, computed in one pass over all masks.
+    A filled ellipse with full axes (A, B) has variances A^2/16 and B^2/16 along its axes.
+    :param crops: binary masks (any offset, coordinates are only used relative to each mask)
+    :return: (major axes, minor axes) lengths in pixels, one per mask. NaN for empty masks.
+    """
+    n = len(crops)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+
+    ys, xs, ids = [], [], []
+    for i, crop in enumerate(crops):
+        y, x = np.nonzero(crop)
+        ys.append(y)
+        xs.append(x)
+        ids.append(np.full(y.size, i, dtype=np.intp))
+    y = np.concatenate(ys).astype(np.float64)
+    x = np.concatenate(xs).astype(np.float64)
+    ids = np.concatenate(ids)
+
+    count = np.bincount(ids, minlength=n).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = np.bincount(ids, x, minlength=n) / count
+        my = np.bincount(ids, y, minlength=n) / count
+        dx = x - mx[ids]
+        dy = y - my[ids]
+        cxx = np.bincount(ids, dx * dx, minlength=n) / count
+        cyy = np.bincount(ids, dy * dy, minlength=n) / count
+        cxy = np.bincount(ids, dx * dy, minlength=n) / count
+
+    half_trace = (cxx + cyy) / 2
+    root = np.sqrt(((cxx - cyy) / 2) ** 2 + cxy ** 2)
+    major = 4 * np.sqrt(half_trace + root)
+    minor = 4 * np.sqrt(np.maximum(half_trace - root, 0))
+    return major, minor
+
+
+def contour_ellipse(crop: np.ndarray):
+    """
+    Fit an ellipse to the largest contour of the mask.
+    :return: (major, minor) or None if the contour is too small to fit
+    """
+    contours, _ = cv2.findContours(np.ascontiguousarray(crop), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    biggest_contour = max(contours, key=cv2.contourArea)
+    if len(biggest_contour) <= 5:
+        return None
+    _, axes, _ = cv2.fitEllipse(biggest_contour)
+    return max(axes), min(axes)
+
+
+def measure(detections: List[DetectedObject], method="moments") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: (areas, major axes, minor axes). With the contour method, objects whose contour is too small to fit
+    are left out of the axes.
+    """
+    if method not in ELLIPSE_METHODS:
+        raise ValueError(f"Unknown ellipse method {method}. Expected one of {ELLIPSE_METHODS}")
+
+    areas = rle_areas(detections)
+    crops = [d.cropped_mask() for d in detections]
+    if method == "moments":
+        majors, minors = moment_ellipses(crops)
+        valid = ~np.isnan(majors)
+        return areas, majors[valid], minors[valid]
+
+    majors, minors = [], []
+    for crop in crops:
+        ellipse = contour_ellipse(crop)
+        if ellipse is not None:
+            majors.append(ellipse[0])
+            minors.append(ellipse[1])
+    return areas, np.asarray(majors, dtype=np.float64), np.asarray(minors, dtype=np.float64)
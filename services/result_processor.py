@@ -2,23 +2,51 @@
 Process the raw masks from analyzer.
 - remove edge touching objects
 - analyze area and ellipse fit
+- accumulate histograms of the measures, per image, over sliding windows, expired even when no image arrives
+- report run-long D10/D50/D90 and mean of the measures on the timeline
 - report number of object
+The run-long state starts over whenever the image source or the analyzer (re)starts.
 """
+import threading
+import time
 from typing import List
 
-import cv2
 import numpy as np
+
+import rx
 from rx import operators
+from rx import scheduler
 from rx import subject
+from rx.disposable import CompositeDisposable, SerialDisposable
 
 import services.service_provider
 from data_class.detected_objects import DetectedObject
 from data_class.distribution import AreaDistribution, EllipseDistribution
 from data_class.subject_data import TimelineDataPoint, ProcessedDistributions, SampleImageData, DetectionsInImage
-from services import config
+from services import config, particle_geometry
 from services.inference_result_render import render_inference
 from services.subjects import Subjects
+from utils import metrics, tracing
+from utils.histogram import SlidingHistogram, make_edges
 from utils.observer import ErrorToConsoleObserver
+from utils.quantile_sketch import TDigest
+from utils.stage_queue import stage_queue
+
+
+MEASURES = ("areas", "majors", "minors")
+# timeline plot of each measure
+STATISTICS_PLOTS = {"areas": "Particle area", "majors": "Major axis", "minors": "Minor axis"}
+PERCENTILES = {"D10": 0.1, "D50": 0.5, "D90": 0.9}
+# seconds between two expirations of the histogram time windows
+EXPIRE_INTERVAL = 1.0
+
+
+def unit_scale(measure: str, calibration_ratio: float) -> float:
+    """
+    Factor from pixels to calibrated units: the areas scale with the square of the length ratio.
+    """
+    scale = calibration_ratio or 1.0
+    return scale ** 2 if measure == "areas" else scale
 
 
 class ResultProcessor(object):
@@ -27,11 +55,30 @@ class ResultProcessor(object):
     def __init__(self):
         super().__init__()
         self.config = config.SettingAccessor(self.config_prefix)
+        self.settings = config.section(self.config_prefix)
+        self._stop = subject.Subject()
+        # resubscribing on a group size change replaces the pipelines, the same threads keep processing
+        self.subscriptions = SerialDisposable()
+        self.processing_scheduler = scheduler.EventLoopScheduler()
+        self.render_scheduler = scheduler.EventLoopScheduler()
         config.setting_updated_channel.pipe(
-            operators.filter(lambda x: x[0] == f"{ResultProcessor.config_prefix}/group_size")
+            operators.filter(lambda x: x[0] == f"{ResultProcessor.config_prefix}/group_size"),
+            operators.take_until(self._stop),
         ).subscribe(ErrorToConsoleObserver(lambda x: self.configure_subscriptions()))
-        self._stop = subject.Subject()
+        # guards the histograms and sketches, updated on the processing thread and reset on a new run
+        self.lock = threading.Lock()
+        self._histograms_key = None
+        self._histograms = {}
+        # (areas, majors, minors) of the last group, published again when the histograms expire
+        self._last_group = None
+        self._sketches = {name: TDigest() for name in MEASURES}
+        self._last_statistics = 0.0
         self.subjects: Subjects = services.service_provider.SubjectProvider().get_or_create_instance(None)
+        self.subjects.image_source_connected.pipe(
+            operators.merge(self.subjects.analyzer_connected),
+            operators.filter(bool),
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(lambda x: self.reset_run()))
         self.configure_subscriptions()
 
     @staticmethod
@@ -41,18 +88,50 @@ class ResultProcessor(object):
             config.SettingRegistry("group_size", 10, type="int", title="Group size (images)"),
             config.SettingRegistry("calibration_ratio", 0, type="float", title="Length (micrometer) per pixel"),
             config.SettingRegistry("crop_threshold", 0, type="int",
-                                   title="Edge cropping object threshold (pixels)")
+                                   title="Edge cropping object threshold (pixels)"),
+            config.SettingRegistry("ellipse_method", "moments", type="str",
+                                   title="Ellipse fitting method (moments/contour)"),
+            config.SettingRegistry("sample_reduction", 1, type="int",
+                                   title="Render the sample image at 1/n of its size (1, 2, 4, 8)"),
+            config.SettingRegistry("queue_capacity", 256, type="int", title="Detection results queued for processing"),
+            config.SettingRegistry("queue_policy", "drop_oldest", type="str",
+                                   title="Queue overflow (block, drop_oldest, drop_newest, keep_latest)"),
+            config.SettingRegistry("histogram_bins", 50, type="int", title="Histogram bins"),
+            config.SettingRegistry("histogram_scale", "log", type="str", title="Histogram bin scale (linear/log)"),
+            config.SettingRegistry("area_histogram_min", 1.0, type="float", title="Area histogram lower edge (pixels)"),
+            config.SettingRegistry("area_histogram_max", 100000.0, type="float",
+                                   title="Area histogram upper edge (pixels)"),
+            config.SettingRegistry("axis_histogram_min", 1.0, type="float",
+                                   title="Ellipse axis histogram lower edge (pixels)"),
+            config.SettingRegistry("axis_histogram_max", 1000.0, type="float",
+                                   title="Ellipse axis histogram upper edge (pixels)"),
+            config.SettingRegistry("histogram_frames", 100, type="int", title="Histogram window (frames)"),
+            config.SettingRegistry("histogram_seconds", 60.0, type="float", title="Histogram window (seconds)"),
+            config.SettingRegistry("statistics_interval", 5.0, type="float",
+                                   title="Size statistics timeline interval (sec, 0 = every group)"),
         ])
 
     def configure_subscriptions(self):
-        self.subjects.detection_result.pipe(
-            operators.buffer_with_count(self.config["group_size"]),
-            operators.take_until(self._stop),
-        ).subscribe(ErrorToConsoleObserver(self.process_distribution_data))
+        # dispose first, so no result is processed by two pipelines
+        self.subscriptions.disposable = None
+        self.subscriptions.disposable = CompositeDisposable(
+            self.subjects.detection_result.pipe(
+                stage_queue("result processor", self.config["queue_capacity"], self.config["queue_policy"],
+                            self.processing_scheduler),
+                operators.buffer_with_count(self.config["group_size"]),
+                operators.take_until(self._stop),
+            ).subscribe(ErrorToConsoleObserver(self.process_distribution_data)),
 
-        self.subjects.sample_image_data.pipe(
-            operators.take_until(self._stop),
-        ).subscribe(ErrorToConsoleObserver(self.render_sample_image))
+            self.subjects.sample_image_data.pipe(
+                # only the newest sample is worth rendering
+                stage_queue("sample render", 1, "keep_latest", self.render_scheduler),
+                operators.take_until(self._stop),
+            ).subscribe(ErrorToConsoleObserver(self.render_sample_image)),
+
+            rx.interval(EXPIRE_INTERVAL, scheduler=self.processing_scheduler).pipe(
+                operators.take_until(self._stop),
+            ).subscribe(ErrorToConsoleObserver(lambda x: self.expire_histograms())),
+        )
 
     def filter_cropped(self, detections, threshold):
         if threshold == 0:
@@ -69,50 +148,141 @@ class ResultProcessor(object):
                 ret.append(detection)
         return ret
 
+    def reset_run(self):
+        """
+        Start the histograms, sketches and statistics interval over for a new run.
+        """
+        with self.lock:
+            self._histograms_key = None
+            self._histograms = {}
+            self._last_group = None
+            self._sketches = {name: TDigest() for name in MEASURES}
+            self._last_statistics = 0.0
+
+    def sliding_histograms(self) -> dict:
+        """
+        {"areas", "majors", "minors"} histograms, started over when their settings change.
+        Call with lock held.
+        """
+        s = self.settings
+        key = (s.histogram_bins, s.histogram_scale, s.area_histogram_min, s.area_histogram_max,
+               s.axis_histogram_min, s.axis_histogram_max, s.histogram_frames, s.histogram_seconds)
+        if key != self._histograms_key:
+            log = s.histogram_scale == "log"
+            area_edges = make_edges(s.histogram_scale, s.area_histogram_min, s.area_histogram_max, s.histogram_bins)
+            axis_edges = make_edges(s.histogram_scale, s.axis_histogram_min, s.axis_histogram_max, s.histogram_bins)
+            self._histograms = {
+                "areas": SlidingHistogram(area_edges, s.histogram_frames, s.histogram_seconds, log),
+                "majors": SlidingHistogram(axis_edges, s.histogram_frames, s.histogram_seconds, log),
+                "minors": SlidingHistogram(axis_edges, s.histogram_frames, s.histogram_seconds, log),
+            }
+            self._histograms_key = key
+        return self._histograms
+
+    @metrics.timed("processing.sample_render")
     def render_sample_image(self, data: SampleImageData):
-        detections = self.filter_cropped(data.labels, self.config["crop_threshold"])
-        rendered = render_inference(data.image, detections)
+        detections = self.filter_cropped(data.labels, self.settings.crop_threshold)
+        rendered = render_inference(data.image, detections, reduction=self.settings.sample_reduction)
         self.subjects.rendered_sample_image_producer.on_next(rendered)
 
+    @metrics.timed("processing.distributions")
     def process_distribution_data(self, data: List[DetectionsInImage]):
-        areas = []
-        minors = []
-        majors = []
-        for d in data:
-            detections_per_image = self.filter_cropped(d.objs, self.config["crop_threshold"])
-            for detections in detections_per_image:
-
-                areas.append(detections.mask.sum())
-                detections.mask.dtype = np.uint8
-                contours, _ = cv2.findContours(detections.mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-                max_area = 0
-                biggest_contour = None
-                for c in contours:
-                    area = cv2.contourArea(c)
-                    if area > max_area:
-                        biggest_contour = c
-                        max_area = area
-                if len(biggest_contour) > 5:
-                    ellipse = cv2.fitEllipse(biggest_contour)
-                    majors.append(ellipse[1][0])
-                    minors.append(ellipse[1][1])
-        areas = np.asarray(areas).T
-        minors = np.asarray(minors).T
-        majors = np.asarray(majors).T
-
-        calibration_ratio = self.config["calibration_ratio"]
+        settings = self.settings
+        crop_threshold = settings.crop_threshold
+        now = time.time()
+        measures = []
+        with tracing.span([d.image_id for d in data], tracing.MASK_PROCESSING):
+            for d in data:
+                detections = self.filter_cropped(d.objs, crop_threshold)
+                measures.append(particle_geometry.measure(detections, settings.ellipse_method))
+        areas, majors, minors = (np.concatenate(m) for m in zip(*measures))
+
+        calibration_ratio = settings.calibration_ratio
+        with self.lock:
+            histograms = self.sliding_histograms()
+            # one frame per image in the histogram windows, whatever the group size
+            for image_measures in measures:
+                for name, values in zip(MEASURES, image_measures):
+                    histograms[name].add_frame(values, now)
+            for name, values in zip(MEASURES, (areas, majors, minors)):
+                self._sketches[name].add(values)
+            snapshots = self.snapshots(calibration_ratio)
+            self._last_group = (areas, majors, minors)
+            statistics = None
+            if now - self._last_statistics >= settings.statistics_interval:
+                self._last_statistics = now
+                statistics = self.statistics()
+
+        self.publish_distributions((areas, majors, minors), snapshots, calibration_ratio)
+        self.subjects.add_to_timeline.on_next(
+            TimelineDataPoint("Particles per frame", "class 1").add_new_point(len(areas) / len(data)))
+        if statistics is not None:
+            self.emit_statistics(statistics, calibration_ratio, now)
+
+    def snapshots(self, calibration_ratio) -> dict:
+        """
+        {measure: {view: histogram}} in calibrated units. Call with lock held.
+        """
+        return {name: h.snapshot(unit_scale(name, calibration_ratio)) for name, h in self._histograms.items()}
+
+    def publish_distributions(self, group, snapshots: dict, calibration_ratio):
+        """
+        :param group: (areas, majors, minors) of the last group of images, in pixels
+        """
+        areas, majors, minors = group
         if calibration_ratio == 0:
-            area_dist = AreaDistribution(areas)
-            ellipse_dist = EllipseDistribution(majors, minors)
+            area_dist = AreaDistribution(areas, histograms=snapshots["areas"])
+            ellipse_dist = EllipseDistribution(majors, minors, major_histograms=snapshots["majors"],
+                                               minor_histograms=snapshots["minors"])
         else:
-            area_dist = AreaDistribution(areas * calibration_ratio, "<math>&mu;m<sup>2</sup></math>")
+            area_dist = AreaDistribution(areas * unit_scale("areas", calibration_ratio),
+                                         "<math>&mu;m<sup>2</sup></math>", histograms=snapshots["areas"])
             ellipse_dist = EllipseDistribution(majors * calibration_ratio, minors * calibration_ratio,
-                                               "<math>&mu;m</math>")
-
+                                               "<math>&mu;m</math>", major_histograms=snapshots["majors"],
+                                               minor_histograms=snapshots["minors"])
         self.subjects.processed_distributions.on_next(
             ProcessedDistributions({"areas": area_dist, "ellipses": ellipse_dist}))
-        self.subjects.add_to_timeline.on_next(
-            TimelineDataPoint("Particles per frame", "class 1").add_new_point(len(areas) / len(data)))
+
+    def expire_histograms(self, now: float = None):
+        """
+        Drop the frames that left the time windows and publish the histograms again if any did, so that the
+        "seconds" view empties once the images stop.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if self._last_group is None:
+                return
+            before = [h.view("seconds").count for h in self._histograms.values()]
+            for h in self._histograms.values():
+                h.expire(now)
+            if [h.view("seconds").count for h in self._histograms.values()] == before:
+                return
+            calibration_ratio = self.settings.calibration_ratio
+            snapshots = self.snapshots(calibration_ratio)
+            group = self._last_group
+        self.publish_distributions(group, snapshots, calibration_ratio)
+
+    def statistics(self) -> dict:
+        """
+        {measure: (percentile values, mean)} of everything measured since the run started, in pixels.
+        Call with lock held.
+        """
+        return {name: (sketch.quantiles(list(PERCENTILES.values())), sketch.mean)
+                for name, sketch in self._sketches.items() if sketch.count}
+
+    def emit_statistics(self, statistics: dict, calibration_ratio, now):
+        """
+        Percentiles and mean on the timeline, in calibrated units.
+        """
+        for name, (values, mean) in statistics.items():
+            plot_name = STATISTICS_PLOTS[name]
+            scale = unit_scale(name, calibration_ratio)
+            for series_name, value in zip(PERCENTILES, values):
+                self.subjects.add_to_timeline.on_next(
+                    TimelineDataPoint(plot_name, series_name).add_new_point(float(value) * scale, now))
+            self.subjects.add_to_timeline.on_next(
+                TimelineDataPoint(plot_name, "mean").add_new_point(mean * scale, now))
 
     def finalize(self):
         self._stop.on_next(True)
+        self.subscriptions.dispose()
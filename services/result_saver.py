@@ -1,48 +1,78 @@
 import os
+import threading
 
-import msgpack
+import rx
 from rx import operators, subject, scheduler
+from rx.disposable import SerialDisposable
 
 from data_class.subject_data import TimelineDataPoint, DetectionsInImage, AcquiredImage
 from services import config
 import services.service_provider
+from services.encoding_stage import EncodingStage
+from services.storage_writer import SegmentedStorageWriter, pack_record
 from services.subjects import Subjects
+from utils import metrics, tracing
 from utils.observer import ErrorToConsoleObserver
+from utils.stage_queue import stage_queue
 
 
 class ResultSaver(object):
     config_prefix = "ResultSaver"
+    storage_keys = ("directory", "flush_interval", "flush_size", "segment_size", "segment_duration")
+    encoder_keys = ("enabled", "save_images", "encoder")
 
     def __init__(self):
         super(ResultSaver, self).__init__()
 
         self._stop = subject.Subject()
         self.config = config.SettingAccessor(self.config_prefix)
+        self.settings = config.section(self.config_prefix)
         self.subjects: Subjects = services.service_provider.SubjectProvider().get_or_create_instance(None)
-        self.saving_scheduler = scheduler.NewThreadScheduler()
-        self.subjects.image_producer.pipe(
-            operators.observe_on(self.saving_scheduler),
+        # one saving thread drains all the queues
+        self.saving_scheduler = scheduler.EventLoopScheduler()
+        self.writers = {}
+        capacity, policy = self.config["queue_capacity"], self.config["queue_policy"]
+        self.subjects.encoded_image_producer.pipe(
             operators.filter(self.config_enabled_filter("save_images")),
+            stage_queue("saver images", capacity, policy, self.saving_scheduler),
             operators.take_until(self._stop),
         ).subscribe(ErrorToConsoleObserver(self.save_image))
         self.subjects.detection_result.pipe(
-            operators.observe_on(self.saving_scheduler),
             operators.filter(self.config_enabled_filter("save_labels")),
+            stage_queue("saver labels", capacity, policy, self.saving_scheduler),
             operators.take_until(self._stop),
         ).subscribe(ErrorToConsoleObserver(self.save_labels))
         self.subjects.add_to_timeline.pipe(
-            operators.observe_on(self.saving_scheduler),
             operators.filter(self.config_enabled_filter("save_events")),
+            stage_queue("saver events", capacity, policy, self.saving_scheduler),
             operators.take_until(self._stop),
         ).subscribe(ErrorToConsoleObserver(self.save_timeline_events))
 
         config.setting_updated_channel.pipe(
-            operators.filter(self._directory_filter),
+            operators.filter(self._storage_filter),
             operators.take_until(self._stop),
         ).subscribe(ErrorToConsoleObserver(lambda x: self.initialize_saving_directory()))
 
         self.initialize_saving_directory()
 
+        # the encoder is requested from EncodingStage only while images are saved
+        self.encoder_name = self.config["encoder"]
+        self.requested_encoder = None
+        self.encoder_lock = threading.Lock()
+        self.update_encoder_request()
+        config.setting_updated_channel.pipe(
+            operators.filter(lambda x: x[0] in (f"{ResultSaver.config_prefix}/{k}" for k in self.encoder_keys)),
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(lambda x: self.update_encoder_request()))
+
+        # flush the buffered records even when no new record arrives, restarted when the interval changes
+        self.flush_timer = SerialDisposable()
+        self.configure_flush_timer()
+        config.setting_updated_channel.pipe(
+            operators.filter(lambda x: x[0] == f"{ResultSaver.config_prefix}/flush_interval"),
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(lambda x: self.configure_flush_timer()))
+
     @staticmethod
     @config.DefaultSettingRegistration(config_prefix)
     def default_settings(configPrefix):
@@ -51,51 +81,141 @@ class ResultSaver(object):
             config.SettingRegistry("save_images", True, type="bool", title="Save image"),
             config.SettingRegistry("save_labels", True, type="bool", title="Save labels"),
             config.SettingRegistry("save_events", True, type="bool", title="Save events"),
-            config.SettingRegistry("directory", "/tmp", type="str", title="Save directory")
+            config.SettingRegistry("directory", "/tmp", type="str", title="Save directory"),
+            config.SettingRegistry("encoder", "default", type="str",
+                                   title="Image encoder (default, jpeg, archive_jpeg, raw, png, zstd)"),
+            config.SettingRegistry("flush_interval", 1.0, type="float", title="Flush interval (sec)"),
+            config.SettingRegistry("flush_size", 4096, type="int", title="Flush size (KiB)"),
+            config.SettingRegistry("segment_size", 2048, type="int", title="Segment size limit (MiB, 0 = unlimited)"),
+            config.SettingRegistry("segment_duration", 0, type="float",
+                                   title="Segment duration limit (sec, 0 = unlimited)"),
+            config.SettingRegistry("queue_capacity", 256, type="int", title="Records queued for saving"),
+            # blocking slows the producers down instead of losing records when the disk falls behind
+            config.SettingRegistry("queue_policy", "block", type="str",
+                                   title="Queue overflow (block, drop_oldest, drop_newest, keep_latest)"),
         ])
 
     def _enable_filter(self, data):
         key = data[0]
         return key == f"{ResultSaver.config_prefix}/enabled"
 
-    def _directory_filter(self, data):
+    def _storage_filter(self, data):
         key = data[0]
-        return key == f"{ResultSaver.config_prefix}/directory"
+        return key in (f"{ResultSaver.config_prefix}/{k}" for k in self.storage_keys)
 
     def initialize_saving_directory(self):
         path = self.config["directory"]
-
         os.makedirs(path, exist_ok=True)
 
+        options = dict(
+            flush_interval=self.config["flush_interval"],
+            flush_size=self.config["flush_size"] * 1024,
+            segment_size=self.config["segment_size"] * 1024 * 1024,
+            segment_duration=self.config["segment_duration"],
+        )
+        for name, indexed in (("images", True), ("labels", True), ("events", False)):
+            writer = self.writers.get(name)
+            if writer is None:
+                self.writers[name] = SegmentedStorageWriter(path, name, indexed=indexed, **options)
+            else:
+                # reopen in place so that the saving thread never sees a closed writer
+                with writer.lock:
+                    writer.configure(**options)
+                    writer.open(path)
+
+    def configure_flush_timer(self):
+        self.flush_timer.disposable = rx.interval(max(self.config["flush_interval"], 0.1)).pipe(
+            operators.take_until(self._stop),
+        ).subscribe(ErrorToConsoleObserver(lambda x: self.flush(force=False)))
+
+    def update_encoder_request(self, saving=None):
+        """
+        :param saving: False to release the encoder whatever the settings
+        """
+        with self.encoder_lock:
+            self.encoder_name = self.config["encoder"]
+            if saving is None:
+                saving = self.config["enabled"] and self.config["save_images"]
+            wanted = self.encoder_name if saving else None
+            if wanted == self.requested_encoder:
+                return
+            if self.requested_encoder is not None:
+                EncodingStage.release_encoder(self.requested_encoder)
+            if wanted is not None:
+                EncodingStage.request_encoder(wanted)
+            self.requested_encoder = wanted
+
+    @metrics.timed("saver.image")
     def save_image(self, data: AcquiredImage):
-        path = os.path.join(self.config["directory"], "images.bin")
-        with open(path, "a+b") as f:
-            f.write(msgpack.packb({
+        encoder_name = self.encoder_name
+        encoder = services.service_provider.ImageEncoderProvider().get_encoder(encoder_name)
+        writer = self.writers.get("images")
+        if writer is None:
+            return
+        with tracing.span(data.name, tracing.SAVE):
+            writer.write(pack_record({
                 "name": data.name,
-                "data": data.encoded_buffer,
-                "ts": data.time})
+                "data": data.encoded_as(encoder_name),
+                "format": encoder.format,
+                "ts": data.time}),
+                data.name, data.time
             )
 
+    @metrics.timed("saver.labels")
     def save_labels(self, data: DetectionsInImage):
-        path = os.path.join(self.config["directory"], "labels.bin")
+        writer = self.writers.get("labels")
+        if writer is None:
+            return
         _detects = []
         for detect in data.objs:
-            detect: dict = detect.__dict__.copy()
-            detect.pop("mask")
-            _detects.append(detect)
-        with open(path, "a+b") as f:
-            f.write(msgpack.packb({"name": data.image_id, "labels": _detects}))
-
+            _detects.append({
+                "maskRLE": detect.maskRLE,
+                "bbox": detect.bbox,
+                "label": detect.label,
+                "score": detect.score,
+            })
+        writer.write(pack_record({"name": data.image_id, "labels": _detects}), data.image_id)
+
+    @metrics.timed("saver.event")
     def save_timeline_events(self, dp: TimelineDataPoint):
-        path = os.path.join(self.config["directory"], "events.bin")
-        with open(path, "a+b") as f:
-            f.write(msgpack.packb({"time": dp.time, "plot": dp.plot_name, "series": dp.series_name, "value": dp.value}))
+        writer = self.writers.get("events")
+        if writer is None:
+            return
+        writer.write(
+            pack_record({"time": dp.time, "plot": dp.plot_name, "series": dp.series_name, "value": dp.value}))
 
     def config_enabled_filter(self, key):
+        settings = self.settings
+
         def f(x=None):
-            return self.config["enabled"] and self.config[key]
+            return settings.enabled and getattr(settings, key)
 
         return f
 
-    def finalize(self):
+    def flush(self, force=True):
+        for writer in list(self.writers.values()):
+            writer.flush(force)
+
+    def close_writers(self):
+        writers, self.writers = self.writers, {}
+        for writer in writers.values():
+            writer.close()
+
+    def finalize(self, timeout=10.0):
+        self.update_encoder_request(saving=False)
+        # the queues are disposed first, then the writers are closed on the saving thread, after the record it may
+        # be writing
         self._stop.on_next(True)
+        self.flush_timer.dispose()
+        closed = threading.Event()
+
+        def close(*_):
+            try:
+                self.close_writers()
+            finally:
+                closed.set()
+
+        self.saving_scheduler.schedule(close)
+        if not closed.wait(timeout):
+            # the saving thread is stuck, do not leave the files unterminated
+            self.close_writers()
@@ -1,7 +1,9 @@
+import threading
 import typing as T
 
 from services import subjects, image_sources, analyzers
-from services.image_encoder import ImageEncoder, JPEGEncoder
+from services.encoding_stage import EncodingStage
+from services.image_encoder import ImageEncoder, JPEGEncoder, ArchiveJPEGEncoder, RawEncoder, PNGEncoder, ZstdEncoder
 from services.result_processor import ResultProcessor
 from services.result_saver import ResultSaver
 from services.simex_io import SimexIO
@@ -99,6 +101,7 @@ class ImageSourceProvider(ServiceProvider):
         "test": image_sources.MockImageSource,
         "harvesters": image_sources.HarvestersSource,
         "files": image_sources.MediaFileSource,
+        "replay": image_sources.ReplaySource,
     }
     _instance: image_sources.ImageSource
 
@@ -159,6 +162,18 @@ class ResultSaverProvider(ServiceProvider):
         self._instance.finalize()
 
 
+class EncodingStageProvider(ServiceProvider):
+    interface_typing = EncodingStage
+    default_type = EncodingStage
+    name_mapping = {
+        "default": EncodingStage
+    }
+    _instance: EncodingStage
+
+    def _unload_service(self):
+        self._instance.finalize()
+
+
 class SimexIOProvider(ServiceProvider):
     interface_typing = SimexIO
     default_type = SimexIO
@@ -172,6 +187,33 @@ class ImageEncoderProvider(ServiceProvider):
     interface_typing = ImageEncoder
     default_type = JPEGEncoder
     name_mapping = {
-        "default": JPEGEncoder
+        "default": JPEGEncoder,
+        "jpeg": JPEGEncoder,
+        "archive_jpeg": ArchiveJPEGEncoder,
+        "raw": RawEncoder,
+        "png": PNGEncoder,
+        "zstd": ZstdEncoder,
     }
     _instance: ImageEncoder
+    # one shared encoder per name, for consumers selecting their own format
+    _encoders: T.Dict[str, ImageEncoder] = {}
+    _encoders_lock = threading.Lock()
+
+    def canonical_name(self, name: str = None) -> str:
+        """
+        Names mapped to the same encoder type share one instance and one encoding, e.g. default and jpeg.
+        :return: the first name in name_mapping for the type of name
+        """
+        name = name or "default"
+        encoder_type = self.name_mapping.get(name)
+        return next((n for n, t in self.name_mapping.items() if t is encoder_type), name)
+
+    def get_encoder(self, name: str = None) -> ImageEncoder:
+        """
+        :param name: key of name_mapping. None or empty for the default encoder.
+        """
+        name = self.canonical_name(name)
+        with self._encoders_lock:
+            if name not in self._encoders:
+                self._encoders[name] = self._create_instance(name)
+            return self._encoders[name]
@@ -0,0 +1,333 @@
+"""
+Inference transport for a server on the same host.
+Frames are copied once into a shared-memory ring of fixed-size slots; only (name, slot, length) descriptors go over a
+multiprocessing.connection control channel. The server answers with a serialized InferenceResult, so results are
+handled exactly like the gRPC ones.
+Both ends only use loopback addresses, and the control messages are msgpack arrays, never pickles, so a peer cannot
+make the other end run code.
+
+Control messages
+    client -> server: ("attach", shm name, slot count, slot size, client pid)
+                      ("infer", request id, [(image name, slot, length), ...], number of images to return)
+                      ("close",)
+    server -> client: ("result", request id, serialized InferenceResult)
+                      ("error", request id, message)
+"""
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing import connection, resource_tracker, shared_memory
+from typing import Callable, List, Tuple
+
+import msgpack
+
+from inference_service_proto import inference_service_pb2 as grpc_def
+from services.inference_comm import InferenceComm
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """
+    :raise ValueError: the host is not a loopback address
+    """
+    host, port = address.rsplit(":", 1)
+    if not ipaddress.ip_address(socket.gethostbyname(host)).is_loopback:
+        raise ValueError(f"Shared memory transport only runs on loopback addresses, not {host}")
+    return host, int(port)
+
+
+def send_message(conn: connection.Connection, *message):
+    # bin type explicitly: msgpack < 1.0 packs bytes as str, which the other end would decode as utf-8
+    conn.send_bytes(msgpack.packb(message, use_bin_type=True))
+
+
+def receive_message(conn: connection.Connection) -> list:
+    message = msgpack.unpackb(conn.recv_bytes(), raw=False)
+    if not isinstance(message, list) or not message:
+        raise ValueError("Invalid control message")
+    return message
+
+
+class SharedMemoryRing(object):
+    """
+    slot_count slots of slot_size bytes in one shared memory block.
+    The creator owns the block and unlinks it on close; other processes attach by name.
+    """
+
+    def __init__(self, slot_count=64, slot_size=16 * 1024 * 1024, name=None, owner_pid=None):
+        super(SharedMemoryRing, self).__init__()
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slot_count * slot_size)
+            self.free = deque(range(slot_count))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if owner_pid != os.getpid() and os.name == "posix":
+                # the resource tracker of an attaching process would unlink the block when that process exits.
+                # It tracks the POSIX name, which has a leading "/" that SharedMemory.name leaves out.
+                resource_tracker.unregister("/" + self.shm.name, "shared_memory")
+            self.free = deque()
+        self.lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self, count) -> List[int]:
+        """
+        :return: count free slots, or an empty list if not enough slots are free
+        """
+        with self.lock:
+            if len(self.free) < count:
+                return []
+            return [self.free.popleft() for _ in range(count)]
+
+    def release(self, slots):
+        with self.lock:
+            self.free.extend(slots)
+
+    def write(self, slot, data) -> int:
+        data = memoryview(data).cast("B")
+        if data.nbytes > self.slot_size:
+            raise ValueError(f"Frame of {data.nbytes} bytes does not fit a {self.slot_size} bytes slot")
+        start = slot * self.slot_size
+        self.shm.buf[start:start + data.nbytes] = data
+        return data.nbytes
+
+    def read(self, slot, length) -> memoryview:
+        if not 0 <= slot < self.slot_count or not 0 <= length <= self.slot_size:
+            raise ValueError(f"Invalid slot {slot} of length {length}")
+        start = slot * self.slot_size
+        return self.shm.buf[start:start + length]
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedMemoryInferenceComm(InferenceComm):
+    """
+    Drop-in InferenceComm talking to a local server through SharedMemoryRing.
+    """
+
+    def __init__(self, max_in_flight=2, slot_count=64, slot_size=16 * 1024 * 1024):
+        super().__init__(max_in_flight)
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.ring: SharedMemoryRing = None
+        self.conn: connection.Connection = None
+        self.send_lock = threading.Lock()
+        self.receiver: threading.Thread = None
+        self.closing = False
+        self.requests = {}
+        self.request_id = 0
+
+    def connect(self, address):
+        if self.connection_chan.value:
+            return
+        self.address = address
+        self.closing = False
+        try:
+            self.conn = connection.Client(parse_address(address))
+            self.ring = SharedMemoryRing(self.slot_count, self.slot_size)
+            send_message(self.conn, "attach", self.ring.name, self.slot_count, self.slot_size, os.getpid())
+        except (OSError, EOFError, ValueError) as ex:
+            self.error_chan.on_next(f"Cannot connect to shared memory server {address}: {ex}")
+            self.clean()
+            return
+        self.receiver = threading.Thread(target=self._receive, args=(self.conn,), name=f"shm-{address}", daemon=True)
+        self.receiver.start()
+        self.connection_chan.on_next(True)
+
+    def _receive(self, conn: connection.Connection):
+        while True:
+            try:
+                kind, request_id, payload = receive_message(conn)
+            except (EOFError, OSError, TypeError, ValueError, msgpack.UnpackException):
+                break
+            self.inference_done(request_id, kind, payload)
+        if not self.closing:
+            self._fail_pending("connection to the server lost")
+            if self.connection_chan.value:
+                self.connection_chan.on_next(False)
+
+    def _fail_pending(self, reason):
+        with self.lock:
+            failed, self.requests = self.requests, {}
+            self.in_flight -= len(failed)
+        ring = self.ring
+        if ring is not None:
+            for _, slots in failed.values():
+                ring.release(slots)
+        if failed:
+            self.report_error(f"{len(failed)} batches lost: {reason}")
+            self.back_pressure_detection()
+
+    def inference_done(self, request_id, kind, payload):
+        with self.lock:
+            request = self.requests.pop(request_id, None)
+            if request is None:
+                # answer to a batch already failed with its connection
+                return
+            self.in_flight -= 1
+        start_time, slots = request
+        elapsed_time = time.time() - start_time
+        ring = self.ring
+        if ring is not None:
+            ring.release(slots)
+        try:
+            self.back_pressure_detection()
+            if kind == "error":
+                raise RuntimeError(payload)
+            self.report_result(elapsed_time, grpc_def.InferenceResult.FromString(payload))
+        except Exception as ex:
+            self.report_error(ex)
+
+    def feed_images(self, image_and_name):
+        if not self.connection_chan.value:
+            self.error_chan.on_next("Server is not connected. Cannot feed image.")
+            return
+
+        ring, conn = self.ring, self.conn
+        if ring is None or conn is None:
+            self.error_chan.on_next("Server is disconnecting. Cannot feed image.")
+            return
+
+        start_time = time.time()
+        image_and_name = list(image_and_name)
+        slots = ring.acquire(len(image_and_name))
+        if len(slots) < len(image_and_name):
+            self.error_chan.on_next(f"No free shared memory slot for {len(image_and_name)} images. Batch dropped.")
+            return
+
+        try:
+            descriptors = [(name, slot, ring.write(slot, image))
+                           for (image, name), slot in zip(image_and_name, slots)]
+        except ValueError as ex:
+            ring.release(slots)
+            self.error_chan.on_next(str(ex))
+            return
+
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+            self.requests[request_id] = (time.time(), slots)
+            self.in_flight += 1
+        try:
+            with self.send_lock:
+                send_message(conn, "infer", request_id, descriptors, 1)
+        except (OSError, ValueError) as ex:
+            with self.lock:
+                if self.requests.pop(request_id, None) is None:
+                    # already failed and released by _fail_pending
+                    return
+                self.in_flight -= 1
+            ring.release(slots)
+            self.error_chan.on_next(f"Failed to send batch to {self.address}: {ex}")
+            return
+        self.report_sent([name for name, _, _ in descriptors], start_time)
+        self.back_pressure_detection()
+
+    def clean(self):
+        self.closing = True
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                with self.send_lock:
+                    send_message(conn, "close")
+                # wake the receive thread even if the server does not answer
+                with socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, ValueError):
+                pass
+        receiver, self.receiver = self.receiver, None
+        if receiver is not None and receiver is not threading.current_thread():
+            receiver.join(5.0)
+        if conn is not None:
+            conn.close()
+        # the ring is closed only once nothing can release slots into it
+        self._fail_pending("disconnected")
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def empty_result(images: List[Tuple[str, memoryview]], num_image_returned=1) -> bytes:
+    """
+    Stand-in inference: no detection, the first images returned as samples.
+    """
+    result = grpc_def.InferenceResult()
+    for name, data in images:
+        result.result.append(grpc_def.ResultPerImage(image_id=name))
+    for name, data in images[:num_image_returned]:
+        result.returned_images.append(grpc_def.Image(name=name, images_data=bytes(data)))
+    return result.SerializeToString()
+
+
+class SharedMemoryStandInServer(object):
+    """
+    Local stand-in for an inference server speaking the shared memory protocol, for tests and benchmarks.
+    :param handler: (list of (name, memoryview), number of images to return) -> serialized InferenceResult
+    """
+
+    def __init__(self, address="127.0.0.1:0", handler: Callable = empty_result):
+        super(SharedMemoryStandInServer, self).__init__()
+        self.handler = handler
+        self.listener = connection.Listener(parse_address(address))
+        self.frames = 0
+        self._closed = False
+
+    @property
+    def address(self):
+        host, port = self.listener.address
+        return f"{host}:{port}"
+
+    def serve_forever(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                break
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="shm-stand-in", daemon=True).start()
+        return self
+
+    def _serve_client(self, conn: connection.Connection):
+        ring = None
+        try:
+            while True:
+                message = receive_message(conn)
+                if message[0] == "attach":
+                    _, name, slot_count, slot_size, pid = message
+                    if ring is not None:
+                        ring.close()
+                    ring = SharedMemoryRing(slot_count, slot_size, name=name, owner_pid=pid)
+                elif message[0] == "infer":
+                    _, request_id, descriptors, num_image_returned = message
+                    try:
+                        images = [(name, ring.read(slot, length)) for name, slot, length in descriptors]
+                        payload = self.handler(images, num_image_returned)
+                        self.frames += len(images)
+                        del images
+                        send_message(conn, "result", request_id, payload)
+                    except Exception as ex:
+                        send_message(conn, "error", request_id, str(ex))
+                elif message[0] == "close":
+                    break
+        except (EOFError, OSError, TypeError, ValueError, msgpack.UnpackException):
+            pass
+        finally:
+            conn.close()
+            if ring is not None:
+                ring.close()
+
+    def close(self):
+        self._closed = True
+        self.listener.close()
@@ -12,6 +12,7 @@ from services import config
 import services.service_provider
 from services.subjects import Subjects
 from utils.observer import ErrorToConsoleObserver
+from utils.stage_queue import stage_queue
 
 
 class OutputPorts(enum.Enum):
@@ -42,6 +43,9 @@ class SimexIO(object):
             config.SettingRegistry("buffer_count", 5, type="int", title="Image statistics averaging window size"),
             config.SettingRegistry("temperature_sample_time", 1.0, type="float",
                                    title="Temperature report sample time(sec)"),
+            config.SettingRegistry("queue_capacity", 8, type="int", title="Images queued for statistics"),
+            config.SettingRegistry("queue_policy", "drop_oldest", type="str",
+                                   title="Queue overflow (block, drop_oldest, drop_newest, keep_latest)"),
         ])
 
     def connect(self):
@@ -102,7 +106,7 @@ class SimexIO(object):
 
     def _simex_configure_subscription(self, x=None):
         self.subjects.image_producer.pipe(
-            operators.observe_on(self.execution_thread),
+            stage_queue("simex", self.config["queue_capacity"], self.config["queue_policy"], self.execution_thread),
             operators.map(lambda acquired_image: acquired_image.image),  # pluck the image array
             operators.map(lambda im: np.median(im)),
             operators.buffer_with_count(self.config["buffer_count"]),
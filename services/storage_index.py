@@ -0,0 +1,140 @@
+"""
+Fixed-width sidecar index for the msgpack storage segments.
+Each data segment (e.g. images.1.bin) has an index file next to it (images.1.bin.idx) holding one 32-byte
+record per stored msgpack record:
+    name hash (uint64), timestamp (float64, NaN if unknown), byte offset (uint64), length (uint64)
+all little-endian. The index is appended together with the data so readers never have to unpack the payloads.
+"""
+import hashlib
+import os
+import threading
+
+import msgpack
+import numpy as np
+
+INDEX_EXTENSION = ".idx"
+index_dtype = np.dtype([("name_hash", "<u8"), ("ts", "<f8"), ("offset", "<u8"), ("length", "<u8")])
+
+
+def index_path(data_path: str) -> str:
+    return data_path + INDEX_EXTENSION
+
+
+def name_hash(name) -> int:
+    """
+    Stable 64-bit hash of a record name (str or bytes).
+    """
+    if isinstance(name, str):
+        name = name.encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(name, digest_size=8).digest(), "little")
+
+
+def make_index(entries) -> np.ndarray:
+    """
+    :param entries: iterable of (name, timestamp, offset, length)
+    """
+    return np.array([(name_hash(n), np.nan if t is None else t, o, l) for n, t, o, l in entries], dtype=index_dtype)
+
+
+class IndexWriter(object):
+    """
+    Append index records for one data segment.
+    """
+
+    def __init__(self, data_path: str):
+        super(IndexWriter, self).__init__()
+        self.lock = threading.Lock()
+        self._file = open(index_path(data_path), "ab")
+
+    def append(self, name, timestamp, offset: int, length: int):
+        with self.lock:
+            self._file.write(make_index([(name, timestamp, offset, length)]).tobytes())
+
+    def flush(self):
+        with self.lock:
+            self._file.flush()
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+
+
+def read_index(path: str) -> np.ndarray:
+    """
+    Read an index file. A partially written trailing record is ignored.
+    """
+    with open(path, "rb") as f:
+        buf = f.read()
+    count = len(buf) // index_dtype.itemsize
+    return np.frombuffer(buf, dtype=index_dtype, count=count).copy()
+
+
+def scan_records(data_path: str, start=0):
+    """
+    Walk the msgpack records of a data segment. Slow: every payload is unpacked.
+    :param data_path: path to the data segment
+    :param start: byte offset of the first record to read
+    :return: generator of (name, timestamp, offset, length)
+    """
+    with open(data_path, "rb") as f:
+        f.seek(start)
+        unpacker = msgpack.Unpacker(f, raw=True, max_buffer_size=2 ** 31 - 1)
+        offset = start
+        while True:
+            try:
+                record = unpacker.unpack()
+            except msgpack.OutOfData:
+                # end of file or a partially written record
+                return
+            end = start + unpacker.tell()
+            yield record.get(b"name"), record.get(b"ts"), offset, end - offset
+            offset = end
+
+
+def _is_consistent(index: np.ndarray) -> bool:
+    if index.size == 0:
+        return True
+    if index["offset"][0] != 0:
+        return False
+    return bool(np.all(index["offset"][1:] == index["offset"][:-1] + index["length"][:-1]))
+
+
+def load_index(data_path: str, persist=True, growing=False) -> np.ndarray:
+    """
+    Load the index of a data segment.
+    A missing or stale index is rebuilt by scanning the part of the data segment it does not cover yet, and
+    written back to disk if persist is True. Writing back is best effort: a capture on a read-only share still loads.
+    :param growing: the segment may still be written, e.g. the newest one of a capture. An existing index that only
+    lags behind the data is then left alone, since its IndexWriter keeps appending to that file.
+    """
+    path = index_path(data_path)
+    data_size = os.path.getsize(data_path)
+    exists = os.path.exists(path)
+    index = read_index(path) if exists else np.zeros(0, dtype=index_dtype)
+
+    rebuilt = not exists or not _is_consistent(index)
+    if rebuilt:
+        index = np.zeros(0, dtype=index_dtype)
+    # drop records pointing beyond the data that actually reached the disk
+    index = index[index["offset"] + index["length"] <= data_size]
+    covered = int(index["offset"][-1] + index["length"][-1]) if index.size else 0
+
+    if covered < data_size:
+        tail = make_index(scan_records(data_path, covered))
+        index = np.concatenate([index, tail])
+
+    on_disk = os.path.getsize(path) if exists else -1
+    if persist and on_disk != index.nbytes and (rebuilt or not growing):
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(index.tobytes())
+            os.replace(tmp_path, path)
+        except OSError:
+            # read-only location, or the index is held open elsewhere: the index in memory is still valid
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    return index
@@ -0,0 +1,252 @@
+"""
+Random access to a captured run.
+The storage segments are memory-mapped and records are decoded in place: the image payload is returned as a
+memoryview into the mapping, nothing is copied until the consumer decodes the JPEG.
+"""
+import bisect
+import mmap
+import struct
+from typing import Dict, List, Optional
+
+import msgpack
+import numpy as np
+
+from services.storage_index import index_dtype, load_index, name_hash
+from services.storage_writer import list_segments
+
+# bin values longer than this are returned as memoryview instead of bytes
+BLOB_THRESHOLD = 256
+
+
+def _read_value(buf, pos):
+    """
+    Decode one msgpack value starting at pos.
+    :return: (value, position after the value)
+    """
+    b = buf[pos]
+    pos += 1
+    if b <= 0x7f:
+        return b, pos
+    if b >= 0xe0:
+        return b - 0x100, pos
+    if 0x80 <= b <= 0x8f:
+        return _read_map(buf, pos, b & 0x0f)
+    if 0x90 <= b <= 0x9f:
+        return _read_array(buf, pos, b & 0x0f)
+    if 0xa0 <= b <= 0xbf:
+        return _read_str(buf, pos, b & 0x1f)
+
+    if b == 0xc0:
+        return None, pos
+    if b == 0xc2:
+        return False, pos
+    if b == 0xc3:
+        return True, pos
+    if b == 0xc4:
+        return _read_blob(buf, pos + 1, buf[pos])
+    if b == 0xc5:
+        return _read_blob(buf, pos + 2, struct.unpack_from(">H", buf, pos)[0])
+    if b == 0xc6:
+        return _read_blob(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    if b == 0xd9:
+        return _read_str(buf, pos + 1, buf[pos])
+    if b == 0xda:
+        return _read_str(buf, pos + 2, struct.unpack_from(">H", buf, pos)[0])
+    if b == 0xdb:
+        return _read_str(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    if b == 0xca:
+        return struct.unpack_from(">f", buf, pos)[0], pos + 4
+    if b == 0xcb:
+        return struct.unpack_from(">d", buf, pos)[0], pos + 8
+    if b in _INT_FORMATS:
+        fmt = _INT_FORMATS[b]
+        return struct.unpack_from(fmt, buf, pos)[0], pos + struct.calcsize(fmt)
+    if b == 0xdc:
+        return _read_array(buf, pos + 2, struct.unpack_from(">H", buf, pos)[0])
+    if b == 0xdd:
+        return _read_array(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    if b == 0xde:
+        return _read_map(buf, pos + 2, struct.unpack_from(">H", buf, pos)[0])
+    if b == 0xdf:
+        return _read_map(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    if b in _EXT_SIZES:
+        size, header = _EXT_SIZES[b]
+        if header:
+            size = struct.unpack_from(header, buf, pos)[0]
+            pos += struct.calcsize(header)
+        code = struct.unpack_from(">b", buf, pos)[0]
+        return msgpack.ExtType(code, bytes(buf[pos + 1:pos + 1 + size])), pos + 1 + size
+    raise ValueError(f"Invalid msgpack type byte 0x{b:02x}")
+
+
+_INT_FORMATS = {0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q"}
+_EXT_SIZES = {0xd4: (1, None), 0xd5: (2, None), 0xd6: (4, None), 0xd7: (8, None), 0xd8: (16, None),
+              0xc7: (0, ">B"), 0xc8: (0, ">H"), 0xc9: (0, ">I")}
+
+
+def _read_blob(buf, pos, size):
+    end = pos + size
+    if size >= BLOB_THRESHOLD:
+        return memoryview(buf)[pos:end], end
+    return bytes(buf[pos:end]), end
+
+
+def _read_str(buf, pos, size):
+    end = pos + size
+    try:
+        return str(buf[pos:end], "utf-8"), end
+    except UnicodeDecodeError:
+        # binary data of captures written before pack_record, packed as str by msgpack < 1.0
+        return _read_blob(buf, pos, size)
+
+
+def _read_array(buf, pos, size):
+    ret = []
+    for _ in range(size):
+        v, pos = _read_value(buf, pos)
+        ret.append(v)
+    return ret, pos
+
+
+def _read_map(buf, pos, size):
+    ret = {}
+    for _ in range(size):
+        k, pos = _read_value(buf, pos)
+        v, pos = _read_value(buf, pos)
+        ret[k] = v
+    return ret, pos
+
+
+def decode_record(buf, offset=0) -> dict:
+    """
+    Decode the msgpack record (a map) at offset, as msgpack.unpackb(raw=False) would except that large bin values
+    are returned as memoryview into buf.
+    """
+    record, _ = _read_value(buf, offset)
+    if not isinstance(record, dict):
+        raise ValueError(f"Storage record at {offset} is not a map")
+    return record
+
+
+class _MappedSegments(object):
+    def __init__(self, directory, base_name):
+        super(_MappedSegments, self).__init__()
+        self.files = {}
+        self.maps: Dict[int, mmap.mmap] = {}
+        self.indices = []
+        segments = list_segments(directory, base_name)
+        for segment, path in segments:
+            # the newest segment may still be written
+            index = load_index(path, growing=segment == segments[-1][0])
+            self.indices.append((segment, index))
+            if index.size == 0:
+                continue
+            f = open(path, "rb")
+            self.files[segment] = f
+            self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def decode(self, segment, offset) -> dict:
+        return decode_record(self.maps[segment], offset)
+
+    def close(self):
+        for m in self.maps.values():
+            try:
+                m.close()
+            except BufferError:
+                # a memoryview into the mapping is still alive; the mapping is released with it
+                pass
+        for f in self.files.values():
+            f.close()
+        self.maps = {}
+        self.files = {}
+
+
+class StorageReader(object):
+    """
+    Random access reader of a directory written by ResultSaver.
+    Images are addressed by position in write order; seeking by index and by name is O(1), by timestamp
+    O(log n) over the sorted timestamps.
+    """
+
+    def __init__(self, directory):
+        super(StorageReader, self).__init__()
+        self.directory = directory
+        self._images = _MappedSegments(directory, "images")
+        self._labels = _MappedSegments(directory, "labels")
+
+        self.segments = np.concatenate(
+            [np.full(index.size, segment, dtype=np.int64) for segment, index in self._images.indices] or
+            [np.zeros(0, dtype=np.int64)])
+        self.index = np.concatenate([index for _, index in self._images.indices] or [np.zeros(0, dtype=index_dtype)])
+
+        self._row_by_hash = {h: i for i, h in enumerate(self.index["name_hash"].tolist())}
+        self._labels_by_hash = {}
+        for segment, index in self._labels.indices:
+            for h, offset in zip(index["name_hash"].tolist(), index["offset"].tolist()):
+                self._labels_by_hash[h] = (segment, offset)
+
+        ts = self.index["ts"]
+        valid = np.flatnonzero(~np.isnan(ts))
+        order = valid[np.argsort(ts[valid], kind="stable")]
+        self._time_order: List[int] = order.tolist()
+        self._sorted_times: List[float] = ts[order].tolist()
+
+    def __len__(self):
+        return self.index.size
+
+    def index_of_name(self, name) -> Optional[int]:
+        return self._row_by_hash.get(name_hash(name))
+
+    def index_of_time(self, timestamp: float) -> Optional[int]:
+        """
+        :return: the image acquired closest to the timestamp
+        """
+        if not self._sorted_times:
+            return None
+        pos = bisect.bisect_left(self._sorted_times, timestamp)
+        if pos == len(self._sorted_times):
+            pos -= 1
+        elif pos > 0 and timestamp - self._sorted_times[pos - 1] <= self._sorted_times[pos] - timestamp:
+            pos -= 1
+        return self._time_order[pos]
+
+    def image(self, i: int) -> dict:
+        """
+        :return: {"name": str, "data": memoryview of the encoded image, "ts": float, ...}
+        """
+        if i < 0:
+            i += len(self)
+        return self.image_at_offset(int(self.segments[i]), int(self.index["offset"][i]))
+
+    def labels(self, i: int) -> Optional[dict]:
+        if i < 0:
+            i += len(self)
+        location = self._labels_by_hash.get(int(self.index["name_hash"][i]))
+        if location is None:
+            return None
+        return self.labels_at_offset(*location)
+
+    def image_by_name(self, name) -> Optional[dict]:
+        i = self.index_of_name(name)
+        return None if i is None else self.image(i)
+
+    def image_at_time(self, timestamp: float) -> Optional[dict]:
+        i = self.index_of_time(timestamp)
+        return None if i is None else self.image(i)
+
+    def image_at_offset(self, segment: int, offset: int) -> dict:
+        return self._named(self._images.decode(segment, offset))
+
+    def labels_at_offset(self, segment: int, offset: int) -> dict:
+        return self._named(self._labels.decode(segment, offset))
+
+    @staticmethod
+    def _named(record: dict) -> dict:
+        if isinstance(record.get("name"), bytes):
+            record["name"] = record["name"].decode("utf-8")
+        return record
+
+    def close(self):
+        self._images.close()
+        self._labels.close()
+
@@ -0,0 +1,185 @@
+"""
+Append-only segmented storage.
+Records are appended to a family of segment files in the saving directory:
+    images.bin, images.1.bin, images.2.bin, ...
+The first segment keeps the legacy file name so that older readers still find the beginning of the run.
+"""
+import glob
+import os
+import re
+import threading
+import time
+from typing import List, Tuple
+
+import msgpack
+
+from services.storage_index import IndexWriter
+
+SEGMENT_EXTENSION = ".bin"
+
+
+def segment_path(directory: str, base_name: str, segment: int) -> str:
+    if segment == 0:
+        return os.path.join(directory, f"{base_name}{SEGMENT_EXTENSION}")
+    return os.path.join(directory, f"{base_name}.{segment}{SEGMENT_EXTENSION}")
+
+
+def pack_record(record: dict) -> bytes:
+    """
+    Pack a storage record. Bytes values are stored as msgpack bin, whatever the msgpack version, so that readers
+    return the image payloads without decoding them.
+    """
+    return msgpack.packb(record, use_bin_type=True)
+
+
+def list_segments(directory: str, base_name: str) -> List[Tuple[int, str]]:
+    """
+    List the existing segments of a storage file in write order.
+    :param directory: saving directory
+    :param base_name: file name without extension, e.g. "images"
+    :return: list of (segment number, path)
+    """
+    pattern = re.compile(rf"^{re.escape(base_name)}(?:\.(\d+))?{re.escape(SEGMENT_EXTENSION)}$")
+    segments = []
+    for path in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(base_name)}*{SEGMENT_EXTENSION}")):
+        match = pattern.match(os.path.basename(path))
+        if match is None:
+            continue
+        segments.append((int(match.group(1) or 0), path))
+    segments.sort()
+    return segments
+
+
+class SegmentedStorageWriter(object):
+    """
+    Keep the current segment open and append records through a buffered writer.
+    The buffer is flushed when flush_size bytes are pending or flush_interval seconds passed since the last flush.
+    A new segment is started when the current one would exceed segment_size bytes or is older than
+    segment_duration seconds. Zero disables the corresponding limit.
+    If indexed is True, every segment gets a sidecar index (see services.storage_index).
+    All methods are thread-safe.
+    """
+
+    def __init__(self, directory: str, base_name: str, flush_interval=1.0, flush_size=4 * 1024 * 1024,
+                 segment_size=0, segment_duration=0.0, indexed=False):
+        super(SegmentedStorageWriter, self).__init__()
+        self.base_name = base_name
+        self.indexed = indexed
+        self.lock = threading.RLock()
+        self.configure(flush_interval, flush_size, segment_size, segment_duration)
+
+        self.directory = None
+        self.segment = 0
+        self._file = None
+        self._index = None
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        self._unflushed = 0
+        self._last_flush = 0.0
+
+        self.open(directory)
+
+    def configure(self, flush_interval=1.0, flush_size=4 * 1024 * 1024, segment_size=0, segment_duration=0.0):
+        """
+        Update the flushing and rollover limits. A new flush_size applies from the next opened segment.
+        """
+        with self.lock:
+            self.flush_interval = flush_interval
+            self.flush_size = flush_size
+            self.segment_size = segment_size
+            self.segment_duration = segment_duration
+
+    @property
+    def path(self):
+        return segment_path(self.directory, self.base_name, self.segment)
+
+    def open(self, directory: str):
+        """
+        (Re)open the writer in the given directory. Writing resumes at the end of the latest existing segment.
+        """
+        with self.lock:
+            self.close()
+            os.makedirs(directory, exist_ok=True)
+            self.directory = directory
+            segments = list_segments(directory, self.base_name)
+            self.segment = segments[-1][0] if segments else 0
+            self._open_segment()
+
+    def _open_segment(self):
+        self._file = open(self.path, "ab", buffering=max(self.flush_size, 1))
+        if self.indexed:
+            self._index = IndexWriter(self.path)
+        self._segment_bytes = self._file.tell()
+        self._segment_opened = time.monotonic()
+        self._unflushed = 0
+        self._last_flush = self._segment_opened
+
+    def _should_roll(self, size: int) -> bool:
+        if self._segment_bytes == 0:
+            return False
+        if self.segment_size and self._segment_bytes + size > self.segment_size:
+            return True
+        if self.segment_duration and time.monotonic() - self._segment_opened >= self.segment_duration:
+            return True
+        return False
+
+    def _roll(self):
+        self._close_segment()
+        self.segment += 1
+        self._open_segment()
+
+    def write(self, data: bytes, name=None, timestamp=None) -> Tuple[int, int]:
+        """
+        Append one record.
+        :param name: record name stored in the index
+        :param timestamp: record timestamp stored in the index
+        :return: (segment number, byte offset of the record in the segment)
+        """
+        with self.lock:
+            if self._file is None:
+                raise RuntimeError(f"Storage writer for {self.base_name} is closed")
+            if self._should_roll(len(data)):
+                self._roll()
+
+            segment, offset = self.segment, self._segment_bytes
+            self._file.write(data)
+            if self._index is not None:
+                self._index.append(name or "", timestamp, offset, len(data))
+            self._segment_bytes += len(data)
+            self._unflushed += len(data)
+            if self._unflushed >= self.flush_size:
+                self._flush()
+            else:
+                self.flush(force=False)
+            return segment, offset
+
+    def flush(self, force=True):
+        """
+        Flush the pending bytes to the OS.
+        :param force: if False, only flush when flush_interval has elapsed since the last flush
+        """
+        with self.lock:
+            if self._file is None or self._unflushed == 0:
+                return
+            if force or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        # data first, so that the index never points past the flushed data
+        self._file.flush()
+        if self._index is not None:
+            self._index.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def _close_segment(self):
+        self._file.close()
+        self._file = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._close_segment()
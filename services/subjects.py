@@ -15,6 +15,8 @@ class Subjects(object):
     Internal message channel multiplexier
     """
     image_producer: typing.Subject[AcquiredImage, AcquiredImage] = subject.Subject()
+    # the same frames as image_producer, in the same order, once their encoded_buffer is ready
+    encoded_image_producer: typing.Subject[AcquiredImage, AcquiredImage] = subject.Subject()
     image_source_connected: subject.BehaviorSubject = subject.BehaviorSubject(False)
 
     sample_image_data: typing.Subject[SampleImageData, SampleImageData] = subject.Subject()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from PyQt5 import QtCore
+
+from services import config
+
+
+class TestSettingsCache(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.original = config.global_settings
+        config.global_settings = QtCore.QSettings(os.path.join(self.directory.name, "settings.ini"),
+                                                  QtCore.QSettings.IniFormat)
+        config.invalidate()
+        config.default_settings("Test_Section", [
+            config.SettingRegistry("count", 3, type="int"),
+            config.SettingRegistry("enabled", False, type="bool"),
+            config.SettingRegistry("name", "a"),
+        ])
+        self.accessor = config.SettingAccessor("Test_Section")
+
+    def tearDown(self) -> None:
+        snapshot = config._snapshots.pop("Test_Section", None)
+        if snapshot is not None:
+            snapshot._dispose()
+        config._registered.pop("Test_Section", None)
+        config.global_settings = self.original
+        config.setting_path = self.original.fileName()
+        config.invalidate()
+        self.directory.cleanup()
+
+    def test_typed_values(self):
+        self.assertEqual(self.accessor["count"], 3)
+        self.assertIs(self.accessor["enabled"], False)
+        self.assertEqual(self.accessor["name"], "a")
+
+    def test_cache_follows_updates(self):
+        self.assertEqual(self.accessor["count"], 3)
+        self.accessor["count"] = 5
+        self.assertEqual(self.accessor["count"], 5)
+        self.assertEqual(config.global_settings.value("Test_Section/count", type=int), 5)
+
+    def test_snapshot(self):
+        snapshot = config.section("Test_Section")
+        self.assertIs(config.section("Test_Section"), snapshot)
+        self.assertEqual(snapshot.count, 3)
+        self.assertIn("count", vars(snapshot))
+
+        self.accessor["enabled"] = True
+        self.assertIs(snapshot.enabled, True)
+
+        config.default_settings("Test_Section", [config.SettingRegistry("late", 1.5, type="float")])
+        self.assertEqual(snapshot.late, 1.5)
+
+    def test_use_settings_file(self):
+        snapshot = config.section("Test_Section")
+        path = os.path.join(self.directory.name, "run.ini")
+        run = QtCore.QSettings(path, QtCore.QSettings.IniFormat)
+        run.setValue("Test_Section/count", 7)
+        run.sync()
+
+        config.use_settings_file(path)
+        # the type comes from the registered defaults
+        self.assertEqual(self.accessor["count"], 7)
+        self.assertEqual(snapshot.count, 7)
+        self.assertEqual(self.accessor["name"], "a")
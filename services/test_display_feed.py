@@ -0,0 +1,52 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+import numpy as np
+from rx import subject
+
+from services import config, service_provider  # noqa: F401 (before subject_data, which imports it back)
+from data_class.subject_data import AcquiredImage
+from services.display_feed import DisplayFeed, fit_to
+
+
+class TestDisplayFeed(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.original = config.setting_path
+        config.use_settings_file(os.path.join(self.directory.name, "settings.ini"))
+
+    def tearDown(self) -> None:
+        config.use_settings_file(self.original)
+        self.directory.cleanup()
+
+    def test_fit_to(self):
+        image = np.zeros((400, 1000), dtype=np.uint8)
+        self.assertEqual(fit_to(image, (500, 500)).shape, (200, 500))
+        self.assertEqual(fit_to(image, (100, 20)).shape, (20, 50))
+        self.assertIs(fit_to(image, (2000, 2000)), image)
+        self.assertIs(fit_to(image, None), image)
+
+    def test_latest_frames_rate_limited(self):
+        config.SettingAccessor(DisplayFeed.config_prefix)["max_fps"] = 10.0
+        source = subject.Subject()
+        shown = []
+        done = threading.Event()
+        source.pipe(DisplayFeed("test", lambda: (100, 50))).subscribe(shown.append, on_completed=done.set)
+
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.5:
+            source.on_next(AcquiredImage(np.zeros((200, 400), dtype=np.uint8), time.time()))
+            time.sleep(0.001)
+        last = AcquiredImage(np.ones((200, 400), dtype=np.uint8), time.time(), "last.jpg")
+        source.on_next(last)
+        source.on_completed()
+        done.wait(2.0)
+
+        # at most 10 fps plus the frame in progress, and the newest frame is never lost
+        self.assertLessEqual(len(shown), 7)
+        self.assertEqual(shown[-1].name, "last.jpg")
+        self.assertEqual(shown[-1].image.shape, (50, 100))
+        self.assertTrue(shown[-1].image.all())
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+import numpy as np
+
+from services import config, service_provider  # noqa: F401 (before subject_data, which imports it back)
+from data_class.subject_data import AcquiredImage
+from services.encoding_stage import EncodingStage
+from services.image_encoder import ImageEncoder
+
+
+class GatedEncoder(ImageEncoder):
+    """
+    Encodes a frame into its index, once its gate is open.
+    """
+    format = "raw"
+
+    def __init__(self):
+        super(GatedEncoder, self).__init__()
+        self.gates = {}
+        self.failing = set()
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def encode(self, image: np.ndarray):
+        index = int(image[0, 0])
+        with self.lock:
+            self.calls[index] = self.calls.get(index, 0) + 1
+        gate = self.gates.get(index)
+        if gate is not None:
+            gate.wait(5.0)
+        if index in self.failing:
+            raise ValueError(f"cannot encode {index}")
+        return bytes([index])
+
+
+def frame(index):
+    return AcquiredImage(np.full((2, 2), index, dtype=np.uint8), float(index), f"{index}.jpg")
+
+
+class TestEncodingStage(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.original = config.setting_path
+        config.use_settings_file(os.path.join(self.directory.name, "settings.ini"))
+        settings = config.SettingAccessor(EncodingStage.config_prefix)
+        settings["workers"] = 4
+        settings["max_pending"] = 4
+
+        self.encoder = GatedEncoder()
+        EncodingStage.request_encoder("gated")
+        self.stage = EncodingStage({"gated": self.encoder})
+        self.published = []
+        self.consume = self.published.append
+        self.subscription = self.stage.subjects.encoded_image_producer.subscribe(lambda image: self.consume(image))
+
+    def tearDown(self) -> None:
+        for gate in self.encoder.gates.values():
+            gate.set()
+        self.subscription.dispose()
+        self.stage.finalize()
+        EncodingStage.release_encoder("gated")
+        config.use_settings_file(self.original)
+        self.directory.cleanup()
+
+    def feed(self, *indices):
+        for index in indices:
+            self.stage.subjects.image_producer.on_next(frame(index))
+
+    def wait_published(self, count, timeout=5.0):
+        deadline = time.time() + timeout
+        while len(self.published) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return [image.name for image in self.published]
+
+    def test_in_order_when_workers_finish_out_of_order(self):
+        first = self.encoder.gates[0] = threading.Event()
+        self.feed(0, 1, 2, 3)
+        deadline = time.time() + 5.0
+        while len(self.encoder.calls) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.published, [])
+
+        first.set()
+        self.assertEqual(self.wait_published(4), ["0.jpg", "1.jpg", "2.jpg", "3.jpg"])
+
+    def test_encoded_exactly_once(self):
+        encoded = []
+
+        def read(image):
+            # a consumer reading the requested encoder gets the stage's encoding
+            encoded.append(image.encoded_as("gated"))
+            self.published.append(image)
+
+        self.consume = read
+        self.feed(0, 1, 2)
+        self.wait_published(3)
+        self.assertEqual(encoded, [b"\x00", b"\x01", b"\x02"])
+        self.assertEqual(self.encoder.calls, {0: 1, 1: 1, 2: 1})
+
+    def test_blocks_at_capacity(self):
+        gate = threading.Event()
+        for index in range(5):
+            self.encoder.gates[index] = gate
+        self.feed(0, 1, 2, 3)
+        fifth = threading.Thread(target=self.feed, args=(4,), daemon=True)
+        fifth.start()
+        fifth.join(0.2)
+        self.assertTrue(fifth.is_alive())
+        self.assertEqual(len(self.stage.pending), 4)
+
+        gate.set()
+        fifth.join(5.0)
+        self.assertFalse(fifth.is_alive())
+        self.assertEqual(self.wait_published(5), [f"{i}.jpg" for i in range(5)])
+        self.assertEqual(self.stage.dropped, 0)
+
+    def test_failed_encode_is_dropped(self):
+        self.encoder.failing.add(1)
+        with self.assertLogs("console", "ERROR"):
+            self.feed(0, 1, 2)
+            self.assertEqual(self.wait_published(2), ["0.jpg", "2.jpg"])
+        self.assertEqual(self.stage.encoded, 2)
+
+    def test_slow_consumer_does_not_block_submit(self):
+        release = threading.Event()
+
+        def slow(image):
+            self.published.append(image)
+            release.wait(5.0)
+
+        self.consume = slow
+        self.feed(0)
+        self.wait_published(1)
+        # the consumer holds the publishing thread, new frames are still accepted and encoded
+        feeding = threading.Thread(target=self.feed, args=(1, 2), daemon=True)
+        feeding.start()
+        feeding.join(1.0)
+        self.assertFalse(feeding.is_alive())
+
+        release.set()
+        self.assertEqual(self.wait_published(3), ["0.jpg", "1.jpg", "2.jpg"])
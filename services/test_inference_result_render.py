@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from pycocotools import mask as mask_util
+
+from data_class.detected_objects import DetectedObject
+from services.inference_result_render import PALETTE, blend_labels, paint_labels, render_inference
+from utils import image_codec
+
+
+def detected_object(mask: np.ndarray) -> DetectedObject:
+    detected = DetectedObject()
+    detected.maskRLE = mask_util.encode(np.asfortranarray(mask))
+    detected.bbox = detected.rle_bbox
+    detected.label = 1
+    detected.score = 0.5
+    return detected
+
+
+class TestInferenceResultRender(TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.masks = []
+        for _ in range(10):
+            mask = np.zeros((48, 64), dtype=np.uint8)
+            cv2.ellipse(mask, (int(rng.integers(5, 59)), int(rng.integers(5, 43))),
+                        (int(rng.integers(2, 12)), int(rng.integers(2, 12))), 30, 0, 360, 1, -1)
+            self.masks.append(mask)
+        self.detections = [detected_object(m) for m in self.masks]
+
+    def test_paint_labels(self):
+        expected = np.zeros((48, 64), dtype=np.uint16)
+        for i, mask in enumerate(self.masks):
+            expected[mask.astype(bool)] = i + 1
+        np.testing.assert_array_equal(paint_labels(self.detections, (48, 64)), expected)
+        np.testing.assert_array_equal(paint_labels(self.detections, (24, 32), 2), expected[::2, ::2])
+        np.testing.assert_array_equal(paint_labels(self.detections, (12, 16), 4), expected[::4, ::4])
+        self.assertEqual(paint_labels([], (4, 4)).sum(), 0)
+
+    def test_blend_labels(self):
+        im = np.full((2, 2, 3), 100, dtype=np.uint8)
+        labels = np.array([[0, 1], [2, 0]], dtype=np.uint16)
+        blend_labels(im, labels, alpha=0.5)
+
+        np.testing.assert_array_equal(im[0, 0], [100, 100, 100])
+        np.testing.assert_allclose(im[0, 1], (100 + PALETTE[0].astype(int)) / 2, atol=1)
+        np.testing.assert_allclose(im[1, 0], (100 + PALETTE[1].astype(int)) / 2, atol=1)
+
+    def test_render(self):
+        image = np.zeros((48, 64), dtype=np.uint8)
+        rendered = render_inference(image_codec.pack_raw(image), self.detections)
+        self.assertEqual(rendered.shape, (48, 64, 3))
+        self.assertTrue(rendered[self.masks[0].astype(bool)].any())
+
+        jpeg = cv2.imencode(".jpg", image)[1].tobytes()
+        self.assertEqual(render_inference(jpeg, self.detections, reduction=2).shape, (24, 32, 3))
+        with self.assertRaises(ValueError):
+            render_inference(jpeg, self.detections, reduction=3)
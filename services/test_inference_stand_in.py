@@ -0,0 +1,99 @@
+import time
+from unittest import TestCase, mock
+
+import numpy as np
+
+from data_class.detected_objects import DetectedObject
+from services.inference_comm import InferenceComm
+from services.inference_stand_in import SyntheticFailure, SyntheticInference, serve
+from utils import image_codec
+
+
+class TestSyntheticInference(TestCase):
+    def setUp(self) -> None:
+        self.image = image_codec.pack_raw(np.zeros((120, 160), dtype=np.uint8))
+
+    def test_detections(self):
+        inference = SyntheticInference(latency=0, objects=5, object_jitter=2, seed=0)
+        result = inference.infer([("a", self.image), ("b", self.image)], 1)
+
+        self.assertEqual([r.image_id for r in result.result], ["a", "b"])
+        self.assertEqual([i.name for i in result.returned_images], ["a"])
+        for per_image in result.result:
+            self.assertTrue(3 <= len(per_image.detections) <= 7)
+            for detection in per_image.detections:
+                obj: DetectedObject = InferenceComm.to_detected_object(detection)
+                self.assertEqual(obj.size, (120, 160))
+                self.assertGreater(obj.area, 0)
+                self.assertEqual(obj.rle_bbox, obj.bbox)
+        self.assertEqual(inference.metrics(), {"batches": 1, "frames": 2, "failures": 0})
+
+    def test_latency(self):
+        inference = SyntheticInference(latency=0.02, jitter=0.01, objects=1)
+        start = time.perf_counter()
+        inference.infer([(str(i), self.image) for i in range(5)])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_failure(self):
+        inference = SyntheticInference(latency=0, failure_rate=1.0)
+        with self.assertRaises(SyntheticFailure):
+            inference.infer([("a", self.image)])
+        self.assertEqual(inference.metrics()["failures"], 1)
+
+
+class TestStandInServer(TestCase):
+    def test_round_trip(self):
+        server, address = serve(SyntheticInference(latency=0.01, objects=3, width=64, height=48))
+        comm = InferenceComm(max_in_flight=2)
+        results, errors = [], []
+        comm.result_chan.subscribe(results.append)
+        comm.error_chan.subscribe(errors.append)
+        try:
+            comm.connect(address)
+            deadline = time.time() + 5
+            while not comm.connection_chan.value and time.time() < deadline:
+                time.sleep(0.01)
+            comm.feed_images([(b"not decoded", "a")])
+            while not results and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            comm.stop()
+            server.stop(0)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results[0].result[0].detections), 3)
+        self.assertEqual(comm.in_flight, 0)
+
+    def test_round_trips_measured_per_call(self):
+        # the small batch sent last answers first, each round trip still starts at its own send time
+        server, address = serve(SyntheticInference(latency=0.05, objects=0, width=64, height=48), workers=2)
+        comm = InferenceComm(max_in_flight=2)
+        stats = []
+        comm.stats_chan.subscribe(stats.append)
+        try:
+            comm.connect(address)
+            deadline = time.time() + 5
+            while not comm.connection_chan.value and time.time() < deadline:
+                time.sleep(0.01)
+            comm.feed_images([(b"not decoded", str(i)) for i in range(6)])
+            time.sleep(0.1)
+            comm.feed_images([(b"not decoded", "last")])
+            while len(stats) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            comm.stop()
+            server.stop(0)
+
+        self.assertEqual([s.frame for s in stats], [1, 6])
+        self.assertLess(stats[0].processTime, 0.1)
+        self.assertGreaterEqual(stats[1].processTime, 0.3)
+
+    def test_failed_call_releases_its_slot(self):
+        comm = InferenceComm(max_in_flight=2)
+        comm.connection_chan.on_next(True)
+        comm.stub = mock.Mock()
+        comm.stub.Inference.future.side_effect = ValueError("Cannot invoke RPC on closed channel!")
+        with self.assertRaises(ValueError):
+            comm.feed_images([(b"not decoded", "a")])
+        self.assertEqual(comm.in_flight, 0)
+        self.assertFalse(comm.saturated)
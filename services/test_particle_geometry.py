@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from pycocotools import mask as mask_util
+
+from data_class.detected_objects import DetectedObject
+from services import particle_geometry
+
+
+def make_detection(canvas_shape, center, axes, angle):
+    canvas = np.zeros(canvas_shape, dtype=np.uint8)
+    cv2.ellipse(canvas, center, (axes[0] // 2, axes[1] // 2), angle, 0, 360, 1, -1)
+    detection = DetectedObject()
+    detection.maskRLE = mask_util.encode(np.asfortranarray(canvas))
+    detection.bbox = detection.rle_bbox
+    return detection
+
+
+class TestParticleGeometry(TestCase):
+    def setUp(self) -> None:
+        self.shape = (300, 400)
+        self.ellipses = [((100, 100), (80, 40), 30), ((250, 200), (60, 60), 0), ((330, 60), (50, 20), 100)]
+        self.detections = [make_detection(self.shape, *e) for e in self.ellipses]
+
+    def test_rle_areas(self):
+        areas = particle_geometry.rle_areas(self.detections)
+        np.testing.assert_array_equal(areas, [d.mask.sum() for d in self.detections])
+        self.assertEqual(particle_geometry.rle_areas([]).size, 0)
+
+    def test_cropped_mask_keeps_all_pixels(self):
+        for d in self.detections:
+            crop = d.cropped_mask()
+            self.assertEqual(crop.sum(), d.mask.sum())
+            self.assertLess(crop.size, d.mask.size)
+            self.assertEqual(d.area, d.mask.sum())
+            ys, xs = np.nonzero(d.mask)
+            self.assertEqual(d.rle_bbox, (xs.min(), ys.min(), xs.max(), ys.max()))
+            np.testing.assert_allclose(d.centroid, (xs.mean(), ys.mean()))
+
+    def test_moment_ellipses(self):
+        _, majors, minors = particle_geometry.measure(self.detections, "moments")
+        expected = np.array([e[1] for e in self.ellipses], dtype=np.float64)
+        np.testing.assert_allclose(majors, expected[:, 0], rtol=0.05)
+        np.testing.assert_allclose(minors, expected[:, 1], rtol=0.08)
+
+    def test_contour_matches_moments(self):
+        _, majors_m, minors_m = particle_geometry.measure(self.detections, "moments")
+        _, majors_c, minors_c = particle_geometry.measure(self.detections, "contour")
+        np.testing.assert_allclose(majors_c, majors_m, rtol=0.05)
+        np.testing.assert_allclose(minors_c, minors_m, rtol=0.1)
+
+    def test_empty_mask(self):
+        majors, minors = particle_geometry.moment_ellipses([np.zeros((3, 3), dtype=np.uint8)])
+        self.assertTrue(np.isnan(majors[0]))
+        self.assertEqual(particle_geometry.measure([], "moments")[1].size, 0)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from pycocotools import mask as mask_util
+
+from services import config, service_provider  # noqa: F401 (before subject_data, which imports it back)
+from data_class.detected_objects import DetectedObject
+from data_class.subject_data import DetectionsInImage
+from services.result_processor import ResultProcessor
+from utils.histogram import make_edges
+
+
+def rectangle(width, height, shape=(100, 100)):
+    canvas = np.zeros(shape, dtype=np.uint8)
+    cv2.rectangle(canvas, (10, 10), (10 + width - 1, 10 + height - 1), 1, -1)
+    detection = DetectedObject()
+    detection.maskRLE = mask_util.encode(np.asfortranarray(canvas))
+    detection.bbox = detection.rle_bbox
+    return detection
+
+
+class TestResultProcessor(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.original = config.setting_path
+        config.use_settings_file(os.path.join(self.directory.name, "settings.ini"))
+        self.settings = config.SettingAccessor(ResultProcessor.config_prefix)
+        self.settings["histogram_scale"] = "linear"
+        self.settings["histogram_seconds"] = 10.0
+
+        self.processor = ResultProcessor()
+        self.distributions = []
+        self.points = []
+        self.subscriptions = [
+            self.processor.subjects.processed_distributions.subscribe(self.distributions.append),
+            self.processor.subjects.add_to_timeline.subscribe(self.points.append),
+        ]
+
+    def tearDown(self) -> None:
+        for s in self.subscriptions:
+            s.dispose()
+        self.processor.finalize()
+        config.use_settings_file(self.original)
+        self.directory.cleanup()
+
+    def process(self, *sizes):
+        self.processor.process_distribution_data(
+            [DetectionsInImage(str(i), [rectangle(*size)]) for i, size in enumerate(sizes)])
+
+    def test_seconds_view_expires_without_new_images(self):
+        self.process((10, 20), (10, 10))
+        self.assertEqual(self.distributions[-1].dists["areas"].histograms["seconds"].count, 2)
+
+        # nothing left the window yet, nothing to publish
+        self.processor.expire_histograms(time.time() + 1)
+        self.assertEqual(len(self.distributions), 1)
+
+        self.processor.expire_histograms(time.time() + 20)
+        self.assertEqual(len(self.distributions), 2)
+        histograms = self.distributions[-1].dists["areas"].histograms
+        self.assertEqual(histograms["seconds"].count, 0)
+        self.assertEqual(histograms["run"].count, 2)
+
+    def test_calibrated_area_histogram(self):
+        self.settings["calibration_ratio"] = 2.0
+        self.process((10, 20))
+        areas = self.distributions[-1].dists["areas"]
+        np.testing.assert_array_equal(areas.area_dist, [800.0])
+        s = self.processor.settings
+        edges = make_edges("linear", s.area_histogram_min, s.area_histogram_max, s.histogram_bins)
+        np.testing.assert_allclose(areas.histograms["run"].edges, edges * 4)
+        self.assertAlmostEqual(areas.histograms["run"].mean, 800.0)
+
+        ellipses = self.distributions[-1].dists["ellipses"]
+        axis_edges = make_edges("linear", s.axis_histogram_min, s.axis_histogram_max, s.histogram_bins)
+        np.testing.assert_allclose(ellipses.major_histograms["run"].edges, axis_edges * 2)
+
+    def test_calibrated_statistics(self):
+        self.settings["calibration_ratio"] = 2.0
+        self.settings["statistics_interval"] = 0.0
+        self.process((10, 20), (10, 20))
+        values = {(p.plot_name, p.series_name): p.value for p in self.points}
+        for series in ("D10", "D50", "D90", "mean"):
+            self.assertAlmostEqual(values[("Particle area", series)], 800.0)
+        # lengths keep the linear ratio
+        lengths = self.processor.statistics()["majors"]
+        self.assertAlmostEqual(values[("Major axis", "mean")], lengths[1] * 2.0)
@@ -0,0 +1,117 @@
+import threading
+import time
+from multiprocessing import connection
+from unittest import TestCase
+
+from services.shm_transport import SharedMemoryInferenceComm, SharedMemoryRing, SharedMemoryStandInServer, \
+    receive_message
+
+
+class TestSharedMemoryRing(TestCase):
+    def test_slots(self):
+        ring = SharedMemoryRing(slot_count=3, slot_size=16)
+        try:
+            slots = ring.acquire(2)
+            self.assertEqual(len(slots), 2)
+            self.assertEqual(ring.acquire(2), [])
+            self.assertEqual(ring.write(slots[1], b"abc"), 3)
+            self.assertEqual(bytes(ring.read(slots[1], 3)), b"abc")
+            with self.assertRaises(ValueError):
+                ring.write(slots[0], bytes(17))
+            ring.release(slots)
+            self.assertEqual(len(ring.acquire(3)), 3)
+        finally:
+            ring.close()
+
+
+class TestSharedMemoryInferenceComm(TestCase):
+    def setUp(self) -> None:
+        self.server = SharedMemoryStandInServer().start()
+        self.comm = SharedMemoryInferenceComm(max_in_flight=2, slot_count=4, slot_size=1024)
+        self.results = []
+        self.errors = []
+        self.comm.result_chan.subscribe(self.results.append)
+        self.comm.error_chan.subscribe(self.errors.append)
+
+    def tearDown(self) -> None:
+        self.comm.stop()
+        self.server.close()
+
+    def wait_results(self, count, timeout=5.0):
+        deadline = time.time() + timeout
+        while len(self.results) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_round_trip(self):
+        self.comm.connect(self.server.address)
+        self.assertTrue(self.comm.connection_chan.value)
+        self.comm.feed_images([(b"first", "a"), (b"second", "b")])
+        self.wait_results(1)
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual([r.image_id for r in self.results[0].result], ["a", "b"])
+        self.assertEqual(self.results[0].returned_images[0].images_data, b"first")
+        self.assertEqual(len(self.comm.ring.free), 4)
+        self.assertEqual(self.comm.in_flight, 0)
+
+    def test_batch_without_free_slots_is_dropped(self):
+        self.comm.connect(self.server.address)
+        self.comm.feed_images([(b"x", str(i)) for i in range(5)])
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(self.comm.in_flight, 0)
+
+    def test_stop_fails_pending_batches(self):
+        release = threading.Event()
+        self.server.handler = lambda images, n: release.wait(5.0) and b""
+        comm = SharedMemoryInferenceComm(max_in_flight=1, slot_count=4, slot_size=1024)
+        comm.connect(self.server.address)
+        comm.feed_images([(b"x", "a")])
+        self.assertTrue(comm.saturated)
+
+        comm.stop()
+        release.set()
+        comm.connect(self.server.address)
+        try:
+            self.assertEqual(comm.in_flight, 0)
+            self.assertFalse(comm.saturated)
+            self.assertFalse(comm.back_pressure_chan.value)
+        finally:
+            comm.stop()
+
+    def test_lost_connection_fails_pending_batches(self):
+        listener = connection.Listener(("127.0.0.1", 0))
+
+        def drop_after_first_batch():
+            conn = listener.accept()
+            receive_message(conn)
+            receive_message(conn)
+            conn.close()
+
+        threading.Thread(target=drop_after_first_batch, daemon=True).start()
+        host, port = listener.address
+        self.comm.connect(f"{host}:{port}")
+        self.comm.feed_images([(b"x", "a")])
+        deadline = time.time() + 5.0
+        while self.comm.connection_chan.value and time.time() < deadline:
+            time.sleep(0.01)
+        listener.close()
+
+        self.assertFalse(self.comm.connection_chan.value)
+        self.assertEqual(self.comm.in_flight, 0)
+        self.assertEqual(self.comm.requests, {})
+        self.assertEqual(len(self.comm.ring.free), 4)
+        self.assertEqual(len(self.errors), 1)
+
+    def test_loopback_and_plain_messages_only(self):
+        with self.assertRaises(ValueError):
+            SharedMemoryStandInServer("0.0.0.0:0")
+        self.comm.connect("192.0.2.1:3034")
+        self.assertFalse(self.comm.connection_chan.value)
+        self.assertEqual(len(self.errors), 1)
+
+        # a pickle is not a control message, the server hangs up without loading it
+        conn = connection.Client(("127.0.0.1", int(self.server.address.rsplit(":", 1)[1])))
+        conn.send(("attach", "psm_missing", 1, 1, 0))
+        with self.assertRaises(EOFError):
+            conn.recv_bytes()
+        conn.close()
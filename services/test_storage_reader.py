@@ -0,0 +1,77 @@
+import tempfile
+from unittest import TestCase
+
+import msgpack
+
+from services.storage_writer import SegmentedStorageWriter, pack_record
+from services.storage_reader import StorageReader, decode_record
+
+
+class TestDecodeRecord(TestCase):
+    def test_matches_msgpack(self):
+        record = {
+            "name": "1.jpg", "ts": 1.5, "int": -3, "big": 2 ** 40, "none": None, "flag": True,
+            "list": [1, "a", {"x": 0.25}], "data": bytes(range(256)) * 4,
+        }
+        for use_bin_type in (True, False):
+            decoded = decode_record(msgpack.packb(record, use_bin_type=use_bin_type))
+            self.assertIsInstance(decoded["data"], memoryview)
+            self.assertEqual(bytes(decoded["data"]), record["data"])
+            self.assertEqual(decoded["ts"], 1.5)
+            self.assertEqual(decoded["int"], -3)
+            self.assertEqual(decoded["big"], 2 ** 40)
+            self.assertIsNone(decoded["none"])
+            self.assertTrue(decoded["flag"])
+            # keys and str values are str at every level, as with msgpack.unpackb(raw=False)
+            self.assertEqual(decoded["list"], [1, "a", {"x": 0.25}])
+
+    def test_image_payload_is_not_copied(self):
+        # valid utf-8, it would come back as str if it were stored as msgpack str
+        data = b"jpeg" * 1000
+        decoded = decode_record(pack_record({"name": "1.jpg", "data": data}))
+        self.assertIsInstance(decoded["data"], memoryview)
+        self.assertEqual(bytes(decoded["data"]), data)
+        self.assertEqual(decoded["name"], "1.jpg")
+
+
+class TestStorageReader(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        images = SegmentedStorageWriter(self.tmp.name, "images", indexed=True, segment_size=4000)
+        labels = SegmentedStorageWriter(self.tmp.name, "labels", indexed=True)
+        # written out of time order on purpose
+        self.times = [5.0, 1.0, 3.0, 2.0, 4.0]
+        for i, t in enumerate(self.times):
+            name = f"{i}.jpg"
+            images.write(pack_record({"name": name, "data": bytes([i]) * 1000, "ts": t}), name, t)
+            labels.write(pack_record({"name": name, "labels": [{"label": i}]}), name)
+        images.close()
+        labels.close()
+        self.reader = StorageReader(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.reader.close()
+        self.tmp.cleanup()
+
+    def test_seek_by_index(self):
+        self.assertEqual(len(self.reader), 5)
+        for i in (0, 4, 2, -1):
+            record = self.reader.image(i)
+            i %= 5
+            self.assertEqual(record["name"], f"{i}.jpg")
+            self.assertEqual(record["ts"], self.times[i])
+            self.assertIsInstance(record["data"], memoryview)
+            self.assertEqual(bytes(record["data"]), bytes([i]) * 1000)
+            self.assertEqual(self.reader.labels(i)["labels"][0]["label"], i)
+
+    def test_seek_by_name(self):
+        self.assertEqual(self.reader.index_of_name("3.jpg"), 3)
+        self.assertIsNone(self.reader.index_of_name("missing.jpg"))
+        self.assertEqual(self.reader.image_by_name("2.jpg")["ts"], 3.0)
+
+    def test_seek_by_time(self):
+        self.assertEqual(self.reader.index_of_time(2.9), 2)
+        self.assertEqual(self.reader.index_of_time(2.2), 3)
+        self.assertEqual(self.reader.index_of_time(0), 1)
+        self.assertEqual(self.reader.index_of_time(100), 0)
+        self.assertEqual(self.reader.image_at_time(4.1)["name"], "4.jpg")
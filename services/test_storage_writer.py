@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from services.storage_writer import SegmentedStorageWriter, list_segments, segment_path
+
+
+class TestSegmentedStorageWriter(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_append_keeps_offsets(self):
+        writer = SegmentedStorageWriter(self.directory, "images")
+        self.assertEqual(writer.write(b"abc"), (0, 0))
+        self.assertEqual(writer.write(b"defg"), (0, 3))
+        writer.close()
+        with open(segment_path(self.directory, "images", 0), "rb") as f:
+            self.assertEqual(f.read(), b"abcdefg")
+
+    def test_flush_size(self):
+        writer = SegmentedStorageWriter(self.directory, "images", flush_interval=3600, flush_size=8)
+        writer.write(b"1234")
+        self.assertEqual(os.path.getsize(writer.path), 0)
+        writer.write(b"5678")
+        self.assertEqual(os.path.getsize(writer.path), 8)
+        writer.close()
+
+    def test_flush_interval(self):
+        writer = SegmentedStorageWriter(self.directory, "images", flush_interval=0.05, flush_size=1024)
+        writer.write(b"1234")
+        writer.flush(force=False)
+        self.assertEqual(os.path.getsize(writer.path), 0)
+        time.sleep(0.1)
+        writer.flush(force=False)
+        self.assertEqual(os.path.getsize(writer.path), 4)
+        writer.close()
+
+    def test_rollover_by_size(self):
+        writer = SegmentedStorageWriter(self.directory, "images", segment_size=10)
+        self.assertEqual(writer.write(b"x" * 6), (0, 0))
+        self.assertEqual(writer.write(b"x" * 6), (1, 0))
+        # a single record larger than the limit still goes into one segment
+        self.assertEqual(writer.write(b"x" * 20), (2, 0))
+        writer.close()
+        self.assertEqual([s for s, _ in list_segments(self.directory, "images")], [0, 1, 2])
+
+    def test_rollover_by_time(self):
+        writer = SegmentedStorageWriter(self.directory, "images", segment_duration=0.05)
+        writer.write(b"a")
+        time.sleep(0.1)
+        self.assertEqual(writer.write(b"b"), (1, 0))
+        writer.close()
+
+    def test_resume_and_reopen(self):
+        writer = SegmentedStorageWriter(self.directory, "images", segment_size=4)
+        writer.write(b"abcd")
+        writer.write(b"efgh")
+        writer.close()
+
+        writer = SegmentedStorageWriter(self.directory, "images", segment_size=8)
+        self.assertEqual(writer.write(b"ij"), (1, 4))
+
+        with tempfile.TemporaryDirectory() as other:
+            writer.open(other)
+            self.assertEqual(writer.write(b"kl"), (0, 0))
+            writer.close()
+            self.assertEqual(list_segments(other, "images"), [(0, segment_path(other, "images", 0))])
+
+    def test_list_segments_ignores_other_files(self):
+        for name in ("images.bin", "images.2.bin", "images.10.bin", "images.bin.idx", "images_backup.bin"):
+            open(os.path.join(self.directory, name), "wb").close()
+        self.assertEqual([s for s, _ in list_segments(self.directory, "images")], [0, 2, 10])
@@ -1,19 +1,36 @@
-import os
+import math
 from collections import OrderedDict
 
-import msgpack
 import rx
 from rx import disposable
 
+from services.storage_index import load_index
+from services.storage_writer import list_segments
+from services.storage_reader import StorageReader
+
 
 class ImageLabelIndex(object):
-    def __init__(self, name, image_offset, label_offset):
+    def __init__(self, name, image_offset, label_offset, name_hash=None, timestamp=None,
+                 image_segment=0, image_length=None, label_segment=None, label_length=None):
+        """
+        :param name: record name. The sidecar index only stores its hash, so load_directory leaves it None and
+        FileLoader.get_data fills it in from the image record.
+        """
         self.name = name
+        self.name_hash = name_hash
+        self.timestamp = timestamp
         self.label_offset = label_offset
         self.image_offset = image_offset
+        self.image_segment = image_segment
+        self.image_length = image_length
+        self.label_segment = label_segment
+        self.label_length = label_length
 
     def __repr__(self) -> str:
-        return f"name={self.name}, label_offset={self.label_offset}, image_offset={self.image_offset}"
+        name_hash = None if self.name_hash is None else f"{self.name_hash:016x}"
+        return f"name={self.name}, name_hash={name_hash}, timestamp={self.timestamp}, " \
+               f"label_offset={self.label_segment}:{self.label_offset}, " \
+               f"image_offset={self.image_segment}:{self.image_offset}"
 
 
 class FileLoader(object):
@@ -23,73 +40,93 @@ class FileLoader(object):
 
     def __init__(self):
         super(FileLoader, self).__init__()
+        self.directory = None
+        self.reader = None
 
     def load_directory(self, path) -> (rx.Observable, rx.Observable):
         """
         Locate and load the *.bin files. Parse the file and create the index to labels and images rather than loading
-        them directly to memory
+        them directly to memory.
+        The sidecar *.idx files written by ResultSaver are used when present. Otherwise the segments are scanned
+        once and the index is persisted for the next time.
         :param path: path to directory
         :return: 0:  observable reporting the progress based on file bytes. Will complete when finished.
         """
 
         def subscribe(observer, scheduler=None):
-            subs = disposable.CompositeDisposable()
-            image_storage = os.path.join(path, "images.bin")
-            label_storage = os.path.join(path, "images.bin")
+            self.directory = path
+            image_segments = list_segments(path, "images")
+            label_segments = list_segments(path, "labels")
 
-            if not os.path.exists(image_storage):
+            if not image_segments:
                 raise FileNotFoundError(f"Image storage is not present in {path}")
 
-            has_label = os.path.exists(label_storage)
-
-            try:
-                with open(image_storage, "rb") as f_image:
-                    if has_label:
-                        with open(label_storage, "rb") as f_label:
-                            subs.add(self._index_image(f_image, f_label).subscribe(observer))
-                    else:
-                        subs.add(self._index_image(f_image, None).subscribe(observer))
-
-            except FileNotFoundError:
-                raise FileNotFoundError(f"Image storage is not present in {path}")
-            except Exception:
-                raise
-
-            return subs
+            return self._index_image(image_segments, label_segments).subscribe(observer)
 
         return rx.create(subscribe)
 
-    def get_data(self, index=None) -> object:
-        pass
+    def get_data(self, index: ImageLabelIndex = None) -> object:
+        """
+        Read the records referred by an index produced by load_directory.
+        :return: (image record, label record or None). The encoded image is a memoryview into the mapped file.
+        """
+        if self.directory is None:
+            raise RuntimeError("No directory is loaded")
+        if self.reader is None or self.reader.directory != self.directory:
+            if self.reader is not None:
+                self.reader.close()
+            self.reader = StorageReader(self.directory)
+
+        image = self.reader.image_at_offset(index.image_segment, index.image_offset)
+        if index.name is None:
+            index.name = image.get("name")
+        labels = None
+        if index.label_offset is not None:
+            labels = self.reader.labels_at_offset(index.label_segment, index.label_offset)
+        return image, labels
+
+    @staticmethod
+    def load_segment_indices(segments):
+        """
+        :param segments: list of (segment number, path)
+        :return: list of (segment number, index array)
+        """
+        # the newest segment may still be written
+        return [(segment, load_index(segment_path, growing=i == len(segments) - 1))
+                for i, (segment, segment_path) in enumerate(segments)]
 
-    def _index_image(self, f_image, f_label) -> rx.Observable:
+    def _index_image(self, image_segments, label_segments) -> rx.Observable:
         def subscribe(observer: rx.typing.Observer, scheduler=None):
-            image_unpacker = msgpack.Unpacker(f_image)
-            label_unpacker = msgpack.Unpacker(f_label)
             stop = False
 
+            def dispose():
+                nonlocal stop
+                stop = True
+
             try:
-                image_mapping = OrderedDict()
                 label_mapping = OrderedDict()
-                offset = 0
-                for v in image_unpacker:
-                    if stop:
-                        raise InterruptedError("abort image indexing")
-                    image_mapping[v[b"name"]] = offset
-                    offset = image_unpacker.tell()
-
-                offset = 0
-                for v in label_unpacker:
+                for segment, index in self.load_segment_indices(label_segments):
                     if stop:
                         raise InterruptedError("abort label indexing")
-                    label_mapping[v[b"name"]] = offset
-                    offset = label_unpacker.tell()
-
-                for name, img_offset in image_mapping.items():
-                    if stop:
-                        raise InterruptedError("abort assembling index")
-                    label_offset = label_mapping[name] if name in label_mapping else None
-                    observer.on_next(ImageLabelIndex(name, img_offset, label_offset))
+                    for h, offset, length in zip(index["name_hash"].tolist(), index["offset"].tolist(),
+                                                 index["length"].tolist()):
+                        label_mapping[h] = (segment, offset, length)
+
+                for segment, index in self.load_segment_indices(image_segments):
+                    for h, ts, offset, length in zip(index["name_hash"].tolist(), index["ts"].tolist(),
+                                                     index["offset"].tolist(), index["length"].tolist()):
+                        if stop:
+                            raise InterruptedError("abort assembling index")
+                        label_segment, label_offset, label_length = label_mapping.get(h, (None, None, None))
+                        observer.on_next(ImageLabelIndex(
+                            None, offset, label_offset,
+                            name_hash=h,
+                            timestamp=None if math.isnan(ts) else ts,
+                            image_segment=segment,
+                            image_length=length,
+                            label_segment=label_segment,
+                            label_length=label_length,
+                        ))
 
             except InterruptedError:
                 # disposed
@@ -97,9 +134,6 @@ class FileLoader(object):
 
             observer.on_completed()
 
-            def dispose():
-                stop = True
-
             return disposable.Disposable(dispose)
 
         return rx.create(subscribe)
@@ -1,20 +1,19 @@
-import io
+import os
 import sys
 
-from PIL import Image
+import cv2
 from PyQt5 import QtWidgets, QtGui, QtCore
 import pyqtgraph as pg
-import msgpack
-import numpy as np
+
+from services.storage_reader import StorageReader
+from utils import image_codec
 
 
 class ImageViewer(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.image_generator = None
-        self.image_pos = []
+        self.reader: StorageReader = None
         self.image_idx = 0
-        self.image_path = None
 
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
@@ -35,43 +34,51 @@ class ImageViewer(QtWidgets.QWidget):
         super().keyPressEvent(a0)
 
     def load_image(self, path):
-        self.image_path = path
-
-        def image_generator():
-            with open(path, "rb") as f:
-                unpacker = msgpack.Unpacker(f)
-                self.image_pos.append(0)
-                for val in unpacker:
-                    self.image_pos.append(unpacker.tell())
-                    yield val
-
-        self.image_generator = image_generator()
+        """
+        :param path: capture directory or the images.bin inside it
+        """
+        if os.path.isfile(path):
+            path = os.path.dirname(path)
+        if self.reader is not None:
+            self.reader.close()
+        self.reader = StorageReader(path)
+        self.seek(0)
 
     def load_labels(self, path):
         pass
 
-    def next_image(self):
-        if self.image_generator is None:
+    def seek(self, idx):
+        if self.reader is None or len(self.reader) == 0:
             return
-        self.image_idx += 1
-        self.show_image(next(self.image_generator))
+        self.image_idx = min(max(idx, 0), len(self.reader) - 1)
+        self.show_image(self.reader.image(self.image_idx))
 
-    def prev_image(self):
-        if self.image_generator is None:
+    def seek_name(self, name):
+        if self.reader is None:
             return
-        if self.image_idx == 0:
+        idx = self.reader.index_of_name(name)
+        if idx is not None:
+            self.seek(idx)
+
+    def seek_time(self, timestamp):
+        if self.reader is None:
             return
-        self.image_idx -= 1
-        pos = self.image_pos[self.image_idx]
-        with open(self.image_path, "rb") as f:
-            f.seek(pos)
-            unpacker = msgpack.Unpacker(f)
-            self.show_image(next(unpacker))
+        idx = self.reader.index_of_time(timestamp)
+        if idx is not None:
+            self.seek(idx)
+
+    def next_image(self):
+        self.seek(self.image_idx + 1)
+
+    def prev_image(self):
+        self.seek(self.image_idx - 1)
 
     def show_image(self, im):
-        name, data, ts = im[b"name"], im[b"data"], im[b"ts"]
-        im = Image.open(io.BytesIO(data))
-        self.image_item.setImage(np.asarray(im))
+        # decode straight from the mapped file
+        im = image_codec.decode(im["data"], im.get("format"))
+        if im.ndim == 3:
+            im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
+        self.image_item.setImage(im)
 
 
 class ImageViewerApp(QtWidgets.QMainWindow):
@@ -1,8 +1,13 @@
+import os
+import tempfile
 from typing import List
-from unittest import TestCase
+from unittest import TestCase, mock
 
+import msgpack
 from rx import operators
 
+from services.storage_index import index_dtype, index_path, name_hash
+from services.storage_writer import SegmentedStorageWriter, segment_path
 from storage_viewer.file_loader import FileLoader, ImageLabelIndex
 from storage_viewer.operators import buffer_until_complete
 from storage_viewer.test.test_observer import TestObserver
@@ -19,3 +24,115 @@ class TestFileLoader(TestCase):
         observer = TestObserver("load directory", self, on_next=report)
 
         fl.load_directory(DIR_PATH).pipe(buffer_until_complete()).subscribe(observer)
+
+
+class TestFileLoaderIndex(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write_capture(self, count, indexed=True, segment_size=0):
+        images = SegmentedStorageWriter(self.directory, "images", indexed=indexed, segment_size=segment_size)
+        labels = SegmentedStorageWriter(self.directory, "labels", indexed=indexed)
+        for i in range(count):
+            name = f"{i}.jpg"
+            images.write(msgpack.packb({"name": name, "data": bytes(100 + i), "ts": float(i)}), name, float(i))
+            if i % 2 == 0:
+                labels.write(msgpack.packb({"name": name, "labels": []}), name)
+        images.close()
+        labels.close()
+
+    def load(self, loader=None):
+        result = []
+        (loader or FileLoader()).load_directory(self.directory).subscribe(
+            TestObserver("index", self, on_next=result.append, on_completed=lambda: None))
+        return result
+
+    def check(self, indices: List[ImageLabelIndex], count):
+        self.assertEqual(len(indices), count)
+        for i, index in enumerate(indices):
+            self.assertEqual(index.name_hash, name_hash(f"{i}.jpg"))
+            self.assertEqual(index.timestamp, float(i))
+            if i % 2 == 0:
+                self.assertIsNotNone(index.label_offset)
+            else:
+                self.assertIsNone(index.label_offset)
+
+    def test_sidecar_index(self):
+        self.write_capture(10, segment_size=500)
+        indices = self.load()
+        self.check(indices, 10)
+        self.assertGreater(indices[-1].image_segment, 0)
+
+        # the offsets point at the records
+        with open(segment_path(self.directory, "images", indices[1].image_segment), "rb") as f:
+            f.seek(indices[1].image_offset)
+            record = msgpack.unpackb(f.read(indices[1].image_length), raw=False)
+        self.assertEqual(record["name"], "1.jpg")
+
+    def test_get_data(self):
+        self.write_capture(4)
+        loader = FileLoader()
+        indices = self.load(loader)
+        self.assertIsNone(indices[2].name)
+        self.assertIn("name=None", repr(indices[2]))
+        image, labels = loader.get_data(indices[2])
+        self.assertEqual(image["name"], "2.jpg")
+        self.assertEqual(indices[2].name, "2.jpg")
+        self.assertEqual(bytes(image["data"]), bytes(102))
+        self.assertEqual(labels["name"], "2.jpg")
+        self.assertIsNone(loader.get_data(indices[3])[1])
+        loader.reader.close()
+
+    def test_rebuild_missing_index(self):
+        self.write_capture(6, indexed=False)
+        self.assertFalse(os.path.exists(index_path(segment_path(self.directory, "images", 0))))
+        self.check(self.load(), 6)
+        # rebuilt index is persisted
+        self.assertTrue(os.path.exists(index_path(segment_path(self.directory, "images", 0))))
+        self.check(self.load(), 6)
+
+    def test_extend_stale_index(self):
+        self.write_capture(4)
+        path = segment_path(self.directory, "images", 0)
+        with open(path, "ab") as f:
+            f.write(msgpack.packb({"name": "4.jpg", "data": b"", "ts": 4.0}))
+        # a partially written record at the end is ignored
+        with open(path, "ab") as f:
+            f.write(msgpack.packb({"name": "5.jpg", "data": bytes(50), "ts": 5.0})[:20])
+        indices = self.load()
+        self.assertEqual(len(indices), 5)
+        self.assertEqual(indices[-1].name_hash, name_hash("4.jpg"))
+
+    def test_read_only_location(self):
+        self.write_capture(4, indexed=False)
+        index_file = index_path(segment_path(self.directory, "images", 0))
+        with mock.patch("services.storage_index.os.replace", side_effect=PermissionError("read-only")):
+            self.check(self.load(), 4)
+        self.assertFalse(os.path.exists(index_file))
+        self.assertFalse(os.path.exists(index_file + ".tmp"))
+
+    def test_growing_segment_index_is_left_to_the_writer(self):
+        images = SegmentedStorageWriter(self.directory, "images", indexed=True, segment_size=300)
+        for i in range(4):
+            images.write(msgpack.packb({"name": f"{i}.jpg", "data": bytes(100 + i), "ts": float(i)}), f"{i}.jpg",
+                         float(i))
+        images.flush()
+        last = images.path
+        # data of the next record reached the disk before its index record
+        with open(last, "ab") as f:
+            f.write(msgpack.packb({"name": "4.jpg", "data": bytes(104), "ts": 4.0}))
+        records_on_disk = os.path.getsize(index_path(last))
+        try:
+            self.assertEqual([index.name_hash for index in self.load()],
+                             [name_hash(f"{i}.jpg") for i in range(5)])
+            self.assertEqual(os.path.getsize(index_path(last)), records_on_disk)
+            # the writer still appends to the index file the reader sees
+            images.write(msgpack.packb({"name": "5.jpg", "data": b"", "ts": 5.0}), "5.jpg", 5.0)
+            images.flush()
+            self.assertEqual(os.path.getsize(index_path(last)), records_on_disk + index_dtype.itemsize)
+        finally:
+            images.close()
@@ -1,10 +1,15 @@
 import logging
+import threading
+import time
+from collections import deque
 
 from rx.core import typing
 from rx.core.typing import AbsoluteTime, RelativeTime, TState, ScheduledAction, ScheduledPeriodicAction
 from rx.disposable import Disposable, SingleAssignmentDisposable, CompositeDisposable
 from rx.scheduler.scheduler import Scheduler
 
+from utils import metrics
+
 log = logging.getLogger(__name__)
 
 """
@@ -19,6 +24,7 @@ Limitations:
 """
 
 glob_post_function = None
+glob_coalesced_actions = None
 
 SCHEDULE = 'Rx.SCHEDULE'                    # args: (invoke_action,)
 SCHEDULE_RELATIVE = 'Rx.SCHEDULE_RELATIVE'  # args; (invoke_action, duetime)
@@ -120,6 +126,76 @@ def QtScheduler(QtCore):
     return _QtScheduler(glob_post_function)
 
 
+def CoalescingQtScheduler(QtCore, budget=0.008):
+    """
+    QtScheduler variant for busy GUIs: scheduled actions go to one shared queue instead of one QEvent each. At most
+    one wake-up event is pending at a time; it runs the queued actions for up to budget seconds and leaves the rest to
+    the next event loop iteration, so painting and input are never starved.
+    The queue depth is the gauge qt_scheduler.depth, the time of every drain the histogram qt_scheduler.drain.
+    Timed and periodic actions are handled as by QtScheduler.
+    :param budget: seconds, used by the first call only
+    """
+    global glob_coalesced_actions
+
+    # sets up the handler and glob_post_function
+    QtScheduler(QtCore)
+    if glob_coalesced_actions is None:
+        glob_coalesced_actions = _CoalescedActions(glob_post_function, budget)
+    return _CoalescingQtScheduler(glob_post_function, glob_coalesced_actions)
+
+
+class _CoalescedActions(object):
+    def __init__(self, post_function, budget):
+        super(_CoalescedActions, self).__init__()
+        self._post = post_function
+        self.budget = budget
+        # append and popleft are atomic, only the wake-up flag needs the lock
+        self.actions = deque()
+        self.wake_lock = threading.Lock()
+        self.wake_pending = False
+
+        metrics.gauge("qt_scheduler.depth", lambda: len(self.actions))
+        self.drain_time = metrics.histogram("qt_scheduler.drain")
+        self.wakeup_counter = metrics.counter("qt_scheduler.wakeups")
+        self.action_counter = metrics.counter("qt_scheduler.actions")
+
+    def append(self, action):
+        self.actions.append(action)
+        self._wake()
+
+    def _wake(self):
+        with self.wake_lock:
+            if self.wake_pending:
+                return
+            self.wake_pending = True
+        self._post(SCHEDULE, self.drain)
+
+    def drain(self):
+        """
+        Runs in the GUI thread.
+        """
+        with self.wake_lock:
+            # actions appended from now on post a new wake-up if this drain misses them
+            self.wake_pending = False
+        started = time.perf_counter()
+        deadline = started + self.budget
+        count = 0
+        while self.actions:
+            action = self.actions.popleft()
+            try:
+                action()
+            except Exception:
+                log.exception("Scheduled action failed")
+            count += 1
+            if time.perf_counter() >= deadline:
+                break
+        self.drain_time.record(time.perf_counter() - started)
+        self.wakeup_counter.inc()
+        self.action_counter.inc(count)
+        if self.actions:
+            self._wake()
+
+
 class _QtScheduler(Scheduler):
     """A scheduler for a PyQt4/PyQt5/PySide event loop."""
 
@@ -198,4 +274,28 @@ class _QtScheduler(Scheduler):
 
         self._post(SCHEDULE_PERIODIC, invoke_action, timer_ptr, period)
 
-        return CompositeDisposable(sad, Disposable(dispose))
\ No newline at end of file
+        return CompositeDisposable(sad, Disposable(dispose))
+
+
+class _CoalescingQtScheduler(_QtScheduler):
+    def __init__(self, post_function, actions: _CoalescedActions):
+        super(_CoalescingQtScheduler, self).__init__(post_function)
+        self._actions = actions
+
+    def schedule(self, action: ScheduledAction, state: TState = None):
+        """Schedules an action to be executed in the next drain of the shared queue."""
+        sad = SingleAssignmentDisposable()
+        is_disposed = False
+        scheduler = self
+
+        def invoke_action():
+            if not is_disposed:
+                sad.disposable = action(scheduler, state)
+
+        def dispose():
+            nonlocal is_disposed
+            is_disposed = True
+
+        self._actions.append(invoke_action)
+
+        return CompositeDisposable(sad, Disposable(dispose))
@@ -0,0 +1,118 @@
+"""
+Batching whose size follows the measured inference latency.
+- BatchSizeController: additive increase while the round trip stays below the target latency, multiplicative
+  decrease when it goes above.
+- adaptive_buffer: like operators.buffer_with_count, but the count is read for every batch and a partial batch is
+  emitted when its first item waited longer than max_wait.
+"""
+import math
+import threading
+from typing import Callable
+
+import rx
+from rx.disposable import CompositeDisposable, Disposable, SerialDisposable
+from rx.scheduler import TimeoutScheduler
+
+from data_class.inference_stats import InferenceStats
+
+
+class BatchSizeController(object):
+    def __init__(self, initial=5, min_size=1, max_size=32, target_latency=0.5, smoothing=0.3, headroom=0.8):
+        """
+        :param target_latency: wanted round trip time of one batch in seconds
+        :param smoothing: weight of the newest measurement in the latency average
+        :param headroom: grow only while the latency is below headroom * target_latency
+        """
+        super().__init__()
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.latency = None
+        self.lock = threading.Lock()
+        self._size = self._clip(initial)
+
+    def _clip(self, size):
+        return min(max(int(size), self.min_size), self.max_size)
+
+    @property
+    def batch_size(self) -> int:
+        return self._size
+
+    def update(self, stats: InferenceStats) -> int:
+        """
+        Feed the round trip time of a finished batch.
+        :return: the new batch size
+        """
+        if stats.frame <= 0 or stats.processTime is None:
+            return self._size
+
+        with self.lock:
+            if self.latency is None:
+                self.latency = stats.processTime
+            else:
+                self.latency += self.smoothing * (stats.processTime - self.latency)
+
+            if self.latency > self.target_latency:
+                # shrink in proportion to the overshoot, at least by one
+                scaled = math.floor(self._size * self.target_latency / self.latency)
+                self._size = self._clip(min(scaled, self._size - 1))
+            elif self.latency < self.target_latency * self.headroom:
+                self._size = self._clip(self._size + 1)
+            return self._size
+
+
+def adaptive_buffer(batch_size: Callable[[], int], max_wait: float = 0.0, timer_scheduler=None):
+    """
+    Buffer items into lists of batch_size() items.
+    :param batch_size: called whenever an item is added, so the size can change between batches
+    :param max_wait: emit a partial batch once its oldest item waited this many seconds. 0 to disable.
+    :param timer_scheduler: scheduler of the max_wait timer
+    """
+
+    def _adaptive_buffer(source: rx.Observable) -> rx.Observable:
+        def subscribe(observer, scheduler=None):
+            timer_sch = timer_scheduler or TimeoutScheduler.singleton()
+            lock = threading.RLock()
+            buffer = []
+            generation = 0
+            timer = SerialDisposable()
+
+            def flush():
+                nonlocal buffer, generation
+                generation += 1
+                timer.disposable = Disposable()
+                if buffer:
+                    batch, buffer = buffer, []
+                    observer.on_next(batch)
+
+            def on_timeout(_, state):
+                with lock:
+                    if state == generation:
+                        flush()
+
+            def on_next(x):
+                with lock:
+                    buffer.append(x)
+                    if len(buffer) >= batch_size():
+                        flush()
+                    elif len(buffer) == 1 and max_wait > 0:
+                        timer.disposable = timer_sch.schedule_relative(max_wait, on_timeout, generation)
+
+            def on_error(ex):
+                with lock:
+                    timer.dispose()
+                    observer.on_error(ex)
+
+            def on_completed():
+                with lock:
+                    flush()
+                    timer.dispose()
+                    observer.on_completed()
+
+            return CompositeDisposable(source.subscribe_(on_next, on_error, on_completed, scheduler), timer)
+
+        return rx.create(subscribe)
+
+    return _adaptive_buffer
@@ -0,0 +1,123 @@
+"""
+Acquisition-side frame accounting and inference decimation.
+- FrameTiming: dropped frames from the gaps between camera (hardware) timestamps, late frames from the delay
+  between the camera timestamp and the arrival on the host. The delay is compared with its minimum over a sliding
+  window, so the drift between the camera and host clocks does not accumulate over a run.
+- FrameDecimator: which frames are sent to inference while the analyzer reports back pressure
+"""
+import threading
+from collections import deque
+
+DECIMATION_MODES = ("none", "every_nth", "latest")
+
+
+class FrameTiming(object):
+    def __init__(self, period: float = None, late_threshold: float = 0.05, smoothing: float = 0.05,
+                 baseline_window: float = 10.0):
+        """
+        :param period: expected seconds between frames. None to estimate it from the timestamps.
+        :param late_threshold: a frame arriving this many seconds later than the earliest arrival (relative to its
+        camera timestamp) of the baseline window is late
+        :param baseline_window: camera seconds over which the earliest arrival is taken
+        """
+        super(FrameTiming, self).__init__()
+        self.period = period
+        self.late_threshold = late_threshold
+        self.smoothing = smoothing
+        self.baseline_window = baseline_window
+        # (timestamp, delay) with increasing delays, the front is the minimum of the window
+        self.min_delays = deque()
+        self.lock = threading.Lock()
+        self.estimated_period = None
+        self.last_timestamp = None
+        self.frames = 0
+        self.dropped = 0
+        self.late = 0
+        self.out_of_order = 0
+        self.max_gap = 0.0
+
+    def update(self, timestamp: float, arrival: float) -> int:
+        """
+        :param timestamp: camera timestamp of the frame in seconds
+        :param arrival: host time when the frame was received in seconds
+        :return: number of frames missing right before this one
+        """
+        with self.lock:
+            self.frames += 1
+            delay = arrival - timestamp
+            min_delays = self.min_delays
+            while min_delays and min_delays[-1][1] >= delay:
+                min_delays.pop()
+            min_delays.append((timestamp, delay))
+            while min_delays[0][0] < timestamp - self.baseline_window:
+                min_delays.popleft()
+            if delay - self.min_delays[0][1] > self.late_threshold:
+                self.late += 1
+
+            last, self.last_timestamp = self.last_timestamp, timestamp
+            if last is None:
+                return 0
+            gap = timestamp - last
+            if gap <= 0:
+                self.out_of_order += 1
+                return 0
+            self.max_gap = max(self.max_gap, gap)
+
+            if self.estimated_period is None:
+                self.estimated_period = gap
+            elif gap < 1.5 * self.estimated_period:
+                self.estimated_period += self.smoothing * (gap - self.estimated_period)
+
+            period = self.period or self.estimated_period
+            missing = max(int(round(gap / period)) - 1, 0)
+            self.dropped += missing
+            return missing
+
+    @property
+    def min_delay(self):
+        with self.lock:
+            return self.min_delays[0][1] if self.min_delays else None
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "frames": self.frames,
+                "dropped": self.dropped,
+                "late": self.late,
+                "out_of_order": self.out_of_order,
+                "period": self.period or self.estimated_period,
+                "max_gap": self.max_gap,
+            }
+
+
+class FrameDecimator(object):
+    """
+    none: every frame goes to inference
+    every_nth: while back pressure is set, only every nth frame goes to inference
+    latest: while back pressure is set no frame goes to inference, so the first frame after it clears is the latest
+    Frames are always delivered to the other consumers (storage, display).
+    """
+
+    def __init__(self, mode="none", n=2):
+        super(FrameDecimator, self).__init__()
+        if mode not in DECIMATION_MODES:
+            raise ValueError(f"Unknown decimation mode {mode}. Expected one of {DECIMATION_MODES}")
+        self.mode = mode
+        self.n = max(int(n), 1)
+        self.count = 0
+        self.skipped = 0
+
+    def select(self, back_pressure: bool) -> bool:
+        """
+        :return: True if the next frame should be sent to inference
+        """
+        if self.mode == "none" or not back_pressure:
+            self.count = 0
+            return True
+        if self.mode == "every_nth":
+            self.count += 1
+            if self.count >= self.n:
+                self.count = 0
+                return True
+        self.skipped += 1
+        return False
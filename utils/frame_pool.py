@@ -0,0 +1,107 @@
+"""
+Recycled frame buffers for the acquisition path.
+Frames handed out by FramePool are numpy arrays whose memory is owned by a small ctypes object. Every view derived
+from a frame keeps that owner alive, so the memory goes back to the pool (or a held driver buffer is requeued) only
+when the last array referring to it is gone, i.e. when all subscribers released the AcquiredImage.
+"""
+import ctypes
+import threading
+import weakref
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+
+def owned_view(storage: np.ndarray, shape, dtype, on_release: Callable[[], None]) -> np.ndarray:
+    """
+    Array of the given shape over storage, calling on_release once no array refers to it anymore.
+    :param storage: writable, C-contiguous memory of at least the frame size
+    """
+    owner = (ctypes.c_char * storage.nbytes).from_buffer(storage)
+    frame = np.frombuffer(owner, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    weakref.finalize(owner, on_release)
+    return frame
+
+
+class FramePool(object):
+    """
+    Up to capacity preallocated buffers per frame shape and dtype. When all of them are in use a plain array is
+    allocated instead and counted as exhausted.
+    """
+
+    def __init__(self, capacity=16):
+        super(FramePool, self).__init__()
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.free: Dict[Tuple, deque] = {}
+        self.allocated: Dict[Tuple, int] = {}
+        self.reused = 0
+        self.exhausted = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.held = 0
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        """
+        :return: uninitialized frame, returned to the pool when released
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        key = (shape, dtype.str)
+        with self.lock:
+            free = self.free.setdefault(key, deque())
+            if free:
+                storage = free.pop()
+                self.reused += 1
+            elif self.allocated.get(key, 0) < self.capacity:
+                storage = np.empty(int(np.prod(shape)) * dtype.itemsize, dtype=np.uint8)
+                self.allocated[key] = self.allocated.get(key, 0) + 1
+            else:
+                self.exhausted += 1
+                return np.empty(shape, dtype=dtype)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return owned_view(storage, shape, dtype, lambda: self._release(key, storage))
+
+    def _release(self, key, storage):
+        with self.lock:
+            self.in_use -= 1
+            self.free[key].append(storage)
+
+    def copy(self, source: np.ndarray) -> np.ndarray:
+        """
+        Pooled copy of source.
+        """
+        frame = self.acquire(source.shape, source.dtype)
+        np.copyto(frame, source)
+        return frame
+
+    def hold(self, source: np.ndarray, on_release: Callable[[], None]) -> np.ndarray:
+        """
+        Zero-copy: wrap memory owned by somebody else (e.g. a driver buffer) and call on_release (e.g. requeue the
+        buffer) when the frame is released.
+        :raise TypeError: if source is not writable or not contiguous
+        """
+        if not source.flags.c_contiguous or not source.flags.writeable:
+            raise TypeError("Only writable, C-contiguous buffers can be held")
+
+        with self.lock:
+            self.held += 1
+
+        def release():
+            with self.lock:
+                self.held -= 1
+            on_release()
+
+        return owned_view(source.reshape(-1).view(np.uint8), source.shape, source.dtype, release)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "allocated": sum(self.allocated.values()),
+                "reused": self.reused,
+                "exhausted": self.exhausted,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "held": self.held,
+            }
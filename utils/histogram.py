@@ -0,0 +1,174 @@
+"""
+Histograms over fixed bin edges, updated incrementally.
+The edges never move, so histograms of the same edges can be merged and subtracted bin by bin. SlidingHistogram uses
+that to keep "whole run", "last N frames" and "last N seconds" views up to date in O(bins) per frame, without keeping
+any raw value. Values outside the edges are counted in an underflow and an overflow bin.
+"""
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+import numpy as np
+
+SCALES = ("linear", "log")
+VIEWS = ("seconds", "frames", "run")
+
+
+def make_edges(scale: str, low: float, high: float, bins: int) -> np.ndarray:
+    """
+    :param scale: linear or log (equal width in log space)
+    """
+    if bins < 1 or not high > low:
+        raise ValueError(f"Invalid histogram range {low}..{high} with {bins} bins")
+    if scale == "linear":
+        return np.linspace(low, high, bins + 1)
+    if scale == "log":
+        if low <= 0:
+            raise ValueError("Log histogram edges need a positive lower bound")
+        return np.geomspace(low, high, bins + 1)
+    raise ValueError(f"Unknown histogram scale {scale}. Expected one of {SCALES}")
+
+
+class HistogramAccumulator(object):
+    def __init__(self, edges: Iterable[float], log=False):
+        """
+        :param log: the edges are logarithmic, a hint for plotting
+        """
+        super(HistogramAccumulator, self).__init__()
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.log = log
+        # [underflow, bins..., overflow]
+        self.counts = np.zeros(self.edges.size + 1, dtype=np.int64)
+        self.total = 0.0
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def bin_counts(self) -> np.ndarray:
+        """
+        Counts between the edges, len(edges) - 1 values
+        """
+        return self.counts[1:-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        count = self.count
+        return self.total / count if count else None
+
+    def add(self, values) -> "HistogramAccumulator":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size:
+            # bin i holds edges[i - 1] <= v < edges[i], the last edge is inclusive as in np.histogram
+            index = np.searchsorted(self.edges, values, side="right")
+            index[values == self.edges[-1]] = self.edges.size - 1
+            self.counts += np.bincount(index, minlength=self.counts.size)
+            self.total += float(values.sum())
+        return self
+
+    def _check(self, other: "HistogramAccumulator"):
+        if other.edges is not self.edges and not np.array_equal(other.edges, self.edges):
+            raise ValueError("Histograms with different edges cannot be combined")
+
+    def merge(self, other: "HistogramAccumulator") -> "HistogramAccumulator":
+        self._check(other)
+        self.counts += other.counts
+        self.total += other.total
+        return self
+
+    def subtract(self, other: "HistogramAccumulator") -> "HistogramAccumulator":
+        self._check(other)
+        self.counts -= other.counts
+        self.total -= other.total
+        return self
+
+    def clear(self):
+        self.counts[:] = 0
+        self.total = 0.0
+
+    def copy(self, scale=1.0) -> "HistogramAccumulator":
+        """
+        :param scale: multiply the edges, e.g. to convert pixels to micrometers
+        """
+        h = HistogramAccumulator(self.edges * scale if scale != 1.0 else self.edges, self.log)
+        h.counts = self.counts.copy()
+        h.total = self.total * scale
+        return h
+
+
+class _Window(object):
+    def __init__(self, edges, log, frames: int = None, seconds: float = None):
+        super(_Window, self).__init__()
+        self.frames = frames
+        self.seconds = seconds
+        self.entries = deque()
+        self.sum = HistogramAccumulator(edges, log)
+
+    def push(self, timestamp, frame: HistogramAccumulator):
+        self.entries.append((timestamp, frame))
+        self.sum.merge(frame)
+        if self.frames is not None:
+            while len(self.entries) > self.frames:
+                self.sum.subtract(self.entries.popleft()[1])
+        self.expire(timestamp)
+
+    def expire(self, now):
+        if self.seconds is None:
+            return
+        while self.entries and self.entries[0][0] < now - self.seconds:
+            self.sum.subtract(self.entries.popleft()[1])
+
+
+class SlidingHistogram(object):
+    """
+    One histogram per frame, summed into three views:
+        run      everything since start or reset
+        frames   the last `frames` frames
+        seconds  the frames of the last `seconds` seconds
+    """
+
+    def __init__(self, edges: Iterable[float], frames=100, seconds=60.0, log=False):
+        super(SlidingHistogram, self).__init__()
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.log = log
+        self.run = HistogramAccumulator(self.edges, log)
+        self._frames = _Window(self.edges, log, frames=max(int(frames), 1))
+        self._seconds = _Window(self.edges, log, seconds=seconds)
+
+    def add_frame(self, values, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        frame = HistogramAccumulator(self.edges, self.log).add(values)
+        self.run.merge(frame)
+        self._frames.push(timestamp, frame)
+        self._seconds.push(timestamp, frame)
+
+    def expire(self, now: float = None):
+        """
+        Drop the frames that left the time window even if no frame was added since.
+        """
+        self._seconds.expire(time.time() if now is None else now)
+
+    def view(self, name: str) -> HistogramAccumulator:
+        """
+        :param name: one of VIEWS. The live accumulator, copy it before handing it to another thread.
+        """
+        if name == "run":
+            return self.run
+        if name == "frames":
+            return self._frames.sum
+        if name == "seconds":
+            return self._seconds.sum
+        raise ValueError(f"Unknown histogram view {name}. Expected one of {VIEWS}")
+
+    def snapshot(self, scale=1.0) -> dict:
+        """
+        :return: {view: HistogramAccumulator copy}
+        """
+        return {name: self.view(name).copy(scale) for name in VIEWS}
+
+    def reset(self):
+        self.run.clear()
+        for window in (self._frames, self._seconds):
+            window.entries.clear()
+            window.sum.clear()
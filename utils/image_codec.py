@@ -0,0 +1,59 @@
+"""
+Container formats shared by the image encoders and the readers of stored images.
+raw: 20-byte header followed by the C-ordered pixels
+    magic b"RAW1", dtype str padded to 4 bytes (e.g. b"|u1\0"), height (uint32), width (uint32), channels (uint32)
+zstd: the raw container compressed with zstandard
+Decoding only needs numpy/OpenCV (and zstandard for zstd), so stored images can be read without TurboJPEG.
+"""
+import struct
+
+import cv2
+import numpy as np
+
+RAW_MAGIC = b"RAW1"
+RAW_HEADER = struct.Struct("<4s4sIII")
+ENCODED_FORMATS = ("jpeg", "png", "raw", "zstd")
+
+
+def pack_raw(image: np.ndarray) -> bytes:
+    if image.ndim not in (2, 3):
+        raise ValueError(f"Cannot pack an image with {image.ndim} dimensions")
+    height, width = image.shape[:2]
+    channels = image.shape[2] if image.ndim == 3 else 0
+    header = RAW_HEADER.pack(RAW_MAGIC, image.dtype.str.encode("ascii"), height, width, channels)
+    return b"".join([header, memoryview(np.ascontiguousarray(image)).cast("B")])
+
+
+def unpack_raw(buffer) -> np.ndarray:
+    """
+    :return: read-only view into buffer, no copy
+    """
+    magic, dtype, height, width, channels = RAW_HEADER.unpack_from(buffer, 0)
+    if magic != RAW_MAGIC:
+        raise ValueError("Not a raw image buffer")
+    shape = (height, width, channels) if channels else (height, width)
+    dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+    return np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=RAW_HEADER.size).reshape(shape)
+
+
+def zstd():
+    try:
+        import zstandard
+    except ImportError as ex:
+        raise ImportError("zstd image encoding requires the zstandard package") from ex
+    return zstandard
+
+
+def decode(buffer, format: str = None) -> np.ndarray:
+    """
+    Decode an encoded image of any of the ENCODED_FORMATS. Buffers without a format are JPEG.
+    """
+    if isinstance(format, bytes):
+        format = format.decode("ascii")
+    if format in (None, "jpeg", "png"):
+        return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if format == "raw":
+        return unpack_raw(buffer)
+    if format == "zstd":
+        return unpack_raw(zstd().ZstdDecompressor().decompress(buffer))
+    raise ValueError(f"Unknown image format {format}")
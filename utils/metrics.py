@@ -0,0 +1,259 @@
+"""
+Process-wide performance metrics.
+    Counter    monotonically increasing count (frames, drops)
+    Gauge      last value set, or a callback evaluated when read (queue depth, buffers in use)
+    Histogram  latency distribution over fixed logarithmic buckets from 1 us to 100 s
+Instruments are created on first use by name and are cheap enough to update per frame. Readers take snapshots and
+compare two of them (summarize) to get rates and the latency percentiles of the time in between.
+"""
+import bisect
+import math
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional, Sequence
+
+# 8 buckets per decade, 1 us .. 100 s, plus an overflow bucket
+BUCKETS_PER_DECADE = 8
+BUCKET_EDGES = [10 ** (-6 + i / BUCKETS_PER_DECADE) for i in range(8 * BUCKETS_PER_DECADE + 1)]
+
+
+class Counter(object):
+    def __init__(self, name):
+        super(Counter, self).__init__()
+        self.name = name
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+
+class Gauge(object):
+    def __init__(self, name, fn: Callable[[], float] = None):
+        super(Gauge, self).__init__()
+        self.name = name
+        self.fn = fn
+        self._value = None
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self._value
+
+
+class Histogram(object):
+    """
+    Durations in seconds. Values below the first edge fall in bucket 0, values above the last one in the overflow
+    bucket.
+    """
+
+    def __init__(self, name):
+        super(Histogram, self).__init__()
+        self.name = name
+        self.counts = [0] * (len(BUCKET_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        i = bisect.bisect_left(BUCKET_EDGES, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self):
+        """
+        Context manager recording the duration of its block.
+        """
+        return _Timer(self)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"counts": list(self.counts), "count": self.count, "total": self.total, "max": self.max}
+
+
+class _Timer(object):
+    def __init__(self, histogram: Histogram):
+        super(_Timer, self).__init__()
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+def percentile(counts: Sequence[int], q: float) -> Optional[float]:
+    """
+    Interpolate a percentile from bucket counts.
+    :param q: 0..1
+    :return: seconds, None if there are no samples
+    """
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(counts):
+        if c == 0:
+            continue
+        if seen + c >= rank:
+            if i == 0:
+                return BUCKET_EDGES[0]
+            if i == len(BUCKET_EDGES):
+                return BUCKET_EDGES[-1]
+            # log-linear inside the bucket
+            low, high = BUCKET_EDGES[i - 1], BUCKET_EDGES[i]
+            fraction = (rank - seen) / c
+            return low * math.pow(high / low, fraction)
+        seen += c
+    return BUCKET_EDGES[-1]
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        super(MetricsRegistry, self).__init__()
+        self.counters: Dict[str, Counter] = {}
+        self.gauges: Dict[str, Gauge] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def counter(self, name) -> Counter:
+        c = self.counters.get(name)
+        if c is None:
+            with self.lock:
+                c = self.counters.setdefault(name, Counter(name))
+        return c
+
+    def gauge(self, name, fn: Callable[[], float] = None) -> Gauge:
+        """
+        :param fn: replaces the callback of an existing gauge
+        """
+        with self.lock:
+            g = self.gauges.setdefault(name, Gauge(name))
+            if fn is not None:
+                g.fn = fn
+        return g
+
+    def remove_gauge(self, name):
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def histogram(self, name) -> Histogram:
+        h = self.histograms.get(name)
+        if h is None:
+            with self.lock:
+                h = self.histograms.setdefault(name, Histogram(name))
+        return h
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counters, gauges, histograms = list(self.counters.values()), list(self.gauges.values()), \
+                                           list(self.histograms.values())
+        return {
+            "time": time.monotonic(),
+            "counters": {c.name: c.value for c in counters},
+            "gauges": {g.name: g.value for g in gauges},
+            "histograms": {h.name: h.snapshot() for h in histograms},
+        }
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+def summarize(previous: Optional[dict], current: dict, quantiles=(0.5, 0.9, 0.99)) -> dict:
+    """
+    Compare two snapshots.
+    :param previous: None to summarize everything since start
+    :return: {
+        "interval": seconds between the snapshots,
+        "counters": {name: {"total", "rate"}},
+        "gauges": {name: value},
+        "histograms": {name: {"count", "rate", "mean", "max", "p50", "p90", ...}},
+    }
+    max is the maximum since start, the other latency values cover the interval.
+    """
+    previous = previous or {"time": None, "counters": {}, "histograms": {}}
+    interval = current["time"] - previous["time"] if previous["time"] is not None else None
+
+    def rate(delta):
+        return delta / interval if interval else None
+
+    counters = {}
+    for name, value in current["counters"].items():
+        counters[name] = {"total": value, "rate": rate(value - previous["counters"].get(name, 0))}
+
+    histograms = {}
+    for name, h in current["histograms"].items():
+        before = previous["histograms"].get(name)
+        if before is None:
+            counts, count, total = h["counts"], h["count"], h["total"]
+        else:
+            counts = [a - b for a, b in zip(h["counts"], before["counts"])]
+            count, total = h["count"] - before["count"], h["total"] - before["total"]
+        entry = {
+            "count": count,
+            "rate": rate(count),
+            "mean": total / count if count else None,
+            "max": h["max"],
+        }
+        for q in quantiles:
+            p = percentile(counts, q)
+            # the interpolation can overshoot inside the top bucket
+            entry[f"p{round(q * 100):d}"] = None if p is None else min(p, h["max"])
+        histograms[name] = entry
+
+    return {"interval": interval, "counters": counters, "gauges": dict(current["gauges"]), "histograms": histograms}
+
+
+registry = MetricsRegistry()
+
+
+def counter(name) -> Counter:
+    return registry.counter(name)
+
+
+def gauge(name, fn: Callable[[], float] = None) -> Gauge:
+    return registry.gauge(name, fn)
+
+
+def histogram(name) -> Histogram:
+    return registry.histogram(name)
+
+
+def timed(name):
+    """
+    Decorator recording the duration of every call in the histogram name.
+    """
+
+    def decorator(fn):
+        h = registry.histogram(name)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with h.time():
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,106 @@
+"""
+Streaming quantiles in constant memory (merging t-digest).
+Values are buffered, then merged with the centroids: sorted together and grouped so that no centroid spans more than
+one unit of the k1 scale function, which keeps at most about compression / 2 centroids, small ones near the tails
+where the accuracy matters for D10/D90. Count, mean, min and max are exact.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+class TDigest(object):
+    def __init__(self, compression=200, buffer_size=500):
+        super(TDigest, self).__init__()
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def add(self, values) -> "TDigest":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return self
+        self.count += values.size
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += values.size
+        if self._buffered >= self.buffer_size:
+            self._compress()
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        other._compress()
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other.means, other.weights)
+        return self
+
+    def _compress(self, means: np.ndarray = None, weights: np.ndarray = None):
+        parts_m, parts_w = [self.means], [self.weights]
+        if means is not None:
+            parts_m.append(means)
+            parts_w.append(weights)
+        if self._buffered:
+            buffered = np.concatenate(self._buffer)
+            parts_m.append(buffered)
+            parts_w.append(np.ones(buffered.size))
+            self._buffer = []
+            self._buffered = 0
+        if len(parts_m) == 1:
+            return
+        m = np.concatenate(parts_m)
+        w = np.concatenate(parts_w)
+        order = np.argsort(m, kind="stable")
+        m, w = m[order], w[order]
+
+        # k1 scale of the quantile where each item starts, items starting in the same unit share a centroid
+        total = w.sum()
+        q = (np.cumsum(w) - w) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        self.weights = np.add.reduceat(w, starts)
+        self.means = np.add.reduceat(m * w, starts) / self.weights
+
+    def quantiles(self, qs: Iterable[float]) -> np.ndarray:
+        """
+        :param qs: quantiles in [0, 1]
+        :return: estimates, nan while empty
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        self._compress()
+        # each centroid sits at the middle of its weight, min and max at the ends
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0.0, centers, self.count]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(qs * self.count, positions, values)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def __len__(self):
+        """
+        Number of centroids, bounded by about compression / 2 whatever the count
+        """
+        self._compress()
+        return self.means.size
@@ -0,0 +1,235 @@
+"""
+Geometry straight from COCO run-length encoded masks, without materializing the full frame.
+The runs follow the pycocotools convention: column-major (Fortran) order, alternating background and foreground
+counts, starting with background.
+"""
+import math
+from typing import Tuple, Union
+
+import numpy as np
+
+
+def decode_counts(counts: Union[bytes, str, list]) -> np.ndarray:
+    """
+    Decode pycocotools counts (compressed string or plain list) into run lengths.
+    """
+    if isinstance(counts, (list, tuple, np.ndarray)):
+        return np.asarray(counts, dtype=np.int64)
+    if isinstance(counts, str):
+        counts = counts.encode("ascii")
+    if len(counts) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # every character carries 5 bits, 0x20 marks continuation, 0x10 in the last character is the sign
+    c = np.frombuffer(counts, dtype=np.uint8).astype(np.int64) - 48
+    last = (c & 0x20) == 0
+    group = np.concatenate([[0], np.cumsum(last)[:-1]])
+    first = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    k = np.arange(c.size) - first[group]
+
+    values = np.add.reduceat((c & 0x1f) << (5 * k), first)
+    ends = np.flatnonzero(last)
+    negative = (c[ends] & 0x10) != 0
+    values[negative] -= np.left_shift(1, 5 * (k[ends[negative]] + 1))
+
+    # from the 4th value on, counts are stored as delta to the count two positions before
+    runs = values.copy()
+    runs[1::2] = np.cumsum(values[1::2])
+    runs[2::2] = np.cumsum(values[2::2])
+    return runs
+
+
+def segmented_cumsum(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Cumulative sum restarting at every segment.
+    :param lengths: size of each consecutive segment of values
+    """
+    total = np.cumsum(values)
+    before = np.concatenate([[0], total])[np.cumsum(lengths) - lengths]
+    return total - np.repeat(before, lengths)
+
+
+def decode_counts_many(counts_list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    decode_counts for many masks in one vectorized pass.
+    :return: (runs of all masks concatenated, number of runs of each mask)
+    """
+    encoded = [c.encode("ascii") if isinstance(c, str) else c for c in counts_list]
+    if not all(isinstance(c, (bytes, bytearray)) for c in encoded):
+        decoded = [decode_counts(c) for c in counts_list]
+        lengths = np.array([r.size for r in decoded], dtype=np.int64)
+        return (np.concatenate(decoded) if decoded else np.zeros(0, dtype=np.int64)), lengths
+
+    c = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.int64) - 48
+    if c.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(len(encoded), dtype=np.int64)
+    # same decoding as decode_counts; a value never spans two masks
+    last = (c & 0x20) == 0
+    group = np.concatenate([[0], np.cumsum(last)[:-1]])
+    first = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    k = np.arange(c.size) - first[group]
+
+    values = np.add.reduceat((c & 0x1f) << (5 * k), first)
+    ends = np.flatnonzero(last)
+    negative = (c[ends] & 0x10) != 0
+    values[negative] -= np.left_shift(1, 5 * (k[ends[negative]] + 1))
+
+    owner = np.searchsorted(np.cumsum([len(e) for e in encoded]), ends, side="right")
+    lengths = np.bincount(owner, minlength=len(encoded))
+    position = np.arange(values.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # undo the delta to the count two positions before, per mask and parity
+    runs = values.copy()
+    for selected in ((position % 2 == 1), (position >= 2) & (position % 2 == 0)):
+        segments = np.bincount(owner[selected], minlength=len(encoded))
+        runs[selected] = segmented_cumsum(values[selected], segments)
+    return runs, lengths
+
+
+def foreground_runs(runs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: (start, end) flat column-major indices of the foreground runs, end exclusive
+    """
+    ends = np.cumsum(runs)
+    starts = ends - runs
+    starts, ends = starts[1::2], ends[1::2]
+    nonempty = ends > starts
+    return starts[nonempty], ends[nonempty]
+
+
+def area(runs: np.ndarray) -> int:
+    return int(runs[1::2].sum())
+
+
+def bbox(runs: np.ndarray, height: int) -> Tuple[int, int, int, int]:
+    """
+    :return: inclusive (xlt, ylt, xrb, yrb) pixel bounding box, or None for an empty mask
+    """
+    starts, ends = foreground_runs(runs)
+    if starts.size == 0:
+        return None
+    last = ends - 1
+    crosses = (starts // height) != (last // height)
+    if np.any(crosses):
+        ylt, yrb = 0, height - 1
+    else:
+        ylt, yrb = int((starts % height).min()), int((last % height).max())
+    return int(starts[0] // height), ylt, int(last[-1] // height), yrb
+
+
+def _sum_col(n, height):
+    q, r = n // height, n % height
+    return height * q * (q - 1) // 2 + r * q
+
+
+def _sum_row(n, height):
+    q, r = n // height, n % height
+    return q * (height * (height - 1) // 2) + r * (r - 1) // 2
+
+
+def centroid(runs: np.ndarray, height: int) -> Tuple[float, float]:
+    """
+    :return: (x, y) mean pixel position, or None for an empty mask
+    """
+    starts, ends = foreground_runs(runs)
+    count = (ends - starts).sum()
+    if count == 0:
+        return None
+    sum_x = (_sum_col(ends, height) - _sum_col(starts, height)).sum()
+    sum_y = (_sum_row(ends, height) - _sum_row(starts, height)).sum()
+    return float(sum_x / count), float(sum_y / count)
+
+
+def bbox_slices(box, height, width) -> Tuple[slice, slice]:
+    """
+    Row and column slices covering an inclusive (xlt, ylt, xrb, yrb) bounding box, clipped to the frame.
+    """
+    xlt, ylt, xrb, yrb = box
+    x0 = min(max(int(math.floor(xlt)), 0), width)
+    y0 = min(max(int(math.floor(ylt)), 0), height)
+    x1 = min(max(int(math.ceil(xrb)) + 1, x0), width)
+    y1 = min(max(int(math.ceil(yrb)) + 1, y0), height)
+    return slice(y0, y1), slice(x0, x1)
+
+
+def decode_cropped(runs: np.ndarray, height: int, width: int, box) -> np.ndarray:
+    """
+    Decode only the part of the mask inside the bounding box.
+    :param box: inclusive (xlt, ylt, xrb, yrb)
+    :return: uint8 array of the box size
+    """
+    rows, cols = bbox_slices(box, height, width)
+    crop_height, crop_width = rows.stop - rows.start, cols.stop - cols.start
+    starts, ends = foreground_runs(runs)
+    starts = np.clip(starts, cols.start * height, cols.stop * height)
+    ends = np.clip(ends, cols.start * height, cols.stop * height)
+    keep = ends > starts
+    starts, last = starts[keep], ends[keep] - 1
+
+    # split the runs into one piece per column
+    first_col, last_col = starts // height, last // height
+    pieces = last_col - first_col + 1
+    run = np.repeat(np.arange(starts.size), pieces)
+    col = first_col[run] + np.arange(run.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    row_start = np.where(col == first_col[run], starts[run] % height, 0)
+    row_end = np.where(col == last_col[run], last[run] % height + 1, height)
+
+    row_start = np.clip(row_start, rows.start, rows.stop) - rows.start
+    row_end = np.clip(row_end, rows.start, rows.stop) - rows.start
+    keep = row_end > row_start
+    col = col[keep] - cols.start
+
+    diff = np.zeros((crop_width, crop_height + 1), dtype=np.int32)
+    np.add.at(diff, (col, row_start[keep]), 1)
+    np.add.at(diff, (col, row_end[keep]), -1)
+    return np.ascontiguousarray(np.cumsum(diff[:, :-1], axis=1).astype(np.uint8).T)
+
+
+def encode_cropped(crop: np.ndarray, origin, height: int, width: int) -> np.ndarray:
+    """
+    Run lengths of a full-frame mask that is empty outside the crop, without materializing the frame.
+    :param crop: binary mask
+    :param origin: (x, y) of the top left pixel of the crop in the frame. The crop must lie inside the frame.
+    :return: runs, starting with background
+    """
+    x0, y0 = origin
+    crop_height, crop_width = crop.shape
+    # full-height columns under the crop
+    strip = np.zeros((height, crop_width), dtype=bool)
+    strip[y0:y0 + crop_height] = crop.astype(bool)
+    flat = strip.ravel(order="F")
+    bounds = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1, [flat.size]])
+    runs = np.diff(bounds)
+    if flat.size and flat[0]:
+        runs = np.concatenate([[0], runs])
+    if runs.size == 0:
+        runs = np.zeros(1, dtype=np.int64)
+    runs = runs.astype(np.int64)
+
+    runs[0] += x0 * height
+    after = (width - x0 - crop_width) * height
+    if runs.size % 2 == 1:
+        runs[-1] += after
+    elif after:
+        runs = np.concatenate([runs, [after]])
+    return runs
+
+
+def encode_counts(runs) -> bytes:
+    """
+    Compress run lengths into the pycocotools counts string (inverse of decode_counts).
+    """
+    runs = [int(r) for r in runs]
+    out = bytearray()
+    for i, x in enumerate(runs):
+        if i > 2:
+            x -= runs[i - 2]
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            out.append(c + 48)
+    return bytes(out)
@@ -0,0 +1,168 @@
+"""
+Bounded hand-over between a Subjects channel and one consumer.
+Each subscriber gets its own StageQueue with a capacity and an overflow policy:
+    block        the producer waits until the consumer made room
+    drop_oldest  the oldest queued item is discarded
+    drop_newest  the incoming item is discarded
+    keep_latest  only the newest item is kept (capacity 1)
+The queue is drained on the consumer's scheduler, one drain at a time, so items stay in order. Live queues are
+listed by stage_queues() with their depth and drop counters.
+"""
+import threading
+from collections import deque
+from typing import List
+
+import rx
+from rx.disposable import CompositeDisposable, Disposable
+from rx.scheduler import EventLoopScheduler
+
+QUEUE_POLICIES = ("block", "drop_oldest", "drop_newest", "keep_latest")
+
+_EMPTY = object()
+_NEXT, _ERROR, _COMPLETED = range(3)
+
+
+class StageQueue(object):
+    def __init__(self, name, capacity=64, policy="drop_oldest"):
+        super(StageQueue, self).__init__()
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy {policy}. Expected one of {QUEUE_POLICIES}")
+        self.name = name
+        self.policy = policy
+        self.capacity = 1 if policy == "keep_latest" else max(int(capacity), 1)
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.draining = False
+        self.closed = False
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.peak_depth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, control=False) -> bool:
+        """
+        :param control: never dropped nor blocked (completion and errors)
+        :return: True if the consumer has to be woken up
+        """
+        with self.condition:
+            if self.closed:
+                return False
+            if not control and len(self.items) >= self.capacity:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                elif self.policy == "block":
+                    self.blocked += 1
+                    self.condition.wait_for(lambda: len(self.items) < self.capacity or self.closed)
+                    if self.closed:
+                        return False
+                else:
+                    self.items.popleft()
+                    self.dropped += 1
+            self.items.append(item)
+            self.enqueued += 1
+            self.peak_depth = max(self.peak_depth, len(self.items))
+            if self.draining:
+                return False
+            self.draining = True
+            return True
+
+    def pop(self):
+        """
+        :return: the next item, or _EMPTY after which the next put wakes the consumer again
+        """
+        with self.condition:
+            if not self.items or self.closed:
+                self.draining = False
+                return _EMPTY
+            item = self.items.popleft()
+            self.delivered += 1
+            self.condition.notify()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.items.clear()
+            self.condition.notify_all()
+
+    def metrics(self) -> dict:
+        with self.condition:
+            return {
+                "depth": len(self.items),
+                "capacity": self.capacity,
+                "policy": self.policy,
+                "enqueued": self.enqueued,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "blocked": self.blocked,
+                "peak_depth": self.peak_depth,
+            }
+
+
+_queues: List[StageQueue] = []
+_queues_lock = threading.Lock()
+
+
+def stage_queues() -> List[StageQueue]:
+    """
+    :return: the queues of all live subscriptions
+    """
+    with _queues_lock:
+        return list(_queues)
+
+
+def stage_queue(name, capacity=64, policy="drop_oldest", scheduler=None):
+    """
+    Operator replacing observe_on(scheduler) with a bounded, instrumented queue.
+    :param name: shown in the metrics
+    :param scheduler: where the consumer runs. A dedicated thread if None.
+    """
+
+    def _stage_queue(source: rx.Observable) -> rx.Observable:
+        def subscribe(observer, subscribe_scheduler=None):
+            queue = StageQueue(name, capacity, policy)
+            consumer_scheduler = scheduler or EventLoopScheduler(exit_if_empty=True)
+
+            def drain(*_):
+                while True:
+                    item = queue.pop()
+                    if item is _EMPTY:
+                        return
+                    kind, value = item
+                    if kind == _NEXT:
+                        observer.on_next(value)
+                    elif kind == _ERROR:
+                        observer.on_error(value)
+                    else:
+                        observer.on_completed()
+
+            def enqueue(item, control=False):
+                if queue.put(item, control):
+                    consumer_scheduler.schedule(drain)
+
+            with _queues_lock:
+                _queues.append(queue)
+
+            def dispose():
+                queue.close()
+                with _queues_lock:
+                    if queue in _queues:
+                        _queues.remove(queue)
+
+            subscription = source.subscribe_(
+                lambda x: enqueue((_NEXT, x)),
+                lambda ex: enqueue((_ERROR, ex), True),
+                lambda: enqueue((_COMPLETED, None), True),
+                subscribe_scheduler,
+            )
+            return CompositeDisposable(subscription, Disposable(dispose))
+
+        return rx.create(subscribe)
+
+    return _stage_queue
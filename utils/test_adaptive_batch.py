@@ -0,0 +1,53 @@
+import time
+from unittest import TestCase
+
+from rx import subject
+
+from data_class.inference_stats import InferenceStats
+from utils.adaptive_batch import BatchSizeController, adaptive_buffer
+
+
+class TestBatchSizeController(TestCase):
+    def test_grows_below_target(self):
+        controller = BatchSizeController(initial=2, min_size=1, max_size=4, target_latency=1.0)
+        for _ in range(10):
+            controller.update(InferenceStats(2, 0.1))
+        self.assertEqual(controller.batch_size, 4)
+
+    def test_shrinks_above_target(self):
+        controller = BatchSizeController(initial=16, min_size=2, max_size=32, target_latency=0.5, smoothing=1.0)
+        self.assertEqual(controller.update(InferenceStats(16, 1.0)), 8)
+        for _ in range(10):
+            controller.update(InferenceStats(8, 1.0))
+        self.assertEqual(controller.batch_size, 2)
+
+    def test_holds_near_target(self):
+        controller = BatchSizeController(initial=6, target_latency=0.5)
+        controller.update(InferenceStats(6, 0.45))
+        self.assertEqual(controller.batch_size, 6)
+
+
+class TestAdaptiveBuffer(TestCase):
+    def test_batch_size_changes(self):
+        size = 2
+        source = subject.Subject()
+        batches = []
+        source.pipe(adaptive_buffer(lambda: size)).subscribe(batches.append)
+        for i in range(4):
+            source.on_next(i)
+        size = 3
+        for i in range(4, 8):
+            source.on_next(i)
+        source.on_completed()
+        self.assertEqual(batches, [[0, 1], [2, 3], [4, 5, 6], [7]])
+
+    def test_flush_after_max_wait(self):
+        source = subject.Subject()
+        batches = []
+        source.pipe(adaptive_buffer(lambda: 10, max_wait=0.05)).subscribe(batches.append)
+        source.on_next(0)
+        source.on_next(1)
+        time.sleep(0.2)
+        source.on_next(2)
+        time.sleep(0.2)
+        self.assertEqual(batches, [[0, 1], [2]])
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+from utils.frame_pacing import FrameDecimator, FrameTiming
+
+
+class TestFrameTiming(TestCase):
+    def test_dropped_frames_from_gaps(self):
+        timing = FrameTiming(period=0.1)
+        missing = [timing.update(t, t + 0.01) for t in (0.0, 0.1, 0.2, 0.5, 0.6, 0.8)]
+        self.assertEqual(missing, [0, 0, 0, 2, 0, 1])
+        self.assertEqual(timing.metrics()["dropped"], 3)
+
+    def test_estimated_period(self):
+        timing = FrameTiming()
+        for i in range(20):
+            timing.update(i * 0.02, i * 0.02)
+        timing.update(20 * 0.02 + 0.04, 0.44)
+        self.assertEqual(timing.dropped, 2)
+        self.assertAlmostEqual(timing.metrics()["period"], 0.02)
+
+    def test_late_and_out_of_order(self):
+        timing = FrameTiming(period=0.1, late_threshold=0.05)
+        timing.update(0.0, 10.0)
+        timing.update(0.1, 10.2)
+        timing.update(0.05, 10.3)
+        metrics = timing.metrics()
+        self.assertEqual(metrics["late"], 2)
+        self.assertEqual(metrics["out_of_order"], 1)
+
+    def test_clock_drift(self):
+        # the host clock runs 100 ppm fast: after an hour frames arrive 0.36 s later than the first one did
+        timing = FrameTiming(period=0.1, late_threshold=0.05, baseline_window=10.0)
+        for i in range(36000):
+            t = i * 0.1
+            timing.update(t, t * 1.0001 + 0.01)
+        self.assertEqual(timing.late, 0)
+        timing.update(3600.0, 3600.0 * 1.0001 + 0.1)
+        self.assertEqual(timing.late, 1)
+        # bounded by the frames of one window
+        self.assertLessEqual(len(timing.min_delays), 101)
+
+
+class TestFrameDecimator(TestCase):
+    def test_none(self):
+        decimator = FrameDecimator("none")
+        self.assertTrue(all(decimator.select(True) for _ in range(5)))
+
+    def test_every_nth_under_back_pressure(self):
+        decimator = FrameDecimator("every_nth", 3)
+        self.assertEqual([decimator.select(True) for _ in range(6)], [False, False, True, False, False, True])
+        self.assertTrue(decimator.select(False))
+        self.assertEqual(decimator.skipped, 4)
+
+    def test_latest(self):
+        decimator = FrameDecimator("latest")
+        self.assertEqual([decimator.select(b) for b in (False, True, True, False)], [True, False, False, True])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            FrameDecimator("random")
@@ -0,0 +1,60 @@
+import gc
+from unittest import TestCase
+
+import numpy as np
+
+from utils.frame_pool import FramePool
+
+
+class TestFramePool(TestCase):
+    def test_reuse_after_release(self):
+        pool = FramePool(capacity=2)
+        frame = pool.acquire((4, 6))
+        frame[:] = 7
+        address = frame.__array_interface__["data"][0]
+        del frame
+        gc.collect()
+
+        again = pool.acquire((4, 6))
+        self.assertEqual(again.__array_interface__["data"][0], address)
+        self.assertEqual(pool.metrics()["reused"], 1)
+        self.assertEqual(pool.metrics()["allocated"], 1)
+
+    def test_derived_views_keep_frame(self):
+        pool = FramePool(capacity=1)
+        frame = pool.copy(np.arange(12, dtype=np.uint16).reshape(3, 4))
+        view = frame[1:, :, np.newaxis]
+        del frame
+        gc.collect()
+        self.assertEqual(pool.metrics()["in_use"], 1)
+        np.testing.assert_array_equal(view[:, :, 0], np.arange(4, 12, dtype=np.uint16).reshape(2, 4))
+        del view
+        gc.collect()
+        self.assertEqual(pool.metrics()["in_use"], 0)
+
+    def test_exhaustion(self):
+        pool = FramePool(capacity=2)
+        frames = [pool.acquire((8, 8)) for _ in range(3)]
+        metrics = pool.metrics()
+        self.assertEqual(metrics["exhausted"], 1)
+        self.assertEqual(metrics["in_use"], 2)
+        self.assertEqual(metrics["peak_in_use"], 2)
+        self.assertEqual(frames[2].shape, (8, 8))
+
+    def test_hold(self):
+        pool = FramePool()
+        released = []
+        source = np.arange(16, dtype=np.uint8).reshape(4, 4)
+        frame = pool.hold(source, lambda: released.append(True))
+        self.assertTrue(np.shares_memory(frame, source))
+        self.assertEqual(pool.metrics()["held"], 1)
+        del frame
+        gc.collect()
+        self.assertEqual(released, [True])
+        self.assertEqual(pool.metrics()["held"], 0)
+
+    def test_hold_read_only(self):
+        source = np.zeros((2, 2), dtype=np.uint8)
+        source.flags.writeable = False
+        with self.assertRaises(TypeError):
+            FramePool().hold(source, lambda: None)
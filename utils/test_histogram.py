@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+import numpy as np
+
+from utils.histogram import HistogramAccumulator, SlidingHistogram, make_edges
+
+
+class TestHistogram(TestCase):
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        values = rng.lognormal(3, 1, 10000)
+        for scale in ("linear", "log"):
+            edges = make_edges(scale, 1, 1000, 40)
+            h = HistogramAccumulator(edges)
+            for chunk in np.array_split(values, 7):
+                h.add(chunk)
+            np.testing.assert_array_equal(h.bin_counts, np.histogram(values, edges)[0])
+            self.assertEqual(h.count, values.size)
+            self.assertEqual(h.counts[0], (values < 1).sum())
+            self.assertEqual(h.counts[-1], (values > 1000).sum())
+            self.assertAlmostEqual(h.mean, values.mean())
+
+    def test_merge_subtract(self):
+        edges = make_edges("linear", 0, 10, 10)
+        a = HistogramAccumulator(edges).add([1, 2, 3])
+        b = HistogramAccumulator(edges).add([3, 4, 10, 11])
+        merged = a.copy().merge(b)
+        np.testing.assert_array_equal(merged.counts, HistogramAccumulator(edges).add([1, 2, 3, 3, 4, 10, 11]).counts)
+        np.testing.assert_array_equal(merged.subtract(b).counts, a.counts)
+        with self.assertRaises(ValueError):
+            a.merge(HistogramAccumulator(make_edges("linear", 0, 10, 5)))
+        with self.assertRaises(ValueError):
+            make_edges("log", 0, 10, 5)
+
+    def test_scaled_copy(self):
+        h = HistogramAccumulator(make_edges("linear", 0, 10, 10)).add([1, 2])
+        scaled = h.copy(0.5)
+        np.testing.assert_allclose(scaled.edges, np.linspace(0, 5, 11))
+        np.testing.assert_array_equal(scaled.counts, h.counts)
+        self.assertEqual(scaled.mean, 0.75)
+
+    def test_sliding_windows(self):
+        h = SlidingHistogram(make_edges("linear", 0, 100, 10), frames=3, seconds=10.0)
+        for i in range(20):
+            h.add_frame([i], timestamp=float(i))
+
+        self.assertEqual(h.view("run").count, 20)
+        self.assertEqual(h.view("frames").count, 3)
+        self.assertEqual(h.view("frames").mean, 18)
+        # frames from 9 to 19 seconds
+        self.assertEqual(h.view("seconds").count, 11)
+        h.expire(now=25.0)
+        self.assertEqual(h.view("seconds").count, 5)
+        h.expire(now=100.0)
+        self.assertEqual(h.view("seconds").count, 0)
+        self.assertEqual(h.view("seconds").counts.sum(), 0)
+
+        snapshot = h.snapshot()
+        h.add_frame([1, 2, 3], timestamp=100.0)
+        self.assertEqual(snapshot["run"].count, 20)
+        h.reset()
+        self.assertEqual(sum(v.count for v in h.snapshot().values()), 0)
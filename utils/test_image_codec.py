@@ -0,0 +1,45 @@
+from unittest import TestCase, skipUnless
+
+import cv2
+import numpy as np
+
+from utils import image_codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class TestImageCodec(TestCase):
+    def setUp(self) -> None:
+        self.mono = np.random.randint(0, 255, (48, 64), dtype=np.uint8)
+        self.color = np.random.randint(0, 255, (48, 64, 3), dtype=np.uint8)
+
+    def test_raw_round_trip(self):
+        for image in (self.mono, self.color, self.mono.astype(np.uint16) * 200, self.color[:, ::2]):
+            decoded = image_codec.decode(image_codec.pack_raw(image), "raw")
+            np.testing.assert_array_equal(decoded, image)
+            self.assertEqual(decoded.dtype, image.dtype)
+
+    def test_raw_wide_frame(self):
+        # line scan frames are wider than 65535 pixels
+        image = np.arange(3 * 70000, dtype=np.uint8).reshape(3, 70000)
+        np.testing.assert_array_equal(image_codec.decode(image_codec.pack_raw(image), "raw"), image)
+
+    def test_raw_rejects_other_buffers(self):
+        with self.assertRaises(ValueError):
+            image_codec.unpack_raw(cv2.imencode(".png", self.mono)[1].tobytes())
+
+    def test_png_is_lossless(self):
+        buffer = cv2.imencode(".png", self.mono)[1].tobytes()
+        np.testing.assert_array_equal(image_codec.decode(buffer, b"png"), self.mono)
+
+    def test_missing_format_is_jpeg(self):
+        buffer = cv2.imencode(".jpg", self.mono)[1].tobytes()
+        self.assertEqual(image_codec.decode(buffer).shape, self.mono.shape)
+
+    @skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        buffer = zstandard.ZstdCompressor().compress(image_codec.pack_raw(self.mono))
+        np.testing.assert_array_equal(image_codec.decode(buffer, "zstd"), self.mono)
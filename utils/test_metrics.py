@@ -0,0 +1,87 @@
+import threading
+from unittest import TestCase
+
+from utils.metrics import MetricsRegistry, percentile, summarize, BUCKET_EDGES
+
+
+class TestMetrics(TestCase):
+    def test_counter_threads(self):
+        registry = MetricsRegistry()
+        c = registry.counter("frames")
+
+        def work():
+            for _ in range(1000):
+                c.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertIs(registry.counter("frames"), c)
+        self.assertEqual(c.value, 4000)
+
+    def test_gauge_callback(self):
+        registry = MetricsRegistry()
+        registry.gauge("set").set(3)
+        registry.gauge("fn", lambda: 7)
+        registry.gauge("broken", lambda: 1 / 0)
+        self.assertEqual(registry.snapshot()["gauges"], {"set": 3, "fn": 7, "broken": None})
+
+    def test_percentile(self):
+        registry = MetricsRegistry()
+        h = registry.histogram("latency")
+        for _ in range(90):
+            h.record(0.001)
+        for _ in range(10):
+            h.record(0.1)
+        counts = h.snapshot()["counts"]
+        # within one bucket (8 per decade, ~33% wide)
+        self.assertAlmostEqual(percentile(counts, 0.5), 0.001, delta=0.00034)
+        self.assertAlmostEqual(percentile(counts, 0.99), 0.1, delta=0.034)
+        self.assertIsNone(percentile([0] * len(counts), 0.5))
+
+    def test_out_of_range(self):
+        registry = MetricsRegistry()
+        h = registry.histogram("latency")
+        h.record(0)
+        h.record(1e6)
+        counts = h.snapshot()["counts"]
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(counts[-1], 1)
+        self.assertEqual(percentile(counts, 1.0), BUCKET_EDGES[-1])
+
+    def test_summarize_interval(self):
+        registry = MetricsRegistry()
+        c = registry.counter("frames")
+        h = registry.histogram("encode")
+        c.inc(10)
+        for _ in range(10):
+            h.record(1.0)
+        first = registry.snapshot()
+        c.inc(5)
+        for _ in range(5):
+            h.record(0.01)
+        second = registry.snapshot()
+        second["time"] = first["time"] + 2.0
+
+        summary = summarize(first, second)
+        self.assertEqual(summary["counters"]["frames"], {"total": 15, "rate": 2.5})
+        encode = summary["histograms"]["encode"]
+        self.assertEqual(encode["count"], 5)
+        self.assertEqual(encode["rate"], 2.5)
+        self.assertAlmostEqual(encode["mean"], 0.01)
+        self.assertLess(encode["p99"], 0.02)
+        self.assertEqual(encode["max"], 1.0)
+
+        everything = summarize(None, second)
+        self.assertIsNone(everything["counters"]["frames"]["rate"])
+        self.assertEqual(everything["histograms"]["encode"]["count"], 15)
+
+    def test_timer(self):
+        registry = MetricsRegistry()
+        h = registry.histogram("block")
+        with h.time():
+            pass
+        self.assertEqual(h.count, 1)
+        self.assertLess(h.max, 0.1)
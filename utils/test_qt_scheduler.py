@@ -0,0 +1,65 @@
+import threading
+import time
+from unittest import TestCase
+
+from PyQt5 import QtCore
+
+from utils import QtScheduler, metrics
+from utils.QtScheduler import CoalescingQtScheduler
+
+
+class TestCoalescingQtScheduler(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # the Rx handler lives as long as the process, so must the application
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def setUp(self) -> None:
+        self.scheduler = CoalescingQtScheduler(QtCore)
+        self.actions = QtScheduler.glob_coalesced_actions
+        self.budget = self.actions.budget
+
+    def tearDown(self) -> None:
+        self.actions.budget = self.budget
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            self.app.processEvents()
+
+    def test_one_wakeup_per_burst(self):
+        wakeups = metrics.counter("qt_scheduler.wakeups").value
+        done = []
+
+        def schedule_all():
+            for i in range(1000):
+                self.scheduler.schedule(lambda _, state: done.append(state), i)
+
+        producer = threading.Thread(target=schedule_all)
+        producer.start()
+        producer.join()
+        self.process_until(lambda: len(done) == 1000)
+
+        self.assertEqual(done, list(range(1000)))
+        self.assertLess(metrics.counter("qt_scheduler.wakeups").value - wakeups, 10)
+        self.assertEqual(len(self.actions.actions), 0)
+
+    def test_budget_yields_to_event_loop(self):
+        self.actions.budget = 0.005
+        wakeups = metrics.counter("qt_scheduler.wakeups").value
+        done = []
+        for i in range(10):
+            self.scheduler.schedule(lambda _, state: (time.sleep(0.002), done.append(state)), i)
+        self.process_until(lambda: len(done) == 10)
+
+        self.assertEqual(done, list(range(10)))
+        self.assertGreaterEqual(metrics.counter("qt_scheduler.wakeups").value - wakeups, 3)
+
+    def test_disposed_and_failing_actions(self):
+        done = []
+        self.scheduler.schedule(lambda *_: 1 / 0)
+        self.scheduler.schedule(lambda *_: done.append("disposed")).dispose()
+        self.scheduler.schedule(lambda *_: done.append("run"))
+        self.process_until(lambda: done)
+
+        self.assertEqual(done, ["run"])
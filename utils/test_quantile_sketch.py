@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import numpy as np
+
+from utils.quantile_sketch import TDigest
+
+
+class TestTDigest(TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.chunks = [rng.lognormal(5, 1, rng.integers(0, 300)) for _ in range(1000)]
+        self.values = np.concatenate(self.chunks)
+
+    def assert_ranks_close(self, digest, qs=(0.01, 0.1, 0.5, 0.9, 0.99), tolerance=0.005):
+        # compare the rank of the estimates, the values themselves are spread wide in the tails
+        ranks = np.searchsorted(np.sort(self.values), digest.quantiles(qs)) / self.values.size
+        np.testing.assert_allclose(ranks, qs, atol=tolerance)
+
+    def test_streaming(self):
+        digest = TDigest()
+        for chunk in self.chunks:
+            digest.add(chunk)
+        self.assert_ranks_close(digest)
+        self.assertEqual(digest.count, self.values.size)
+        self.assertAlmostEqual(digest.mean, self.values.mean())
+        self.assertEqual(digest.quantile(0), self.values.min())
+        self.assertEqual(digest.quantile(1), self.values.max())
+        self.assertLessEqual(len(digest), digest.compression // 2 + 1)
+
+    def test_merge(self):
+        first, second = TDigest(), TDigest()
+        for i, chunk in enumerate(self.chunks):
+            (first if i % 2 else second).add(chunk)
+        first.merge(second).merge(TDigest())
+        self.assert_ranks_close(first)
+        self.assertEqual(first.count, self.values.size)
+
+    def test_empty(self):
+        digest = TDigest().add([]).add([np.nan])
+        self.assertEqual(digest.count, 0)
+        self.assertIsNone(digest.mean)
+        self.assertTrue(np.isnan(digest.quantile(0.5)))
+        self.assertEqual(TDigest().add([3.0]).quantile(0.5), 3.0)
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from pycocotools import mask as mask_util
+
+from utils import rle
+
+
+class TestRLE(TestCase):
+    def masks(self):
+        rng = np.random.default_rng(0)
+        for i in range(200):
+            height, width = rng.integers(1, 60, 2)
+            mask = np.zeros((height, width), dtype=np.uint8)
+            for _ in range(rng.integers(0, 4)):
+                center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+                axes = (int(rng.integers(0, 30)), int(rng.integers(0, 30)))
+                cv2.ellipse(mask, center, axes, 0, 0, 360, 1, -1)
+            if i % 7 == 0:
+                mask = (rng.random((height, width)) > 0.5).astype(np.uint8)
+            yield mask, rle.decode_counts(mask_util.encode(np.asfortranarray(mask))["counts"])
+
+    def test_decode_counts(self):
+        for mask, runs in self.masks():
+            self.assertEqual(runs.sum(), mask.size)
+            self.assertEqual(rle.area(runs), mask.sum())
+        np.testing.assert_array_equal(rle.decode_counts([2, 3, 1]), [2, 3, 1])
+
+    def test_decode_counts_many(self):
+        masks = [np.asfortranarray(mask) for mask, _ in self.masks()]
+        counts = [mask_util.encode(mask)["counts"] for mask in masks]
+        expected = [rle.decode_counts(c) for c in counts]
+        runs, lengths = rle.decode_counts_many(counts)
+        np.testing.assert_array_equal(runs, np.concatenate(expected))
+        np.testing.assert_array_equal(lengths, [e.size for e in expected])
+
+        runs, lengths = rle.decode_counts_many([[2, 3, 1], counts[0]])
+        np.testing.assert_array_equal(runs, np.concatenate([[2, 3, 1], expected[0]]))
+
+    def test_bbox_and_centroid(self):
+        for mask, runs in self.masks():
+            height = mask.shape[0]
+            ys, xs = np.nonzero(mask)
+            if ys.size == 0:
+                self.assertIsNone(rle.bbox(runs, height))
+                self.assertIsNone(rle.centroid(runs, height))
+                continue
+            self.assertEqual(rle.bbox(runs, height), (xs.min(), ys.min(), xs.max(), ys.max()))
+            np.testing.assert_allclose(rle.centroid(runs, height), (xs.mean(), ys.mean()))
+
+    def test_decode_cropped(self):
+        rng = np.random.default_rng(1)
+        for mask, runs in self.masks():
+            height, width = mask.shape
+            x0, x1 = sorted(rng.integers(0, width, 2))
+            y0, y1 = sorted(rng.integers(0, height, 2))
+            for box in ((0, 0, width - 1, height - 1), (x0, y0, x1, y1)):
+                expected = mask[box[1]:box[3] + 1, box[0]:box[2] + 1]
+                np.testing.assert_array_equal(rle.decode_cropped(runs, height, width, box), expected)
+
+    def test_encode(self):
+        rng = np.random.default_rng(2)
+        for mask, runs in self.masks():
+            self.assertEqual(rle.encode_counts(runs), mask_util.encode(np.asfortranarray(mask))["counts"])
+
+            height, width = mask.shape
+            x0, x1 = sorted(rng.integers(0, width, 2))
+            y0, y1 = sorted(rng.integers(0, height, 2))
+            cropped = np.zeros_like(mask)
+            cropped[y0:y1 + 1, x0:x1 + 1] = mask[y0:y1 + 1, x0:x1 + 1]
+            np.testing.assert_array_equal(
+                rle.encode_cropped(mask[y0:y1 + 1, x0:x1 + 1], (x0, y0), height, width),
+                rle.decode_counts(mask_util.encode(np.asfortranarray(cropped))["counts"]))
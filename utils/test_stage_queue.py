@@ -0,0 +1,98 @@
+import threading
+import time
+from unittest import TestCase
+
+from rx import subject
+
+from utils.stage_queue import StageQueue, stage_queue, stage_queues, _EMPTY
+
+
+class TestStageQueue(TestCase):
+    def fill(self, queue, count):
+        for i in range(count):
+            queue.put(i)
+        ret = []
+        while True:
+            item = queue.pop()
+            if item is _EMPTY:
+                return ret
+            ret.append(item)
+
+    def test_drop_oldest(self):
+        queue = StageQueue("q", 3, "drop_oldest")
+        self.assertEqual(self.fill(queue, 5), [2, 3, 4])
+        self.assertEqual(queue.metrics()["dropped"], 2)
+
+    def test_drop_newest(self):
+        queue = StageQueue("q", 3, "drop_newest")
+        self.assertEqual(self.fill(queue, 5), [0, 1, 2])
+        self.assertEqual(queue.metrics()["dropped"], 2)
+
+    def test_keep_latest(self):
+        queue = StageQueue("q", 10, "keep_latest")
+        self.assertEqual(self.fill(queue, 5), [4])
+
+    def test_wakeup_once_per_drain(self):
+        queue = StageQueue("q", 10)
+        self.assertTrue(queue.put(0))
+        self.assertFalse(queue.put(1))
+        self.fill(queue, 0)
+        self.assertTrue(queue.put(2))
+
+    def test_block(self):
+        queue = StageQueue("q", 1, "block")
+        queue.put(0)
+        producer = threading.Thread(target=queue.put, args=(1,))
+        producer.start()
+        time.sleep(0.05)
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(queue.pop(), 0)
+        producer.join(1)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(queue.metrics()["blocked"], 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            StageQueue("q", 1, "lifo")
+
+
+class TestStageQueueOperator(TestCase):
+    def test_in_order_on_consumer_thread(self):
+        source = subject.Subject()
+        received = []
+        done = threading.Event()
+        threads = set()
+
+        def on_next(x):
+            threads.add(threading.current_thread())
+            received.append(x)
+
+        disposable = source.pipe(stage_queue("ordered", 1000)).subscribe(on_next, on_completed=done.set)
+        self.assertTrue(any(q.name == "ordered" for q in stage_queues()))
+        for i in range(500):
+            source.on_next(i)
+        source.on_completed()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(received, list(range(500)))
+        self.assertNotIn(threading.current_thread(), threads)
+
+        disposable.dispose()
+        self.assertFalse(any(q.name == "ordered" for q in stage_queues()))
+
+    def test_drop_with_slow_consumer(self):
+        source = subject.Subject()
+        received = []
+        gate = threading.Event()
+
+        def on_next(x):
+            gate.wait(1)
+            received.append(x)
+
+        source.pipe(stage_queue("slow", 2, "drop_oldest")).subscribe(on_next)
+        for i in range(10):
+            source.on_next(i)
+        queue = next(q for q in stage_queues() if q.name == "slow")
+        gate.set()
+        time.sleep(0.1)
+        self.assertEqual(received[-2:], [8, 9])
+        self.assertEqual(queue.dropped + len(received), 10)
@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+import numpy as np
+
+from utils.timeseries import TimeSeries, min_max_decimate
+
+
+class TestTimeSeries(TestCase):
+    def test_append_grows(self):
+        series = TimeSeries(initial_capacity=4)
+        for i in range(100):
+            series.append(i, i * 2)
+        x, y = series.data()
+        np.testing.assert_array_equal(x, np.arange(100))
+        np.testing.assert_array_equal(y, np.arange(100) * 2)
+
+    def test_max_points(self):
+        series = TimeSeries(max_points=10, initial_capacity=4)
+        for i in range(1000):
+            series.append(i, i)
+        x, _ = series.data()
+        np.testing.assert_array_equal(x, np.arange(990, 1000))
+        self.assertLessEqual(series._x.size, 20)
+
+    def test_retention(self):
+        series = TimeSeries(retention=5.0, initial_capacity=4)
+        for i in range(50):
+            series.append(i * 0.5, i)
+        x, _ = series.data()
+        self.assertEqual(x[0], 19.5)
+        self.assertEqual(x[-1], 24.5)
+        self.assertEqual(len(series), 11)
+
+
+class TestMinMaxDecimate(TestCase):
+    def test_small_series_untouched(self):
+        x = np.arange(10.0)
+        dx, dy = min_max_decimate(x, x, 20)
+        self.assertIs(dx, x)
+
+    def test_keeps_extremes_in_order(self):
+        x = np.arange(1003.0)
+        y = np.sin(x / 10)
+        y[500] = 100
+        y[777] = -100
+        y[1001] = 50
+        dx, dy = min_max_decimate(x, y, 100)
+        self.assertLessEqual(dx.size, 102)
+        self.assertTrue(np.all(np.diff(dx) >= 0))
+        for spike in (500, 777, 1001):
+            self.assertIn(spike, dx)
+        np.testing.assert_array_equal(dy, y[dx.astype(int)])
+
+    def test_ignores_nan(self):
+        y = np.array([np.nan, 1, 5, np.nan, -3, 2, 0, 0])
+        dx, dy = min_max_decimate(np.arange(8.0), y, 4)
+        self.assertIn(5, dy)
+        self.assertIn(-3, dy)
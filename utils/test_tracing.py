@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from utils import tracing
+from utils.tracing import Tracer
+
+
+class TestTracing(TestCase):
+    def test_disabled(self):
+        tracer = Tracer()
+        with tracer.span("a.jpg", tracing.ENCODE):
+            pass
+        tracer.instant("a.jpg", tracing.ACQUISITION)
+        self.assertEqual(tracer.spans(), [])
+
+    def test_spans_per_image(self):
+        tracer = Tracer(enabled=True)
+        tracer.instant("a.jpg", tracing.ACQUISITION, 10.0)
+        tracer.add("a.jpg", tracing.ENCODE, 10.0, 10.01)
+        tracer.add(["a.jpg", "b.jpg"], tracing.GRPC_RETURN, 10.01, 10.21)
+        tracer.instant("b.jpg", tracing.ACQUISITION, 10.005)
+
+        self.assertEqual([e[1] for e in tracer.spans("a.jpg")],
+                         [tracing.ACQUISITION, tracing.ENCODE, tracing.GRPC_RETURN])
+        latencies = sorted(tracer.frame_latencies())
+        self.assertAlmostEqual(latencies[0], 0.205)
+        self.assertAlmostEqual(latencies[1], 0.21)
+
+        summary = tracer.summary()
+        self.assertEqual(summary[tracing.GRPC_RETURN]["count"], 2)
+        self.assertAlmostEqual(summary[tracing.GRPC_RETURN]["p50"], 0.2)
+        self.assertEqual(summary["end to end"]["count"], 2)
+
+    def test_dropped_frames_have_no_latency(self):
+        # an image with only its acquisition event never went through the pipeline, its latency is not 0
+        tracer = Tracer(enabled=True)
+        tracer.instant("dropped.jpg", tracing.ACQUISITION, 1.0)
+        tracer.instant("kept.jpg", tracing.ACQUISITION, 1.0)
+        tracer.add("kept.jpg", tracing.SAVE, 1.1, 1.2)
+        latencies = tracer.frame_latencies()
+        self.assertEqual(len(latencies), 1)
+        self.assertAlmostEqual(latencies[0], 0.2)
+
+    def test_bounded(self):
+        tracer = Tracer(max_events=3, enabled=True)
+        for i in range(5):
+            tracer.instant(f"{i}.jpg", tracing.ACQUISITION, i)
+        self.assertEqual([e[0] for e in tracer.spans()], ["2.jpg", "3.jpg", "4.jpg"])
+        tracer.configure(max_events=10)
+        self.assertEqual(len(tracer.spans()), 3)
+
+    def test_chrome_trace(self):
+        tracer = Tracer(enabled=True)
+        with tracer.span("a.jpg", tracing.SAVE):
+            pass
+        tracer.add("b.jpg", tracing.ENCODE, 1.0, 1.5)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "trace.json")
+            tracer.export(path, "b.jpg")
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace["traceEvents"]
+        complete = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(len(complete), 1)
+        self.assertEqual(complete[0]["name"], tracing.ENCODE)
+        self.assertEqual(complete[0]["ts"], 1e6)
+        self.assertEqual(complete[0]["dur"], 0.5e6)
+        self.assertEqual(complete[0]["args"], {"image": "b.jpg"})
+        frame = [e for e in events if e.get("cat") == "frame"]
+        self.assertEqual([e["ph"] for e in frame], ["b", "e"])
+        self.assertEqual(frame[1]["ts"], 1.5e6)
+        self.assertTrue(any(e["name"] == "thread_name" for e in events))
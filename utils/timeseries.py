@@ -0,0 +1,94 @@
+"""
+Append-only time series with bounded memory for live plots.
+Points live in one preallocated buffer that doubles up to twice max_points; old points are dropped by the retention
+window or the point limit and the live part is moved back to the front only when it reached the end of the buffer and
+fills at most half of it, so appending is amortized O(1) and data() returns views without copying.
+"""
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+class TimeSeries(object):
+    def __init__(self, retention: float = None, max_points: int = 100000, initial_capacity: int = 1024):
+        """
+        :param retention: keep the points not older than this many seconds before the newest point. None to keep all.
+        :param max_points: drop the oldest points above this count
+        """
+        super(TimeSeries, self).__init__()
+        self.retention = retention
+        self.max_points = max(1, max_points)
+        capacity = min(max(initial_capacity, 2), 2 * self.max_points)
+        self._x = np.empty(capacity, dtype=np.float64)
+        self._y = np.empty(capacity, dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, time: float, value: float):
+        if self._end == self._x.size:
+            self._make_room()
+        self._x[self._end] = time
+        self._y[self._end] = value
+        self._end += 1
+
+        if len(self) > self.max_points:
+            self._start += 1
+        if self.retention is not None:
+            oldest = time - self.retention
+            while self._start < self._end and self._x[self._start] < oldest:
+                self._start += 1
+
+    def _make_room(self):
+        count = len(self)
+        if count <= self._x.size // 2:
+            # at least half of the buffer was dropped: compact. Always the case once the buffer is 2 * max_points.
+            self._x[:count] = self._x[self._start:self._end]
+            self._y[:count] = self._y[self._start:self._end]
+        else:
+            capacity = min(self._x.size * 2, 2 * self.max_points)
+            x, y = np.empty(capacity, dtype=np.float64), np.empty(capacity, dtype=np.float64)
+            x[:count] = self._x[self._start:self._end]
+            y[:count] = self._y[self._start:self._end]
+            self._x, self._y = x, y
+        self._start, self._end = 0, count
+
+    def data(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (times, values) views, valid until the next append
+        """
+        return self._x[self._start:self._end], self._y[self._start:self._end]
+
+    def decimated(self, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Min/max decimation: when there are more than max_points points, split them into max_points // 2 buckets and
+        keep the minimum and maximum of each, in time order. Spikes stay visible at any zoom level.
+        """
+        x, y = self.data()
+        return min_max_decimate(x, y, max_points)
+
+
+def _extremes(rows: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    :return: sorted (argmin, argmax) positions of every row, ignoring NaN
+    """
+    nan = np.isnan(rows)
+    lo = np.where(nan, np.inf, rows).argmin(axis=1)
+    hi = np.where(nan, -np.inf, rows).argmax(axis=1)
+    return (offsets[:, None] + np.sort(np.stack([lo, hi], axis=1), axis=1)).ravel()
+
+
+def min_max_decimate(x: np.ndarray, y: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    n = x.size
+    if n <= max(max_points, 2):
+        return x, y
+
+    size = math.ceil(n / max(max_points // 2, 1))
+    full = n // size
+    index = _extremes(y[:full * size].reshape(full, size), np.arange(full) * size)
+    if full * size < n:
+        index = np.concatenate([index, _extremes(y[full * size:][None, :], np.array([full * size]))])
+    return x[index], y[index]
@@ -0,0 +1,188 @@
+"""
+Per-frame trace spans keyed by image name.
+Every stage records (image name, stage, start, end) in wall-clock seconds into a bounded ring, so the latency of
+one frame can be followed from acquisition to display. The ring is exported in the Chrome trace event format,
+readable by chrome://tracing and https://ui.perfetto.dev:
+    - one complete event per span on the thread that did the work
+    - one async track per image spanning its first to its last event
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+ACQUISITION = "acquisition"
+ENCODE = "encode"
+GRPC_SEND = "grpc send"
+GRPC_RETURN = "grpc return"
+MASK_PROCESSING = "mask processing"
+SAVE = "save"
+DISPLAY = "display"
+
+
+class _Span(object):
+    def __init__(self, tracer, names, stage):
+        super(_Span, self).__init__()
+        self.tracer = tracer
+        self.names = names
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *_):
+        self.tracer.add(self.names, self.stage, self.start, time.time())
+        return False
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+class Tracer(object):
+    def __init__(self, max_events=500000, enabled=False):
+        super(Tracer, self).__init__()
+        self.enabled = enabled
+        # (image name, stage, start, end, thread id)
+        self.events = deque(maxlen=max_events)
+        self.thread_names: Dict[int, str] = {}
+
+    def configure(self, enabled=None, max_events=None):
+        if max_events is not None and max_events != self.events.maxlen:
+            self.events = deque(self.events, maxlen=max_events)
+        if enabled is not None:
+            self.enabled = enabled
+
+    def add(self, names, stage, start, end=None):
+        """
+        :param names: image name, or several images handled together (e.g. one inference batch)
+        :param end: None for an instant event
+        """
+        if not self.enabled:
+            return
+        if end is None:
+            end = start
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        if isinstance(names, str):
+            self.events.append((names, stage, start, end, tid))
+        else:
+            for name in names:
+                self.events.append((name, stage, start, end, tid))
+
+    def instant(self, names, stage, timestamp=None):
+        self.add(names, stage, time.time() if timestamp is None else timestamp)
+
+    def span(self, names, stage):
+        """
+        Context manager recording its block as a span.
+        """
+        if not self.enabled:
+            return _no_span
+        return _Span(self, names, stage)
+
+    def spans(self, name=None) -> List[tuple]:
+        """
+        :return: (image name, stage, start, end, thread id) of one image, or of all images
+        """
+        events = list(self.events)
+        if name is None:
+            return events
+        return [e for e in events if e[0] == name]
+
+    def stage_durations(self) -> Dict[str, np.ndarray]:
+        durations = {}
+        for _, stage, start, end, _ in list(self.events):
+            durations.setdefault(stage, []).append(end - start)
+        return {stage: np.asarray(d) for stage, d in durations.items()}
+
+    def frame_latencies(self, first_stage=ACQUISITION, last_stage=None) -> np.ndarray:
+        """
+        :param last_stage: None for the last event of each image, whatever the stage
+        :return: time from the first_stage event to the end of the last_stage event, per image having both. Images
+        dropped right after first_stage are left out.
+        """
+        starts, ends = {}, {}
+        for name, stage, start, end, _ in list(self.events):
+            if stage == first_stage:
+                starts[name] = min(start, starts.get(name, start))
+            elif last_stage is None or stage == last_stage:
+                ends[name] = max(end, ends.get(name, end))
+        return np.asarray([ends[name] - starts[name] for name in starts if name in ends])
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)) -> Dict[str, dict]:
+        """
+        :return: {stage: {"count", "mean", "p50", ...}} in seconds, "end to end" from acquisition to the last event
+        """
+        durations = self.stage_durations()
+        durations["end to end"] = self.frame_latencies()
+        ret = {}
+        for stage, d in durations.items():
+            entry = {"count": int(d.size), "mean": float(d.mean()) if d.size else None}
+            for q in quantiles:
+                entry[f"p{round(q * 100):d}"] = float(np.quantile(d, q)) if d.size else None
+            ret[stage] = entry
+        return ret
+
+    def chrome_trace(self, events: Iterable[tuple] = None) -> dict:
+        events = list(self.events) if events is None else list(events)
+        pid = 1
+        trace = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "pipeline"}}]
+        trace += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in list(self.thread_names.items())]
+
+        frames = {}
+        for name, stage, start, end, tid in events:
+            trace.append({"name": stage, "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+                          "ts": start * 1e6, "dur": (end - start) * 1e6, "args": {"image": name}})
+            first, last = frames.get(name, (start, end))
+            frames[name] = (min(first, start), max(last, end))
+
+        for name, (first, last) in frames.items():
+            trace.append({"name": name, "cat": "frame", "ph": "b", "id2": {"local": name}, "pid": pid,
+                          "ts": first * 1e6})
+            trace.append({"name": name, "cat": "frame", "ph": "e", "id2": {"local": name}, "pid": pid,
+                          "ts": last * 1e6})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export(self, path, name: Optional[str] = None):
+        """
+        Write the recorded spans, or the spans of one image, as a Chrome trace JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(self.spans(name)), f)
+
+    def clear(self):
+        self.events.clear()
+
+
+tracer = Tracer()
+
+
+def span(names, stage):
+    return tracer.span(names, stage)
+
+
+def add(names, stage, start, end=None):
+    tracer.add(names, stage, start, end)
+
+
+def instant(names, stage, timestamp=None):
+    tracer.instant(names, stage, timestamp)
+
+
+def export(path: str, name: Optional[str] = None):
+    tracer.export(path, name)
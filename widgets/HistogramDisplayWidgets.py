@@ -1,11 +1,11 @@
 from typing import List
 
-import numpy as np
 import pyqtgraph as pg
 from PyQt5 import QtCore
 
 import services.config as config_provider
 from data_class.distribution import EllipseDistribution, AreaDistribution
+from utils.histogram import HistogramAccumulator
 
 
 class PlotWidget(pg.PlotWidget):
@@ -23,12 +23,20 @@ class HistogramWidget(PlotWidget):
     def __init__(self, confs: List[HistogramSeriesConfiguration], **kwargs):
         super().__init__(**kwargs)
         self.plots = {}
+        self.log_x = False
         self.plotItem.setLabel("left", "Counts")
         self.plotItem.addLegend()
 
         for conf in confs:
             self.plots[conf.name] = self.plotItem.plot(brush=conf.brush, stepMode=True, fillLevel=0, name=conf.name)
 
+    def plot_histogram(self, name, histogram: HistogramAccumulator):
+        # log edges are drawn on a log axis so the bins look evenly spaced
+        if self.log_x != histogram.log:
+            self.log_x = histogram.log
+            self.plotItem.setLogMode(x=histogram.log)
+        self.plots[name].setData(histogram.edges, histogram.bin_counts)
+
 
 class AreaDisplayWidget(HistogramWidget):
     config_prefix = "Area_Distribution"
@@ -37,19 +45,21 @@ class AreaDisplayWidget(HistogramWidget):
         super().__init__([HistogramSeriesConfiguration("area", (0, 0, 255, 150))], parent=parent)
 
         self.config = config_provider.SettingAccessor(self.config_prefix)
+        self.settings = config_provider.section(self.config_prefix)
 
     @staticmethod
     @config_provider.DefaultSettingRegistration(config_prefix)
     def default_settings(config_prefix):
         config_provider.default_settings(config_prefix, [
-            config_provider.SettingRegistry("bins", 30, type="int", title="Bins")
+            config_provider.SettingRegistry("view", "seconds", type="str",
+                                            title="Histogram window (seconds/frames/run)")
         ])
 
     def update_histogram(self, dist: AreaDistribution):
-        if dist.area_dist.size == 0:
+        histogram = dist.histograms.get(self.settings.view)
+        if histogram is None:
             return
-        y, x = np.histogram(dist.area_dist, self.config["bins"])
-        self.plots["area"].setData(x, y)
+        self.plot_histogram("area", histogram)
         label = f"Area distribution {dist.unit}"
         if self.plotItem.getLabel('bottom') != label:
             self.plotItem.setLabel('bottom', label)
@@ -64,23 +74,22 @@ class EllipsesDisplayWidget(HistogramWidget):
             HistogramSeriesConfiguration("major axis", (255, 0, 0, 150)),
         ], parent=parent)
         self.config = config_provider.SettingAccessor(self.config_prefix)
+        self.settings = config_provider.section(self.config_prefix)
 
     @staticmethod
     @config_provider.DefaultSettingRegistration(config_prefix)
     def default_settings(config_prefix):
         config_provider.default_settings(config_prefix, [
-            config_provider.SettingRegistry("bins", 30, type="int", title="Bins")
+            config_provider.SettingRegistry("view", "seconds", type="str",
+                                            title="Histogram window (seconds/frames/run)")
         ])
 
     def update_histogram(self, dist: EllipseDistribution):
-        if dist.major_dist.size == 0:
+        view = self.settings.view
+        if view not in dist.major_histograms:
             return
-        major, minor = dist.major_dist, dist.minor_dist
-        y_maj, x_maj = np.histogram(major, self.config["bins"])
-        y_min, x_min = np.histogram(minor, self.config["bins"])
-
-        self.plots["major axis"].setData(x_maj, y_maj)
-        self.plots["minor axis"].setData(x_min, y_min)
+        self.plot_histogram("major axis", dist.major_histograms[view])
+        self.plot_histogram("minor axis", dist.minor_histograms[view])
 
         label = f"Ellipses distribution {dist.unit}"
         if self.plotItem.getLabel('bottom') != label:
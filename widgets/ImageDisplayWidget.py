@@ -7,9 +7,10 @@ from typing import Union
 import numpy as np
 import pyqtgraph as pg
 from PIL import Image
-from PyQt5 import QtWidgets, QtCore
+from PyQt5 import QtWidgets, QtCore, QtGui
 
 from data_class.subject_data import AcquiredImage
+from utils import tracing
 
 
 class SimpleDisplayWidget(QtWidgets.QWidget):
@@ -26,11 +27,24 @@ class SimpleDisplayWidget(QtWidgets.QWidget):
         self.view.addItem(self.image_item)
         self.view.addItem(self.text_item)
         layout.addWidget(self.image_widget)
+        self._pixel_size = None
+
+    def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
+        super().resizeEvent(event)
+        ratio = self.devicePixelRatioF()
+        self._pixel_size = (int(self.width() * ratio), int(self.height() * ratio))
+
+    def pixel_size(self):
+        """
+        (width, height) in device pixels, None before the first layout. Safe to call from any thread.
+        """
+        return self._pixel_size
 
     def updateImage(self, image: Union[AcquiredImage, np.ndarray]):
         if isinstance(image, AcquiredImage):
-            self.image_item.setImage(image.image, False)
-            self.text_item.setText(f"{datetime.datetime.fromtimestamp(image.time).strftime('%x %X')}")
+            with tracing.span(image.name, tracing.DISPLAY):
+                self.image_item.setImage(image.image, False)
+                self.text_item.setText(f"{datetime.datetime.fromtimestamp(image.time).strftime('%x %X')}")
         else:
             self.image_item.setImage(image, False)
             # self.text_item.setText("")
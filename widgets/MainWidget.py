@@ -7,14 +7,18 @@ from PyQt5.QtWidgets import QDockWidget
 from rx import operators, disposable
 
 from services import service_provider
+from services.display_feed import DisplayFeed
 from services.subjects import Subjects
-from utils.QtScheduler import QtScheduler
+from utils import metrics
+from utils.QtScheduler import CoalescingQtScheduler
 from utils.observer import ErrorToConsoleObserver
+from utils.stage_queue import stage_queue
 from widgets.ConfigDialog import ConfigDialog
 from widgets.ConsoleWidget import Console
 from widgets.HistogramDisplayWidgets import AreaDisplayWidget, EllipsesDisplayWidget
 from widgets.ImageDisplayWidget import SimpleDisplayWidget
-from widgets.Menus import ImageSourceMenu, LayoutMenu, AnalyzerMenu, SimexMenu
+from widgets.PerformanceWidget import PerformanceWidget
+from widgets.Menus import ImageSourceMenu, LayoutMenu, AnalyzerMenu, SimexMenu, TracingMenu
 from widgets.TimelineWidget import TimelineWidget
 
 
@@ -49,9 +53,11 @@ class MainWidget(QtWidgets.QMainWindow):
 
         simex_menu = SimexMenu(self)
         menu_bar.addMenu(simex_menu)
+        menu_bar.addMenu(TracingMenu(self))
 
     @staticmethod
     def init_background_services():
+        service_provider.EncodingStageProvider().get_or_create_instance(None)
         service_provider.ResultProcessorProvider().get_or_create_instance(None)
         service_provider.ResultSaverProvider().get_or_create_instance(None)
 
@@ -66,7 +72,8 @@ class MainWidget(QtWidgets.QMainWindow):
             "areaDist": QtWidgets.QDockWidget("Area distribution", self),
             "ellipseDist": QtWidgets.QDockWidget("Ellipse distribution", self),
             "timeline": QtWidgets.QDockWidget("Timeline", self),
-            "console": QtWidgets.QDockWidget("Console", self)
+            "console": QtWidgets.QDockWidget("Console", self),
+            "performance": QtWidgets.QDockWidget("Performance", self),
         }
 
         # assign object name
@@ -80,48 +87,57 @@ class MainWidget(QtWidgets.QMainWindow):
         self.dockedPanels["ellipseDist"].setWidget(EllipsesDisplayWidget(self))
         self.dockedPanels["timeline"].setWidget(TimelineWidget(self))
         self.dockedPanels["console"].setWidget(Console(self))
+        self.dockedPanels["performance"].setWidget(PerformanceWidget(self))
 
         self.applyDefaultLayout()
 
     def configureObservers(self):
-        qt_scheduler = QtScheduler(QtCore)
+        qt_scheduler = CoalescingQtScheduler(QtCore)
         subject_provider = service_provider.SubjectProvider()
         subjects: Subjects = subject_provider.get_or_create_instance(None)
-        # display raw images
+        # display raw images, downsampled and rate limited off the GUI thread
         self.subscriptions.add(
             subjects.image_producer.pipe(
-                operators.observe_on(qt_scheduler),
-            ).subscribe(ErrorToConsoleObserver(self.dockedPanels["input"].widget().updateImage))
+                DisplayFeed("input", self.dockedPanels["input"].widget().pixel_size),
+                stage_queue("display input", 1, "keep_latest", qt_scheduler),
+            ).subscribe(ErrorToConsoleObserver(self.rendering("input", "updateImage")))
         )
 
         # display processed images
         self.subscriptions.add(
             subjects.rendered_sample_image_producer.pipe(
-                operators.observe_on(qt_scheduler),
-            ).subscribe(ErrorToConsoleObserver(self.dockedPanels["processed"].widget().updateImage))
+                DisplayFeed("processed", self.dockedPanels["processed"].widget().pixel_size),
+                stage_queue("display processed", 1, "keep_latest", qt_scheduler),
+            ).subscribe(ErrorToConsoleObserver(self.rendering("processed", "updateImage")))
         )
 
         self.subscriptions.add(
             subjects.processed_distributions.pipe(
                 operators.pluck_attr("dists"),
                 operators.pluck("areas"),
-                operators.observe_on(qt_scheduler),
-            ).subscribe(ErrorToConsoleObserver(self.dockedPanels["areaDist"].widget().update_histogram))
+                stage_queue("display areas", 1, "keep_latest", qt_scheduler),
+            ).subscribe(ErrorToConsoleObserver(self.rendering("areaDist", "update_histogram")))
         )
 
         self.subscriptions.add(
             subjects.processed_distributions.pipe(
                 operators.pluck_attr("dists"),
                 operators.pluck("ellipses"),
-                operators.observe_on(qt_scheduler),
-            ).subscribe(ErrorToConsoleObserver(self.dockedPanels["ellipseDist"].widget().update_histogram))
+                stage_queue("display ellipses", 1, "keep_latest", qt_scheduler),
+            ).subscribe(ErrorToConsoleObserver(self.rendering("ellipseDist", "update_histogram")))
         )
 
         self.subscriptions.add(
-            subjects.add_to_timeline.pipe(operators.observe_on(qt_scheduler)).subscribe(
-                ErrorToConsoleObserver(self.dockedPanels["timeline"].widget().update_plot))
+            subjects.add_to_timeline.pipe(stage_queue("display timeline", 4096, "drop_oldest", qt_scheduler)).subscribe(
+                ErrorToConsoleObserver(self.rendering("timeline", "update_plot")))
         )
 
+    def rendering(self, panel, method):
+        """
+        The update method of a panel, recording the time spent in the GUI thread.
+        """
+        return metrics.timed(f"display.{panel}")(getattr(self.dockedPanels[panel].widget(), method))
+
     def closeEvent(self, a0: QtGui.QCloseEvent) -> None:
         self.subscriptions.dispose()
         super().closeEvent(a0)
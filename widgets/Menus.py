@@ -11,6 +11,7 @@ from services.analyzers import Analyzer
 from services.image_sources import ImageSource
 from services.service_provider import ImageSourceProvider, AnalyzerProvider
 from services.simex_io import SimexIO
+from utils import tracing
 
 
 class LayoutMenu(QtWidgets.QMenu):
@@ -223,3 +224,50 @@ class SimexMenu(QtWidgets.QMenu):
         disconnect_action = self.addAction("&Disconnect")
         disconnect_action.triggered.connect(lambda: self.simex_io_instance.disconnect())
 
+
+
+class TracingMenu(QtWidgets.QMenu):
+    configPrefix = "Tracing"
+
+    def __init__(self, parent=None):
+        super().__init__("&Tracing", parent)
+        self.config = config.SettingAccessor(self.configPrefix)
+        self.logger = logging.getLogger("console")
+        tracing.tracer.configure(self.config["enabled"], self.config["max_events"])
+
+        self.enable_action = self.addAction("&Record spans")
+        self.enable_action.setCheckable(True)
+        self.enable_action.setChecked(tracing.tracer.enabled)
+        self.enable_action.toggled.connect(self.enableTracing)
+        self.addAction("&Export trace...").triggered.connect(self.exportTrace)
+        self.addAction("&Clear").triggered.connect(lambda: tracing.tracer.clear())
+
+    @staticmethod
+    @config.DefaultSettingRegistration(configPrefix)
+    def defaultSettings(configPrefix):
+        config.default_settings(configPrefix, [
+            config.SettingRegistry("enabled", False, type="bool", title="Record per-frame trace spans"),
+            config.SettingRegistry("max_events", 500000, type="int", title="Spans kept (oldest are dropped)"),
+        ])
+
+    @QtCore.pyqtSlot(bool)
+    def enableTracing(self, enabled):
+        tracing.tracer.configure(enabled)
+        self.config["enabled"] = enabled
+        self.logger.info("Trace recording started" if enabled else "Trace recording stopped")
+
+    @QtCore.pyqtSlot()
+    def exportTrace(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export trace", "trace.json", "Chrome trace (*.json)")
+        if not path:
+            return
+        try:
+            tracing.tracer.export(path)
+        except OSError as ex:
+            self.logger.error(f"Failed to export the trace: {ex}")
+            return
+        for stage, s in tracing.tracer.summary().items():
+            if s["count"]:
+                self.logger.info(f"{stage}: {s['count']} spans, p50 {s['p50'] * 1000:.1f} ms, "
+                                 f"p99 {s['p99'] * 1000:.1f} ms")
+        self.logger.info(f"Trace exported to {path}. Open it in chrome://tracing or ui.perfetto.dev")
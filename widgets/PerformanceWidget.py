@@ -0,0 +1,104 @@
+"""
+Live view of the pipeline metrics: throughput, per-stage latency percentiles, stage queue depths and drops.
+Rates and percentiles cover the last `window` seconds.
+"""
+from collections import deque
+
+from PyQt5 import QtWidgets, QtCore
+
+from services import config
+from utils import metrics
+from utils.stage_queue import stage_queues
+
+
+def _ms(seconds):
+    return "" if seconds is None else f"{seconds * 1000:.2f}"
+
+
+def _number(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+class PerformanceWidget(QtWidgets.QWidget):
+    config_prefix = "Performance"
+    latency_columns = ("Stage", "Per sec", "p50 (ms)", "p90 (ms)", "p99 (ms)", "Max (ms)")
+    counter_columns = ("Metric", "Per sec", "Total")
+    queue_columns = ("Queue", "Depth", "Capacity", "Policy", "Peak", "Dropped", "Blocked")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.config = config.SettingAccessor(self.config_prefix)
+        self.snapshots = deque()
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+        self.latency_table = self._add_table(layout, "Latency", self.latency_columns)
+        self.counter_table = self._add_table(layout, "Throughput and drops", self.counter_columns)
+        self.queue_table = self._add_table(layout, "Queues", self.queue_columns)
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(max(int(self.config["refresh_interval"] * 1000), 100))
+
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("refresh_interval", 1.0, type="float", title="Refresh interval (sec)"),
+            config.SettingRegistry("window", 5.0, type="float", title="Rate and percentile window (sec)"),
+        ])
+
+    @staticmethod
+    def _add_table(layout, title, columns):
+        layout.addWidget(QtWidgets.QLabel(title))
+        table = QtWidgets.QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().hide()
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        layout.addWidget(table)
+        return table
+
+    @staticmethod
+    def _fill(table: QtWidgets.QTableWidget, rows):
+        table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                item = table.item(i, j)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    table.setItem(i, j, item)
+                item.setText(value)
+
+    @QtCore.pyqtSlot()
+    def refresh(self):
+        if not self.isVisible():
+            return
+        current = metrics.registry.snapshot()
+        # compare with the oldest snapshot still inside the window
+        window = self.config["window"]
+        while len(self.snapshots) > 1 and current["time"] - self.snapshots[1]["time"] >= window:
+            self.snapshots.popleft()
+        previous = self.snapshots[0] if self.snapshots else None
+        self.snapshots.append(current)
+        summary = metrics.summarize(previous, current)
+
+        self._fill(self.latency_table, [
+            (name, _number(h["rate"]), _ms(h["p50"]), _ms(h["p90"]), _ms(h["p99"]), _ms(h["max"]))
+            for name, h in sorted(summary["histograms"].items())
+        ])
+
+        rows = [(name, _number(c["rate"]), str(c["total"])) for name, c in sorted(summary["counters"].items())]
+        rows += [(name, "", _number(value)) for name, value in sorted(summary["gauges"].items())]
+        self._fill(self.counter_table, rows)
+
+        queues = sorted(((q.name, q.metrics()) for q in stage_queues()), key=lambda x: x[0])
+        self._fill(self.queue_table, [
+            (name, str(m["depth"]), str(m["capacity"]), m["policy"], str(m["peak_depth"]), str(m["dropped"]),
+             str(m["blocked"]))
+            for name, m in queues
+        ])
@@ -7,12 +7,12 @@ from datetime import datetime
 import numpy as np
 import pyqtgraph as pg
 from PyQt5 import QtWidgets, QtCore
-from pyqtgraph import PlotDataItem
 
 from data_class.subject_data import TimelineDataPoint
-from services import service_provider
+from services import config, service_provider
 from services.subjects import Subjects
-from utils.QtScheduler import QtScheduler
+from utils.QtScheduler import CoalescingQtScheduler
+from utils.timeseries import TimeSeries
 
 class TimeAxisItem(pg.AxisItem):
     def __init__(self, *args, **kwargs):
@@ -23,12 +23,23 @@ class TimeAxisItem(pg.AxisItem):
 
 
 class TimelineWidget(pg.GraphicsLayoutWidget):
+    """
+    New points are appended to a TimeSeries per series; the plots are redrawn from min/max decimated data on a
+    timer, at most refresh_interval apart.
+    """
     color_list = ["r", "g", "b", "c", "m", "y", "k", "w"]
+    config_prefix = "Timeline"
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.plot_height = 300
-        self.qt_scheduler = QtScheduler(QtCore)
+        self.qt_scheduler = CoalescingQtScheduler(QtCore)
+        self.config = config.SettingAccessor(self.config_prefix)
+        # (plot name, series name) to redraw
+        self.dirty = set()
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(max(int(self.config["refresh_interval"] * 1000), 10))
 
         self.subjects: Subjects = service_provider.SubjectProvider().get_or_create_instance(None)
         """
@@ -37,12 +48,24 @@ class TimelineWidget(pg.GraphicsLayoutWidget):
                 "plot": PlotItem,
                 "series": {
                     series-name: str -> PlotDataItem
+                },
+                "data": {
+                    series-name: str -> TimeSeries
                 }
             }
         }
         """
         self.plots = OrderedDict()
 
+    @staticmethod
+    @config.DefaultSettingRegistration(config_prefix)
+    def default_settings(config_prefix):
+        config.default_settings(config_prefix, [
+            config.SettingRegistry("retention", 4 * 3600, type="float", title="Retention (sec, 0 = unlimited)"),
+            config.SettingRegistry("max_points", 200000, type="int", title="Maximum points per series"),
+            config.SettingRegistry("refresh_interval", 0.25, type="float", title="Redraw interval (sec)"),
+        ])
+
     def configure_subscriptions(self):
         self.subjects.add_to_timeline \
             .subscribe(self.update_plot)
@@ -70,28 +93,34 @@ class TimelineWidget(pg.GraphicsLayoutWidget):
 
             self.qt_scheduler.schedule(resize_callback)
 
-        series: dict
-        try:
-            series = plot_entry["series"]
-        except:
-            series = plot_entry["series"] = {}
-
-        if x.series_name in series:
-            # previously plotted series, update
-            existing_series: PlotDataItem = series[x.series_name]
-            current_x, current_y = existing_series.getData()
-            current_x = np.append(current_x, x.time)
-            current_y = np.append(current_y, x.value)
-            existing_series.setData(current_x, current_y)
+        series: dict = plot_entry.setdefault("series", {})
+        data: dict = plot_entry.setdefault("data", {})
 
-        else:
+        if x.series_name not in series:
             # new series, plot it
             series[x.series_name] = plot_entry["plot"].plot(
-                [x.time],
-                [x.value],
+                [],
+                [],
                 name=x.series_name,
                 pen=pg.mkPen(color=self.color_list[len(series) % len(self.color_list)])
             )
+            data[x.series_name] = TimeSeries(self.config["retention"] or None, self.config["max_points"])
+
+        data[x.series_name].append(x.time, x.value)
+        self.dirty.add((x.plot_name, x.series_name))
+
+    def refresh(self):
+        """
+        Redraw the series that received points since the last refresh.
+        """
+        dirty, self.dirty = self.dirty, set()
+        for plot_name, series_name in dirty:
+            plot_entry = self.plots[plot_name]
+            # two points (min and max) per horizontal pixel
+            width = max(int(plot_entry["plot"].getViewBox().width()), 100)
+            x, y = plot_entry["data"][series_name].decimated(2 * width)
+            # copy: undecimated data are views into the buffer the next append may compact
+            plot_entry["series"][series_name].setData(np.array(x), np.array(y))
 
 
 if __name__ == '__main__':
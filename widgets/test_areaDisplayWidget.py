@@ -4,12 +4,18 @@ from unittest import TestCase
 import numpy as np
 from PyQt5 import QtWidgets, QtGui, QtCore
 
+from data_class.distribution import AreaDistribution
+from utils.histogram import SlidingHistogram, make_edges
 from widgets.HistogramDisplayWidgets import AreaDisplayWidget
 
 
 class TestAreaDisplayWidget(TestCase):
+    histogram = SlidingHistogram(make_edges("log", 1, 10000, 50), log=True)
+
     def updateHistogram(self, widget):
-        widget.update_histogram(np.random.standard_normal(500))
+        areas = np.random.lognormal(5, 1, 500)
+        self.histogram.add_frame(areas)
+        widget.update_histogram(AreaDistribution(areas, histograms=self.histogram.snapshot()))
 
     def test_updateHistogram(self):
         app = QtWidgets.QApplication(sys.argv)
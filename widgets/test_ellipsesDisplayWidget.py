@@ -4,12 +4,22 @@ from unittest import TestCase
 import numpy as np
 from PyQt5 import QtWidgets, QtGui, QtCore
 
+from data_class.distribution import EllipseDistribution
+from utils.histogram import SlidingHistogram, make_edges
 from widgets.HistogramDisplayWidgets import EllipsesDisplayWidget
 
 
 class TestEllipsesDisplayWidget(TestCase):
+    majors = SlidingHistogram(make_edges("linear", 0, 100, 50))
+    minors = SlidingHistogram(make_edges("linear", 0, 100, 50))
+
     def updateHistogram(self, widget):
-        widget.update_histogram(np.random.standard_normal(500), np.random.standard_normal(500) * 15 + 10)
+        major = np.abs(np.random.standard_normal(500) * 15 + 40)
+        minor = major * np.random.uniform(0.3, 1, 500)
+        self.majors.add_frame(major)
+        self.minors.add_frame(minor)
+        widget.update_histogram(EllipseDistribution(major, minor, major_histograms=self.majors.snapshot(),
+                                                    minor_histograms=self.minors.snapshot()))
 
     def test_ellipseDisplayWidget(self):
         app = QtWidgets.QApplication(sys.argv)